@@ -3,20 +3,60 @@ import uuid
 import shutil
 import json
 import time
-import threading
-from flask import Flask, request, jsonify, send_from_directory
+import queue
+import mimetypes
+from flask import Flask, Response, request, jsonify, send_file
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
-from reconstruction.reconstructor import Reconstructor
-from reconstruction.utils.file_utils import create_directory, clean_temp_files
+from reconstruction import config
+from reconstruction.utils.file_utils import (
+    create_directory,
+    clean_temp_files,
+    iter_result_files,
+)
+from reconstruction.utils.job_queue import JobQueue, JOB_QUEUED, JOB_RUNNING
+from reconstruction.utils.blob_store import BlobStore, is_valid_sha256
+from reconstruction.utils.disk_usage import DiskUsageLedger
+from reconstruction.utils.artifact_manifest import (
+    ManifestIndex,
+    MODEL_FORMATS,
+    ROLE_PREVIEW,
+    is_current,
+)
 from reconstruction.utils.logging_utils import setup_logger
+from reconstruction.utils.metrics import (
+    MetricsRegistry,
+    MetricsStore,
+    SERVED_BYTES,
+    UPLOADED_BYTES,
+)
+from reconstruction.utils.upload_store import UploadStore, UploadError
+from reconstruction.utils.zip_stream import ZipStream
+from reconstruction.utils.resource_limits import QUALITY_TIERS
+from reconstruction.utils.session_state import (
+    load_session_state,
+    save_session_state,
+    update_session_state,
+    delete_session_state,
+)
+from reconstruction.utils.progress_events import (
+    EVENTS_FILE,
+    TERMINAL_STATUSES,
+    ProgressBroadcaster,
+    append_event,
+    is_terminal,
+)
+from reconstruction.utils.checkpoints import StageCheckpoints
+from reconstruction.reconstructor import PIPELINES
+from reconstruction.pipeline.stage_graph import StageGraph
+from reconstruction.worker_pool import job_requirements
 
 app = Flask(__name__)
 CORS(app)  # Дозволяємо крос-доменні запити
 
 # Конфігурація
-UPLOAD_FOLDER = "/data/uploads"
-RESULTS_FOLDER = "/data/results"
+UPLOAD_FOLDER = config.UPLOAD_FOLDER
+RESULTS_FOLDER = config.RESULTS_FOLDER
 app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
 app.config["RESULTS_FOLDER"] = RESULTS_FOLDER
 app.config["MAX_CONTENT_LENGTH"] = 100 * 1024 * 1024  # 100 MB максимальний розмір файлу
@@ -29,10 +69,125 @@ create_directory(RESULTS_FOLDER)
 # Налаштовуємо логування
 logger = setup_logger(RESULTS_FOLDER, "app")
 
+# Черга завдань реконструкції (виконуються окремими процесами worker.py)
+job_queue = JobQueue(config.JOBS_DB_PATH, logger)
+
+# Облік дискового простору сесій (за ним прибиральник витісняє давно не використані сесії)
+disk_usage = DiskUsageLedger(config.JOBS_DB_PATH, logger)
+
+# Сховище завантажених зображень; вміст зберігається один раз у спільному сховищі блобів
+upload_store = UploadStore(UPLOAD_FOLDER, BlobStore(config.BLOB_FOLDER, logger, disk_usage), logger)
+
+# Індекс маніфестів артефактів (LRU у пам'яті, інвалідація за mtime маніфесту)
+manifest_index = ManifestIndex(RESULTS_FOLDER, logger=logger)
+
+# Розсилка подій прогресу: один потік на процес API читає журнали подій сесій
+progress_broadcaster = ProgressBroadcaster(RESULTS_FOLDER, logger=logger)
+SSE_KEEPALIVE_INTERVAL = 15
+
+# Метрики Prometheus: лічильники процесу накопичуються в пам'яті, а фоновий
+# потік записує їх у спільну базу та оновлює готовий текст для /metrics
+metrics = MetricsRegistry(
+    MetricsStore(config.JOBS_DB_PATH, logger),
+    job_queue,
+    config.METRICS_REFRESH_INTERVAL,
+    logger,
+)
+
+# Ендпоінти, обсяг запитів яких рахується як завантажені зображення
+UPLOAD_ENDPOINTS = {"upload_images", "upload_chunk"}
+
+# Ендпоінти, обсяг відповідей яких рахується як віддані файли результатів
+SERVED_ENDPOINTS = {"serve_results_file", "download_file", "download_all_results"}
+SSE_RETRY_MS = 3000
+
+# Типи 3D-моделей, яких немає в стандартній таблиці mimetypes
+mimetypes.add_type("model/gltf+json", ".gltf")
+mimetypes.add_type("model/gltf-binary", ".glb")
+mimetypes.add_type("model/obj", ".obj")
+
+# Етапи, з яких можна повторно виконати пайплайн, та параметри, які можна змінити
+REDERIVE_STAGES = ("mesh", "texture", "export")
+REDERIVE_PARAMS = {
+    "mesh": {"depth", "smoothing_iters", "denoise_neighbors", "min_face_angle", "smooth"},
+    "texture": {"resolution_level"},
+}
+
 # Дозволені розширення файлів зображень
 ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "tif", "tiff"}
 
 
+def read_session_status(session_id):
+    """Повертає статус сесії з метаданих або None"""
+    session_results_dir = os.path.join(app.config["RESULTS_FOLDER"], session_id)
+    return load_session_state(session_results_dir).get("status")
+
+
+def record_upload_usage(session_id, status):
+    """Записує статус сесії та розмір її завантажених зображень в облік диску"""
+    # Зображення у сховищі блобів враховуються самим сховищем, один раз для всіх сесій
+    uploads_bytes = 0
+    if upload_store.blob_store is None:
+        manifest = upload_store.read_manifest(session_id)
+        uploads_bytes = sum(info["size"] for info in manifest.values())
+    disk_usage.record(session_id, status=status, uploads_bytes=uploads_bytes)
+
+
+def send_result_file(session_id, filename, as_attachment=False):
+    """
+    Віддає файл результатів сесії з умовними запитами та докачуванням.
+
+    Для артефактів з маніфесту ETag - це SHA-256 вмісту, тому переглядач
+    не завантажує модель повторно (304). Якщо клієнт приймає gzip,
+    віддається стиснений варіант, створений під час експорту.
+    Range-запити та If-None-Match обробляє send_file (conditional=True).
+    """
+    session_results_dir = os.path.join(app.config["RESULTS_FOLDER"], session_id)
+    # Handle nested paths correctly
+    file_path = os.path.normpath(os.path.join(session_results_dir, filename))
+
+    # Security check to ensure the file is within the session directory
+    if not file_path.startswith(session_results_dir + os.sep):
+        return jsonify({"error": "Invalid file path"}), 403
+
+    # Перевірка існування файлу
+    if not os.path.isfile(file_path):
+        return jsonify({"error": "File not found", "path": file_path}), 404
+
+    rel_path = os.path.relpath(file_path, session_results_dir).replace(os.sep, "/")
+    manifest = manifest_index.get(session_id)
+    artifact = manifest["by_path"].get(rel_path) if manifest else None
+
+    send_path = file_path
+    etag = True
+    content_encoding = None
+
+    # Хеш з маніфесту використовується, лише якщо файл не змінився після експорту
+    if artifact is not None and is_current(artifact, os.stat(file_path)):
+        etag = artifact["sha256"]
+        variant = artifact.get("variants", {}).get("gzip")
+        if variant is not None and request.accept_encodings["gzip"]:
+            variant_path = os.path.join(session_results_dir, variant["path"])
+            if os.path.isfile(variant_path) and os.path.getsize(variant_path) == variant["size"]:
+                send_path = variant_path
+                etag = variant["sha256"]
+                content_encoding = "gzip"
+
+    response = send_file(
+        send_path,
+        mimetype=mimetypes.guess_type(file_path)[0] or "application/octet-stream",
+        as_attachment=as_attachment,
+        download_name=os.path.basename(file_path),
+        conditional=True,
+        etag=etag,
+    )
+    if content_encoding:
+        response.headers["Content-Encoding"] = content_encoding
+    if artifact is not None and artifact.get("variants"):
+        response.vary.add("Accept-Encoding")
+    return response
+
+
 def allowed_file(filename):
     """Перевіряє, чи файл має дозволене розширення"""
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -44,6 +199,23 @@ def health_check():
     return jsonify({"status": "ok", "timestamp": time.time()})
 
 
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    """Метрики у текстовому форматі Prometheus (оновлюються у фоні)"""
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.after_request
+def count_transferred_bytes(response):
+    """Рахує обсяг завантажених зображень та відданих файлів для метрик"""
+    if response.status_code < 400:
+        if request.endpoint in UPLOAD_ENDPOINTS and request.content_length:
+            metrics.increment(UPLOADED_BYTES, request.content_length)
+        elif request.endpoint in SERVED_ENDPOINTS and response.content_length:
+            metrics.increment(SERVED_BYTES, response.content_length)
+    return response
+
+
 @app.route("/api/upload", methods=["POST"])
 def upload_images():
     """Завантаження зображень для 3D-реконструкції"""
@@ -66,14 +238,13 @@ def upload_images():
     create_directory(session_upload_dir)
     create_directory(session_results_dir)
 
-    # Зберігаємо файли
+    # Зберігаємо файли потоково, обчислюючи SHA-256 під час запису
     saved_files = []
     for file in files:
         if file and allowed_file(file.filename):
             filename = secure_filename(file.filename)
-            filepath = os.path.join(session_upload_dir, filename)
-            file.save(filepath)
-            saved_files.append(filepath)
+            upload_store.save_file(session_id, filename, file.stream)
+            saved_files.append(os.path.join(session_upload_dir, filename))
 
     if not saved_files:
         return jsonify({"error": "No valid images uploaded"}), 400
@@ -86,8 +257,8 @@ def upload_images():
         "status": "uploaded",
     }
 
-    with open(os.path.join(session_results_dir, "metadata.json"), "w") as f:
-        json.dump(metadata, f)
+    save_session_state(session_results_dir, metadata)
+    record_upload_usage(session_id, "uploaded")
 
     return jsonify(
         {
@@ -98,11 +269,185 @@ def upload_images():
     )
 
 
+@app.route("/api/uploads", methods=["POST"])
+def create_upload_session():
+    """Створення сесії для фрагментованого відновлюваного завантаження"""
+    session_id = str(uuid.uuid4())
+    session_results_dir = os.path.join(app.config["RESULTS_FOLDER"], session_id)
+
+    create_directory(upload_store.session_dir(session_id))
+    create_directory(session_results_dir)
+
+    metadata = {
+        "session_id": session_id,
+        "timestamp": time.time(),
+        "num_images": 0,
+        "status": "uploading",
+    }
+
+    save_session_state(session_results_dir, metadata)
+    disk_usage.record(session_id, status="uploading")
+
+    return jsonify({"session_id": session_id, "status": "uploading"}), 201
+
+
+@app.route(
+    "/api/uploads/<session_id>/files/<filename>/chunks/<int:index>", methods=["PUT"]
+)
+def upload_chunk(session_id, filename, index):
+    """Завантаження одного фрагмента файлу (тіло запиту - сирі байти)"""
+    if not os.path.exists(upload_store.session_dir(session_id)):
+        return jsonify({"error": "Session not found"}), 404
+
+    if not allowed_file(filename):
+        return jsonify({"error": "File type not allowed"}), 400
+
+    try:
+        chunk = upload_store.save_chunk(
+            session_id,
+            secure_filename(filename),
+            index,
+            request.stream,
+            request.headers.get("X-Chunk-SHA256"),
+        )
+    except UploadError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify(chunk)
+
+
+@app.route("/api/uploads/<session_id>/files/<filename>/from-hash", methods=["POST"])
+def upload_from_hash(session_id, filename):
+    """Додавання зображення за SHA-256 без передачі вмісту, якщо він вже є на сервері"""
+    if not os.path.exists(upload_store.session_dir(session_id)):
+        return jsonify({"error": "Session not found"}), 404
+
+    if not allowed_file(filename):
+        return jsonify({"error": "File type not allowed"}), 400
+
+    data = request.json or {}
+    if not data.get("sha256"):
+        return jsonify({"error": "sha256 is required"}), 400
+
+    sha256 = str(data["sha256"]).lower()
+    if not is_valid_sha256(sha256):
+        return jsonify({"error": "sha256 must be 64 hexadecimal characters"}), 400
+
+    image = upload_store.link_existing(session_id, secure_filename(filename), sha256)
+    if image is None:
+        # Клієнт має завантажити файл звичайним способом
+        return jsonify({"error": "Content not found", "sha256": sha256}), 404
+
+    return jsonify(image)
+
+
+@app.route("/api/uploads/<session_id>", methods=["GET"])
+def get_upload_status(session_id):
+    """Стан фрагментованого завантаження для відновлення після обриву з'єднання"""
+    if not os.path.exists(upload_store.session_dir(session_id)):
+        return jsonify({"error": "Session not found"}), 404
+
+    status = upload_store.get_status(session_id)
+    status["session_id"] = session_id
+    return jsonify(status)
+
+
+@app.route("/api/uploads/<session_id>/finalize", methods=["POST"])
+def finalize_upload(session_id):
+    """Завершення фрагментованого завантаження: збирання файлів з фрагментів"""
+    session_results_dir = os.path.join(app.config["RESULTS_FOLDER"], session_id)
+
+    if not os.path.exists(upload_store.session_dir(session_id)):
+        return jsonify({"error": "Session not found"}), 404
+
+    # Формат: {"files": {"img.jpg": {"chunks": 3, "sha256": "..."}}}
+    data = request.json or {}
+    files = data.get("files")
+    if files is not None:
+        if not isinstance(files, dict):
+            return jsonify({"error": "files must be an object"}), 400
+        files = {secure_filename(name): spec for name, spec in files.items()}
+
+    try:
+        images = upload_store.finalize(session_id, files)
+    except UploadError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if len(images) < 3:
+        return (
+            jsonify({"error": "At least 3 images are required for 3D reconstruction"}),
+            400,
+        )
+
+    metadata = {
+        "session_id": session_id,
+        "timestamp": time.time(),
+        "num_images": len(images),
+        "status": "uploaded",
+    }
+
+    save_session_state(session_results_dir, metadata)
+    record_upload_usage(session_id, "uploaded")
+
+    return jsonify(
+        {
+            "session_id": session_id,
+            "message": f"Successfully uploaded {len(images)} images",
+            "images": images,
+            "status": "success",
+        }
+    )
+
+
+def job_active(session_id):
+    """Перевіряє, чи є в сесії завдання, що очікує в черзі або виконується"""
+    job = job_queue.get_latest_for_session(session_id)
+    return job is not None and job["state"] in (JOB_QUEUED, JOB_RUNNING)
+
+
+def enqueue_job(session_id, params, kind="reconstruct"):
+    """Ставить завдання в чергу та позначає сесію як таку, що обробляється"""
+    session_results_dir = os.path.join(app.config["RESULTS_FOLDER"], session_id)
+
+    # Новий запуск починає журнал подій прогресу з чистого аркуша,
+    # інакше підписники отримали б статус попереднього запуску
+    os.makedirs(session_results_dir, exist_ok=True)
+    events_path = os.path.join(session_results_dir, EVENTS_FILE)
+    if os.path.exists(events_path):
+        os.remove(events_path)
+    append_event(session_results_dir, {"type": "status", "status": "processing", "job_state": "queued"})
+
+    # Ставимо завдання в чергу, його виконає один з процесів-воркерів
+    requirements = job_requirements(params["quality"])
+    job = job_queue.enqueue(
+        session_id,
+        params,
+        kind=kind,
+        cores=requirements["cores"],
+        memory_mb=requirements["memory_mb"],
+    )
+
+    # Для клієнта сесія вже обробляється, деталі черги - в полі job_state
+    update_session_state(
+        session_results_dir,
+        {
+            "session_id": session_id,
+            "status": "processing",
+            "job_id": job["id"],
+            "quality": params["quality"],
+            "method": params["method"],
+            "matching": params.get("matching", "auto"),
+            "queued_at": job["created_at"],
+        },
+    )
+    disk_usage.record(session_id, status="processing")
+    return job
+
+
 @app.route("/api/reconstruct/<session_id>", methods=["POST"])
 def reconstruct(session_id):
     """Запуск процесу 3D-реконструкції для заданої сесії"""
     session_upload_dir = os.path.join(app.config["UPLOAD_FOLDER"], session_id)
-    session_results_dir = os.path.join(app.config["RESULTS_FOLDER"], session_id)
 
     if not os.path.exists(session_upload_dir):
         return jsonify({"error": "Session not found"}), 404
@@ -111,47 +456,137 @@ def reconstruct(session_id):
     data = request.json or {}
     quality = data.get("quality", "medium")  # 'low', 'medium', 'high'
     method = data.get("method", "custom")  # 'colmap', 'openmvs', 'custom'
-
-    # Запускаємо процес реконструкції в окремому потоці
-    reconstruction_thread = threading.Thread(
-        target=run_reconstruction_task,
-        args=(session_id, session_upload_dir, session_results_dir, quality, method),
+    profile = bool(data.get("profile", False))  # профілі етапів у profiles/ результатів
+    matching = data.get("matching", "auto")  # 'auto', 'sequential' (впорядковані кадри)
+    if quality not in QUALITY_TIERS:
+        return jsonify({"error": f"quality must be one of {', '.join(QUALITY_TIERS)}"}), 400
+    if method not in PIPELINES:
+        return jsonify({"error": f"method must be one of {', '.join(PIPELINES)}"}), 400
+    if matching not in config.MATCHING_MODES:
+        return jsonify({"error": f"matching must be one of {', '.join(config.MATCHING_MODES)}"}), 400
+
+    if job_active(session_id):
+        return jsonify({"error": "Reconstruction is already queued or running"}), 409
+
+    job = enqueue_job(
+        session_id, {"quality": quality, "method": method, "profile": profile, "matching": matching}
     )
-    reconstruction_thread.daemon = True
-    reconstruction_thread.start()
 
-    # Одразу повертаємо відповідь про початок обробки
+    # Одразу повертаємо відповідь про постановку в чергу
     return jsonify(
         {
             "session_id": session_id,
+            "job_id": job["id"],
+            "job_state": job["state"],
             "status": "processing",
-            "message": "Reconstruction started. Check status with /api/results/{}".format(
+            "message": "Reconstruction queued. Check status with /api/status/{}".format(
                 session_id
             ),
         }
     )
 
 
-def run_reconstruction_task(session_id, input_dir, output_dir, quality, method):
-    """Функція для виконання реконструкції в окремому потоці"""
-    try:
-        logger.info(
-            f"Запуск реконструкції для сесії {session_id}, метод: {method}, якість: {quality}"
-        )
+@app.route("/api/rederive/<session_id>", methods=["POST"])
+def rederive(session_id):
+    """Повторне виконання етапів від меша, текстурування або експорту з новими параметрами"""
+    session_results_dir = os.path.join(app.config["RESULTS_FOLDER"], session_id)
 
-        # Ініціалізуємо реконструктор
-        reconstructor = Reconstructor(session_id, input_dir, output_dir)
+    metadata = load_session_state(session_results_dir)
+    if not metadata or not os.path.exists(os.path.join(app.config["UPLOAD_FOLDER"], session_id)):
+        return jsonify({"error": "Session not found"}), 404
 
-        # Запускаємо реконструкцію
-        result_path = reconstructor.run_reconstruction(method=method, quality=quality)
+    if metadata.get("status") != "completed":
+        return jsonify({"error": "Only completed sessions can be re-derived"}), 409
 
-        logger.info(f"Реконструкція завершена успішно: {result_path}")
+    # Формат: {"from_stage": "mesh", "params": {"mesh": {"depth": 11}, "texture": {"resolution_level": 0}}}
+    data = request.json or {}
+    from_stage = data.get("from_stage", "mesh")
+    if from_stage not in REDERIVE_STAGES:
+        return jsonify({"error": f"from_stage must be one of {', '.join(REDERIVE_STAGES)}"}), 400
+
+    stage_params = data.get("params") or {}
+    for stage, params in stage_params.items():
+        allowed = REDERIVE_PARAMS.get(stage)
+        if allowed is None or not isinstance(params, dict):
+            return jsonify({"error": f"Parameters of stage {stage} cannot be changed"}), 400
+        for name, value in params.items():
+            if name not in allowed or not isinstance(value, int) or isinstance(value, bool):
+                return jsonify({"error": f"Invalid parameter {stage}.{name}"}), 400
+
+    method = metadata.get("method", "custom")
+    quality = metadata.get("quality", "medium")
+    if method not in PIPELINES or quality not in QUALITY_TIERS:
+        return jsonify({"error": "Session was reconstructed with unsupported parameters"}), 409
+
+    if job_active(session_id):
+        return jsonify({"error": "Reconstruction is already queued or running"}), 409
+
+    # Етапи, результати яких використовують повторно виконувані, мають збережені
+    # проміжні результати, з яких продовжується обробка
+    checkpoints = StageCheckpoints(session_results_dir, logger)
+    for stage in StageGraph(PIPELINES[method].GRAPH).required_inputs(from_stage):
+        if checkpoints.latest(stage) is None:
+            return jsonify({"error": "Intermediate results for this session are not available"}), 409
+
+    job = enqueue_job(
+        session_id,
+        {
+            "quality": quality,
+            "method": method,
+            "matching": metadata.get("matching", "auto"),
+            "from_stage": from_stage,
+            "stage_params": stage_params,
+        },
+        kind="rederive",
+    )
 
-    except Exception as e:
-        logger.error(f"Помилка під час реконструкції: {str(e)}")
-        import traceback
+    return jsonify(
+        {
+            "session_id": session_id,
+            "job_id": job["id"],
+            "job_state": job["state"],
+            "status": "processing",
+            "from_stage": from_stage,
+            "message": "Re-derive queued. Check status with /api/status/{}".format(session_id),
+        }
+    )
 
-        logger.error(traceback.format_exc())
+
+@app.route("/api/cancel/<session_id>", methods=["POST"])
+def cancel(session_id):
+    """Скасування реконструкції, що очікує в черзі або виконується"""
+    session_results_dir = os.path.join(app.config["RESULTS_FOLDER"], session_id)
+
+    job = job_queue.get_latest_for_session(session_id)
+    if job is None:
+        return jsonify({"error": "Session not found"}), 404
+
+    previous_state = job_queue.cancel(job["id"])
+    if previous_state is None:
+        return jsonify({"error": "Reconstruction is not queued or running"}), 409
+
+    # Завдання з черги ще не потрапило до воркера, тому статус сесії записує API;
+    # завдання, що виконується, зупиняє його воркер і сам записує статус
+    if previous_state == JOB_QUEUED:
+        update_session_state(
+            session_results_dir,
+            {"session_id": session_id, "status": "cancelled", "completed_at": time.time()},
+        )
+        append_event(session_results_dir, {"type": "status", "status": "cancelled", "error": None})
+        disk_usage.record(session_id, status="cancelled")
+
+    return (
+        jsonify(
+            {
+                "session_id": session_id,
+                "job_id": job["id"],
+                "job_state": "cancelled",
+                "status": "cancelled",
+                "message": "Reconstruction cancelled",
+            }
+        ),
+        202,
+    )
 
 
 @app.route("/api/results/<session_id>", methods=["GET"])
@@ -162,25 +597,29 @@ def get_results(session_id):
     if not os.path.exists(session_results_dir):
         return jsonify({"error": "Results not found"}), 404
 
-    metadata_path = os.path.join(session_results_dir, "metadata.json")
-    if not os.path.exists(metadata_path):
+    metadata = load_session_state(session_results_dir)
+    if not metadata:
         return jsonify({"error": "Results metadata not found"}), 404
 
-    with open(metadata_path, "r") as f:
-        metadata = json.load(f)
-
-    # Формуємо URL для завантаження моделі
+    # Формуємо URL для завантаження моделей з маніфесту артефактів
+    manifest = manifest_index.get(
+        session_id, build_missing=metadata.get("status") == "completed"
+    )
     files = []
-    for filename in os.listdir(session_results_dir):
-        if filename.endswith((".obj", ".ply", ".stl", ".gltf", ".glb")):
+    for artifact in manifest["artifacts"] if manifest else []:
+        if artifact["format"] in MODEL_FORMATS:
             files.append(
                 {
-                    "filename": filename,
-                    "url": f"{base_url}/api/results/{session_id}/{filename}",
+                    "filename": artifact["path"],
+                    "url": f"{base_url}/api/results/{session_id}/{artifact['path']}",
+                    "format": artifact["format"],
+                    "size": artifact["size"],
+                    "roles": artifact["roles"],
                 }
             )
 
     metadata["files"] = files
+    disk_usage.touch(session_id)
 
     return jsonify(metadata)
 
@@ -188,117 +627,45 @@ def get_results(session_id):
 @app.route("/api/results/<session_id>/<path:filename>", methods=["GET"])
 def serve_results_file(session_id, filename):
     """Serve files from the results directory"""
-    session_results_dir = os.path.join(app.config["RESULTS_FOLDER"], session_id)
-    # Handle nested paths correctly
-    file_path = os.path.normpath(os.path.join(session_results_dir, filename))
-
-    # Security check to ensure the file is within the session directory
-    if not file_path.startswith(session_results_dir):
-        return jsonify({"error": "Invalid file path"}), 403
-
-    directory = os.path.dirname(file_path)
-    base_filename = os.path.basename(file_path)
-
-    # Перевірка існування файлу
-    if not os.path.exists(file_path):
-        return jsonify({"error": "File not found", "path": file_path}), 404
-
-    return send_from_directory(directory, base_filename)
+    return send_result_file(session_id, filename)
 
 
 @app.route("/api/model/<session_id>", methods=["GET"])
 def get_model(session_id):
     """Endpoint for getting 3D model data for display in web browser"""
-    logger.info(f"Отримано запит на модель для сесії: {session_id}")
-
     try:
         session_results_dir = os.path.join(app.config["RESULTS_FOLDER"], session_id)
-        logger.info(f"Шукаємо в директорії: {session_results_dir}")
 
         if not os.path.exists(session_results_dir):
             logger.warning(f"Директорія не існує: {session_results_dir}")
             return jsonify({"error": "Results directory not found"}), 404
 
-        # Priority order of formats
-        model_extensions = [".gltf", ".glb", ".obj", ".ply"]
-
-        model_file = None
-        subdir_path = None
-
-        # First check in the main results directory
-        logger.info(f"Вміст головної директорії: {os.listdir(session_results_dir)}")
-        for ext in model_extensions:
-            possible_files = [
-                f for f in os.listdir(session_results_dir) if f.endswith(ext)
-            ]
-            if possible_files:
-                model_file = possible_files[0]
-                subdir_path = ""
-                logger.info(f"Знайдено файл у головній директорії: {model_file}")
-                break
-
-        # If not found, check subdirectories
-        if not model_file:
-            for subdir in os.listdir(session_results_dir):
-                full_subdir_path = os.path.join(session_results_dir, subdir)
-                if os.path.isdir(full_subdir_path):
-                    logger.info(f"Перевіряємо піддиректорію: {subdir}")
-                    logger.info(f"Вміст піддиректорії: {os.listdir(full_subdir_path)}")
-                    for ext in model_extensions:
-                        possible_files = [
-                            f for f in os.listdir(full_subdir_path) if f.endswith(ext)
-                        ]
-                        if possible_files:
-                            model_file = possible_files[0]
-                            subdir_path = subdir
-                            logger.info(
-                                f"Знайдено файл у піддиректорії: {subdir}/{model_file}"
-                            )
-                            break
-                    if model_file:
-                        break
-
-        if not model_file:
-            logger.warning("Модель не знайдено в жодній директорії")
+        # Модель для перегляду визначається маніфестом артефактів без сканування директорій
+        manifest = manifest_index.get(session_id)
+        if manifest is None and read_session_status(session_id) == "completed":
+            # Сесія створена до появи маніфестів - будуємо його один раз
+            manifest = manifest_index.get(session_id, build_missing=True)
+
+        artifact = manifest["by_role"].get(ROLE_PREVIEW) if manifest else None
+        if artifact is None:
+            logger.warning(f"Модель для сесії {session_id} не знайдено в маніфесті")
             return (
                 jsonify(
                     {
                         "error": "No 3D model found",
-                        "details": f"Searched in {session_results_dir}",
-                        "available_files": os.listdir(session_results_dir),
+                        "details": f"No preview artifact for session {session_id}",
                     }
                 ),
                 404,
             )
 
-        # Construct the correct URL path for the model
-        if subdir_path:
-            model_url = (
-                f"{base_url}/api/results/{session_id}/{subdir_path}/{model_file}"
-            )
-            full_model_path = os.path.join(session_results_dir, subdir_path, model_file)
-        else:
-            model_url = f"{base_url}/api/results/{session_id}/{model_file}"
-            full_model_path = os.path.join(session_results_dir, model_file)
-
-        logger.info(f"Створено URL моделі: {model_url}")
-        logger.info(f"Повний шлях до файлу: {full_model_path}")
-
-        # Verify file exists
-        if not os.path.exists(full_model_path):
-            logger.warning(f"Файл не існує за шляхом: {full_model_path}")
-            return (
-                jsonify({"error": "Model file not found", "path": full_model_path}),
-                404,
-            )
-
         response_data = {
-            "model_url": model_url,
-            "model_type": os.path.splitext(model_file)[1][1:],
+            "model_url": f"{base_url}/api/results/{session_id}/{artifact['path']}",
+            "model_type": artifact["format"],
             "session_id": session_id,
-            "file_name": model_file,
+            "file_name": os.path.basename(artifact["path"]),
         }
-        logger.info(f"Відповідь API: {response_data}")
+        disk_usage.touch(session_id)
         return jsonify(response_data)
 
     except Exception as e:
@@ -312,8 +679,7 @@ def get_model(session_id):
 @app.route("/api/download/<session_id>/<filename>", methods=["GET"])
 def download_file(session_id, filename):
     """Ендпоінт для завантаження згенерованих файлів"""
-    session_results_dir = os.path.join(app.config["RESULTS_FOLDER"], session_id)
-    return send_from_directory(session_results_dir, filename, as_attachment=True)
+    return send_result_file(session_id, filename, as_attachment=True)
 
 
 @app.route("/api/download-zip/<session_id>", methods=["GET"])
@@ -324,41 +690,110 @@ def download_all_results(session_id):
     if not os.path.exists(session_results_dir):
         return jsonify({"error": "Results not found"}), 404
 
-    # Створюємо тимчасовий ZIP-файл
-    zip_filename = f"{session_id}_results.zip"
-    zip_path = os.path.join(session_results_dir, zip_filename)
-
-    shutil.make_archive(
-        os.path.splitext(zip_path)[0],  # Вихідний шлях без розширення
-        "zip",  # Формат архіву
-        session_results_dir,  # Директорія для архівації
+    # Архів формується потоково, без тимчасового файлу на диску
+    metadata = load_session_state(session_results_dir)
+
+    # Результати завершеної сесії не змінюються, тому каталог архіву можна кешувати
+    # Стиснені gzip-варіанти дублюють моделі, тому в архів не потрапляють
+    manifest = manifest_index.get(session_id)
+    variants = manifest["variants"] if manifest else set()
+    files = [
+        rel_path
+        for rel_path in iter_result_files(session_results_dir, include_metadata=True)
+        if rel_path.replace(os.sep, "/") not in variants
+    ]
+    archive = ZipStream(
+        session_results_dir,
+        files,
+        cache=metadata.get("status") == "completed",
+        logger=logger,
     )
 
-    return send_from_directory(session_results_dir, zip_filename, as_attachment=True)
+    headers = {"Content-Disposition": f"attachment; filename={session_id}_results.zip"}
+    content_length = archive.content_length()
+    if content_length is not None:
+        headers["Content-Length"] = str(content_length)
+
+    disk_usage.touch(session_id)
+    return Response(archive.generate(), mimetype="application/zip", headers=headers)
 
 
 @app.route("/api/delete/<session_id>", methods=["DELETE"])
 def delete_session(session_id):
     """Видалення сесії та всіх пов'язаних з нею файлів"""
-    session_upload_dir = os.path.join(app.config["UPLOAD_FOLDER"], session_id)
     session_results_dir = os.path.join(app.config["RESULTS_FOLDER"], session_id)
 
     deleted = False
 
-    if os.path.exists(session_upload_dir):
-        shutil.rmtree(session_upload_dir)
+    # Блоби звільняються лише тоді, коли їх не використовує жодна інша сесія
+    if upload_store.delete_session(session_id):
         deleted = True
 
     if os.path.exists(session_results_dir):
         shutil.rmtree(session_results_dir)
+        manifest_index.invalidate(session_id)
+        delete_session_state(session_id)
         deleted = True
 
+    disk_usage.remove(session_id)
+
     if not deleted:
         return jsonify({"error": "Session not found"}), 404
 
     return jsonify({"session_id": session_id, "status": "deleted"})
 
 
+@app.route("/api/events/<session_id>", methods=["GET"])
+def stream_events(session_id):
+    """Потік подій прогресу реконструкції (Server-Sent Events)"""
+    session_results_dir = os.path.join(app.config["RESULTS_FOLDER"], session_id)
+
+    if not os.path.exists(session_results_dir):
+        return jsonify({"error": "Session not found"}), 404
+
+    # EventSource передає Last-Event-ID при перепідключенні, параметр запиту - для першого підключення
+    last_event_id = request.headers.get("Last-Event-ID") or request.args.get("last_event_id", "0")
+    try:
+        last_event_id = int(last_event_id)
+    except ValueError:
+        last_event_id = 0
+
+    # Сесія, завершена до появи журналу подій - віддаємо лише підсумковий статус
+    if not os.path.exists(os.path.join(session_results_dir, EVENTS_FILE)):
+        status = read_session_status(session_id)
+        if status in TERMINAL_STATUSES:
+            event = json.dumps({"type": "status", "status": status})
+            return Response(
+                f"event: status\ndata: {event}\n\n", mimetype="text/event-stream"
+            )
+
+    subscriber = progress_broadcaster.subscribe(session_id, last_event_id)
+
+    def generate():
+        try:
+            yield f"retry: {SSE_RETRY_MS}\n\n"
+            while True:
+                try:
+                    event_id, event = subscriber.get(timeout=SSE_KEEPALIVE_INTERVAL)
+                except queue.Empty:
+                    # Коментар підтримує з'єднання через проксі
+                    yield ": keepalive\n\n"
+                    continue
+
+                data = json.dumps(event, ensure_ascii=False)
+                yield f"id: {event_id}\nevent: {event.get('type', 'message')}\ndata: {data}\n\n"
+                if is_terminal(event):
+                    break
+        finally:
+            progress_broadcaster.unsubscribe(session_id, subscriber)
+
+    return Response(
+        generate(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.route("/api/status/<session_id>", methods=["GET"])
 def check_status(session_id):
     """Перевірка статусу процесу реконструкції"""
@@ -367,9 +802,9 @@ def check_status(session_id):
     if not os.path.exists(session_results_dir):
         return jsonify({"error": "Session not found"}), 404
 
-    # Зчитуємо метадані
-    metadata_path = os.path.join(session_results_dir, "metadata.json")
-    if not os.path.exists(metadata_path) or os.path.getsize(metadata_path) == 0:
+    # Зчитуємо метадані (записуються атомарно, тому частково записаного файлу не буває)
+    metadata = load_session_state(session_results_dir)
+    if not metadata:
         return (
             jsonify(
                 {
@@ -381,26 +816,25 @@ def check_status(session_id):
             404,
         )
 
-    try:
-        with open(metadata_path, "r") as f:
-            metadata = json.load(f)
-    except json.JSONDecodeError:
-        # Якщо файл існує, але має невалідний JSON
-        return (
-            jsonify(
-                {
-                    "session_id": session_id,
-                    "status": "unknown",
-                    "error": "Invalid metadata format",
-                }
-            ),
-            500,
-        )
+    # Додаємо стан завдання в черзі
+    job = job_queue.get_latest_for_session(session_id)
+    if job is not None:
+        metadata["job_id"] = job["id"]
+        metadata["job_state"] = job["state"]
+        if job["state"] == "queued":
+            metadata["queue_position"] = job_queue.queue_position(job["id"])
+        elif job["state"] == "failed" and metadata["status"] == "processing":
+            # Воркер завершився до того, як встиг оновити метадані
+            metadata["status"] = "failed"
+            metadata["error"] = job["error"]
+        elif job["state"] == "cancelled" and metadata["status"] == "processing":
+            # Воркер ще зупиняє процес завдання
+            metadata["status"] = "cancelled"
 
     # Додаємо прогрес
     if metadata["status"] == "processing":
         # Тут можна додати логіку розрахунку прогресу
-        started_at = metadata.get("started_at", 0)
+        started_at = metadata.get("started_at", metadata.get("queued_at", 0))
         elapsed_time = time.time() - started_at
         metadata["elapsed_time"] = int(elapsed_time)
 
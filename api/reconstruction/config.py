@@ -0,0 +1,144 @@
+import os
+
+# Кореневі директорії даних (спільні для API та процесів-воркерів)
+DATA_ROOT = os.environ.get("DATA_ROOT", "/data")
+UPLOAD_FOLDER = os.environ.get("UPLOAD_FOLDER", os.path.join(DATA_ROOT, "uploads"))
+RESULTS_FOLDER = os.environ.get("RESULTS_FOLDER", os.path.join(DATA_ROOT, "results"))
+
+# Спільне контентно-адресоване сховище зображень
+BLOB_FOLDER = os.environ.get("BLOB_FOLDER", os.path.join(DATA_ROOT, "blobs"))
+
+# Кеш результатів реконструкції та його максимальний розмір
+RESULT_CACHE_FOLDER = os.environ.get(
+    "RESULT_CACHE_FOLDER", os.path.join(DATA_ROOT, "cache", "results")
+)
+RESULT_CACHE_MAX_BYTES = int(os.environ.get("RESULT_CACHE_MAX_BYTES", str(20 * 1024 ** 3)))
+
+# Кеш ключових точок зображень (за хешем вмісту та параметрами детектора); 0 - вимкнено
+FEATURE_CACHE_FOLDER = os.environ.get(
+    "FEATURE_CACHE_FOLDER", os.path.join(DATA_ROOT, "cache", "features")
+)
+FEATURE_CACHE_MAX_BYTES = int(os.environ.get("FEATURE_CACHE_MAX_BYTES", str(5 * 1024 ** 3)))
+
+# Кеш перевірених зіставлень пар зображень (за хешами пари та параметрами); 0 - вимкнено
+MATCH_CACHE_FOLDER = os.environ.get(
+    "MATCH_CACHE_FOLDER", os.path.join(DATA_ROOT, "cache", "matches")
+)
+MATCH_CACHE_MAX_BYTES = int(os.environ.get("MATCH_CACHE_MAX_BYTES", str(5 * 1024 ** 3)))
+
+# Бюджет пар зіставлення залежно від якості: кількість найподібніших зображень (VLAD),
+# з якими зіставляється кожне зображення; 0 - зіставляти всі пари
+MATCHING_PAIR_BUDGET = {
+    "low": int(os.environ.get("MATCHING_PAIR_BUDGET_LOW", "10")),
+    "medium": int(os.environ.get("MATCHING_PAIR_BUDGET_MEDIUM", "20")),
+    "high": int(os.environ.get("MATCHING_PAIR_BUDGET_HIGH", "40")),
+}
+
+# Режими зіставлення: 'auto' - усі пари або відбір за VLAD у межах бюджету вище,
+# 'sequential' - впорядковані кадри (поворотний стіл, обхід об'єкта з відео)
+MATCHING_MODES = ("auto", "sequential")
+
+# Послідовне зіставлення: кожне зображення зіставляється з overlap наступними
+# (за іменем файлу), кожне loop_period-те - ще й з loop_candidates найподібнішими
+# поза вікном (замикання циклу); loop_period 0 вимикає замикання
+SEQUENTIAL_MATCHING = {
+    "overlap": int(os.environ.get("SEQUENTIAL_MATCHING_OVERLAP", "10")),
+    "loop_period": int(os.environ.get("SEQUENTIAL_MATCHING_LOOP_PERIOD", "10")),
+    "loop_candidates": int(os.environ.get("SEQUENTIAL_MATCHING_LOOP_CANDIDATES", "5")),
+}
+
+# Словник vocabulary tree для COLMAP vocab_tree_matcher (якщо не задано -
+# пари для COLMAP відбираються за VLAD з дескрипторів у його базі)
+COLMAP_VOCAB_TREE_PATH = os.environ.get("COLMAP_VOCAB_TREE_PATH", "")
+
+# База даних черги завдань реконструкції
+JOBS_DB_PATH = os.environ.get("JOBS_DB_PATH", os.path.join(DATA_ROOT, "jobs.db"))
+
+# Інтервал, з яким процес API оновлює метрики для /metrics (секунди)
+METRICS_REFRESH_INTERVAL = float(os.environ.get("METRICS_REFRESH_INTERVAL", "15"))
+
+# Кількість виділених процесів-воркерів реконструкції
+RECONSTRUCTION_WORKERS = int(os.environ.get("RECONSTRUCTION_WORKERS", "2"))
+
+# Інтервал опитування черги воркером (секунди)
+WORKER_POLL_INTERVAL = float(os.environ.get("WORKER_POLL_INTERVAL", "2.0"))
+
+# Максимальна кількість спроб виконання завдання після аварійного завершення воркера
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", "3"))
+
+# Ресурси, які резервуються під одне завдання залежно від якості,
+# та жорсткий ліміт пам'яті процесу завдання
+JOB_RESOURCE_REQUIREMENTS = {
+    "low": {"cores": 1, "memory_mb": 2048, "memory_limit_mb": 4096},
+    "medium": {"cores": 2, "memory_mb": 4096, "memory_limit_mb": 8192},
+    "high": {"cores": 4, "memory_mb": 8192, "memory_limit_mb": 16384},
+}
+
+# Глобальне перевизначення ліміту пам'яті процесу завдання (0 - брати з таблиці вище)
+JOB_MEMORY_LIMIT_MB = int(os.environ.get("JOB_MEMORY_LIMIT_MB", "0"))
+
+# Тип ліміту: 'data' (RLIMIT_DATA, сумісний з CUDA) або 'as' (RLIMIT_AS)
+JOB_MEMORY_RLIMIT = os.environ.get("JOB_MEMORY_RLIMIT", "data")
+
+# Інтервал перевірки RSS процесу завдання (секунди)
+JOB_MEMORY_CHECK_INTERVAL = float(os.environ.get("JOB_MEMORY_CHECK_INTERVAL", "1.0"))
+
+# Час (секунди), за який скасоване завдання має завершитись після SIGTERM,
+# перш ніж його дерево процесів буде знищено примусово
+JOB_CANCEL_GRACE = float(os.environ.get("JOB_CANCEL_GRACE", "10"))
+
+# Час (секунди) без сигналу від воркера, після якого його завдання на іншому хості
+# вважається покинутим і повертається в чергу
+JOB_HEARTBEAT_TIMEOUT = float(os.environ.get("JOB_HEARTBEAT_TIMEOUT", "120"))
+
+# Сховище стану сесій: 'json' (лише metadata.json) або 'sqlite' (WAL у базі черги + metadata.json)
+SESSION_STATE_BACKEND = os.environ.get("SESSION_STATE_BACKEND", "json")
+
+# Мінімальний інтервал між записами стану сесії на диск (секунди)
+SESSION_STATE_FLUSH_INTERVAL = float(os.environ.get("SESSION_STATE_FLUSH_INTERVAL", "1.0"))
+
+# Час життя сесій за статусом (секунди від останньої зміни або доступу; 0 - без обмеження).
+# Сесії, що обробляються, прибиральник не видаляє
+SESSION_TTL_SECONDS = {
+    "uploading": int(os.environ.get("SESSION_TTL_UPLOADING", str(24 * 3600))),
+    "uploaded": int(os.environ.get("SESSION_TTL_UPLOADED", str(7 * 24 * 3600))),
+    "failed": int(os.environ.get("SESSION_TTL_FAILED", str(7 * 24 * 3600))),
+    "completed": int(os.environ.get("SESSION_TTL_COMPLETED", str(30 * 24 * 3600))),
+    "cancelled": int(os.environ.get("SESSION_TTL_CANCELLED", str(7 * 24 * 3600))),
+}
+
+# Загальний бюджет диску для сесій; понад нього витісняються найдавніше
+# використані завершені сесії (0 - без обмеження)
+DISK_BUDGET_BYTES = int(os.environ.get("DISK_BUDGET_BYTES", str(200 * 1024 ** 3)))
+
+# Інтервал запуску прибиральника в головному процесі пулу воркерів (секунди)
+JANITOR_INTERVAL = float(os.environ.get("JANITOR_INTERVAL", "300"))
+
+# Вік тимчасової директорії сесії без активного завдання, після якого вона видаляється
+ORPHAN_TEMP_MAX_AGE = int(os.environ.get("ORPHAN_TEMP_MAX_AGE", "3600"))
+
+# Зберігати проміжні результати (щільну хмару точок, сцени OpenMVS) після завершення
+# реконструкції, щоб повторно виконувати наступні етапи з іншими параметрами
+RETAIN_INTERMEDIATES = os.environ.get("RETAIN_INTERMEDIATES", "1") == "1"
+
+# Кількість ядер, у межах якої незалежні етапи пайплайну (формати експорту,
+# попередній перегляд) виконуються паралельно (0 - ядра, зарезервовані під завдання)
+PIPELINE_CPU_BUDGET = int(os.environ.get("PIPELINE_CPU_BUDGET", "0"))
+
+# Планувальник етапів між завданнями: кожен етап орендує ядра, пам'ять та
+# ексклюзивні зовнішні інструменти лише на час свого виконання, тому легкі етапи
+# одних сесій виконуються одночасно з важкими етапами інших
+STAGE_SCHEDULER = os.environ.get("STAGE_SCHEDULER", "1") == "1"
+
+# Інтервал повторної перевірки запиту на ресурси етапу (секунди)
+STAGE_LEASE_POLL_INTERVAL = float(os.environ.get("STAGE_LEASE_POLL_INTERVAL", "0.5"))
+
+# Час очікування, після якого запит етапу блокує новіші запити (секунди)
+STAGE_LEASE_FAIRNESS_WAIT = float(os.environ.get("STAGE_LEASE_FAIRNESS_WAIT", "60"))
+
+# Кількість потоків завдання для OpenMP/OpenCV та зовнішніх програм
+# (0 - кількість ядер, зарезервованих під завдання)
+JOB_THREADS = int(os.environ.get("JOB_THREADS", "0"))
+
+# Прив'язувати процес завдання до найменш завантажених ядер
+JOB_CPU_AFFINITY = os.environ.get("JOB_CPU_AFFINITY", "0") == "1"
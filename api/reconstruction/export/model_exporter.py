@@ -1,21 +1,40 @@
 import os
+import threading
 import open3d as o3d
+from ..utils.artifact_manifest import ArtifactManifest, ROLE_MODEL, ROLE_EXPORT
+
+# Групи форматів експорту; групи незалежні й можуть виконуватись паралельно
+# ('preview' - GLTF/GLB для веб-візуалізації)
+EXPORT_GROUPS = ("ply", "obj", "preview", "stl")
 
 class ModelExporter:
     """
     Клас для експорту 3D-моделей у різні формати.
     """
     
-    def __init__(self, output_dir, logger):
+    def __init__(self, output_dir, logger, manifest=None):
         """
         Ініціалізація експортера моделей.
         
         Args:
             output_dir (str): Директорія для результатів
             logger: Об'єкт для логування
+            manifest (ArtifactManifest, optional): Маніфест артефактів пайплайну;
+                якщо не задано, доповнюється наявний маніфест сесії
         """
         self.output_dir = output_dir
         self.logger = logger
+        self.manifest = manifest
+        
+        # Меш завантажується один раз для всіх форматів
+        self._meshes = {}
+        self._mesh_lock = threading.Lock()
+    
+    def _load_mesh(self, mesh_path):
+        with self._mesh_lock:
+            if mesh_path not in self._meshes:
+                self._meshes[mesh_path] = o3d.io.read_triangle_mesh(mesh_path)
+            return self._meshes[mesh_path]
     
     def export_model(self, mesh_path):
         """
@@ -29,63 +48,118 @@ class ModelExporter:
         """
         self.logger.info("Експорт моделі в різні формати")
         
-        # Завантажуємо меш
-        mesh = o3d.io.read_triangle_mesh(mesh_path)
         exported_formats = []
+        for group in EXPORT_GROUPS:
+            exported_formats.extend(self.export_group(mesh_path, group))
+        
+        self.logger.info(f"Модель експортовано в {len(exported_formats)} форматів")
+        
+        self.write_manifest(mesh_path, exported_formats)
+        return exported_formats
+    
+    def export_group(self, mesh_path, group):
+        """
+        Експортує модель в одну групу форматів. Помилка експорту записується
+        в лог і не зупиняє експорт інших форматів.
+        
+        Args:
+            mesh_path (str): Шлях до мешу
+            group (str): Група форматів з EXPORT_GROUPS
+        
+        Returns:
+            list: Список створених форматів [{'format', 'path'}]
+        """
+        exporters = {
+            "ply": self._export_ply,
+            "obj": self._export_obj,
+            "preview": self._export_preview,
+            "stl": self._export_stl,
+        }
         
         try:
-            # Експортуємо в PLY (Point Cloud Library формат)
-            ply_path = os.path.join(self.output_dir, "model.ply")
-            o3d.io.write_triangle_mesh(ply_path, mesh)
-            exported_formats.append({"format": "ply", "path": ply_path})
-            self.logger.info(f"Модель експортовано в PLY: {ply_path}")
+            return exporters[group](mesh_path)
+        except Exception as e:
+            self.logger.error(f"Помилка під час експорту моделі ({group}): {str(e)}")
+            import traceback
+            self.logger.error(traceback.format_exc())
+            return []
+    
+    def _export_ply(self, mesh_path):
+        # Експортуємо в PLY (Point Cloud Library формат)
+        ply_path = os.path.join(self.output_dir, "model.ply")
+        o3d.io.write_triangle_mesh(ply_path, self._load_mesh(mesh_path))
+        self.logger.info(f"Модель експортовано в PLY: {ply_path}")
+        return [{"format": "ply", "path": ply_path}]
+    
+    def _export_obj(self, mesh_path):
+        # Експортуємо в OBJ з MTL
+        obj_path = os.path.join(self.output_dir, "model_with_texture.obj")
+        o3d.io.write_triangle_mesh(obj_path, self._load_mesh(mesh_path), write_triangle_uvs=True)
+        self.logger.info(f"Модель експортовано в OBJ: {obj_path}")
+        return [{"format": "obj", "path": obj_path}]
+    
+    def _export_preview(self, mesh_path):
+        # Генеруємо GLTF для веб-візуалізації
+        exported_formats = []
+        try:
+            import trimesh
+            tm_mesh = trimesh.load(mesh_path)
             
-            # Експортуємо в OBJ з MTL
-            obj_path = os.path.join(self.output_dir, "model_with_texture.obj")
-            o3d.io.write_triangle_mesh(obj_path, mesh, write_triangle_uvs=True)
-            exported_formats.append({"format": "obj", "path": obj_path})
-            self.logger.info(f"Модель експортовано в OBJ: {obj_path}")
+            # GLTF формат
+            gltf_path = os.path.join(self.output_dir, "model.gltf")
+            tm_mesh.export(gltf_path)
+            exported_formats.append({"format": "gltf", "path": gltf_path})
+            self.logger.info(f"Модель експортовано в GLTF: {gltf_path}")
             
-            # Генеруємо GLTF для веб-візуалізації
-            try:
-                import trimesh
-                tm_mesh = trimesh.load(mesh_path)
-                
-                # GLTF формат
-                gltf_path = os.path.join(self.output_dir, "model.gltf")
-                tm_mesh.export(gltf_path)
-                exported_formats.append({"format": "gltf", "path": gltf_path})
-                self.logger.info(f"Модель експортовано в GLTF: {gltf_path}")
-                
-                # Бінарний GLTF (GLB)
-                glb_path = os.path.join(self.output_dir, "model.glb")
-                tm_mesh.export(glb_path)
-                exported_formats.append({"format": "glb", "path": glb_path})
-                self.logger.info(f"Модель експортовано в GLB: {glb_path}")
-                
-            except Exception as e:
-                self.logger.warning(f"Не вдалося експортувати в GLTF/GLB: {str(e)}")
-                
-            # Експортуємо в STL для 3D-друку
-            try:
-                stl_path = os.path.join(self.output_dir, "model.stl")
-                if hasattr(o3d.io, 'write_triangle_mesh'):
-                    o3d.io.write_triangle_mesh(stl_path, mesh)
-                    exported_formats.append({"format": "stl", "path": stl_path})
-                    self.logger.info(f"Модель експортовано в STL: {stl_path}")
-                else:
-                    # Альтернативно через trimesh, якщо доступний
-                    if 'trimesh' in locals():
-                        tm_mesh.export(stl_path)
-                        exported_formats.append({"format": "stl", "path": stl_path})
-                        self.logger.info(f"Модель експортовано в STL через trimesh: {stl_path}")
-            except Exception as e:
-                self.logger.warning(f"Не вдалося експортувати в STL: {str(e)}")
+            # Бінарний GLTF (GLB)
+            glb_path = os.path.join(self.output_dir, "model.glb")
+            tm_mesh.export(glb_path)
+            exported_formats.append({"format": "glb", "path": glb_path})
+            self.logger.info(f"Модель експортовано в GLB: {glb_path}")
         
         except Exception as e:
-            self.logger.error(f"Помилка під час експорту моделі: {str(e)}")
-            import traceback
-            self.logger.error(traceback.format_exc())
+            self.logger.warning(f"Не вдалося експортувати в GLTF/GLB: {str(e)}")
+        return exported_formats
+    
+    def _export_stl(self, mesh_path):
+        # Експортуємо в STL для 3D-друку
+        stl_path = os.path.join(self.output_dir, "model.stl")
+        try:
+            if hasattr(o3d.io, 'write_triangle_mesh'):
+                o3d.io.write_triangle_mesh(stl_path, self._load_mesh(mesh_path))
+                self.logger.info(f"Модель експортовано в STL: {stl_path}")
+                return [{"format": "stl", "path": stl_path}]
+            
+            # Альтернативно через trimesh, якщо доступний
+            import trimesh
+            trimesh.load(mesh_path).export(stl_path)
+            self.logger.info(f"Модель експортовано в STL через trimesh: {stl_path}")
+            return [{"format": "stl", "path": stl_path}]
+        except Exception as e:
+            self.logger.warning(f"Не вдалося експортувати в STL: {str(e)}")
+            return []
+    
+    def write_manifest(self, mesh_path, exported_formats, extra_artifacts=()):
+        """
+        Записує маніфест артефактів, з якого API визначає модель для перегляду.
         
-        self.logger.info(f"Модель експортовано в {len(exported_formats)} форматів")
-        return exported_formats
\ No newline at end of file
+        Args:
+            mesh_path (str): Шлях до основної моделі
+            exported_formats (list): Список експортованих форматів
+            extra_artifacts (iterable, optional): Додаткові пари (шлях, роль)
+        """
+        try:
+            if self.manifest is None:
+                self.manifest = ArtifactManifest.load(self.output_dir, self.logger)
+            
+            for path, role in extra_artifacts:
+                self.manifest.add(path, role)
+            self.manifest.add(mesh_path, ROLE_MODEL)
+            for exported in exported_formats:
+                self.manifest.add(exported["path"], ROLE_EXPORT)
+            
+            # Стиснені варіанти текстових форматів для передачі в браузер
+            self.manifest.add_gzip_variants()
+            self.manifest.save()
+        except Exception as e:
+            self.logger.warning(f"Не вдалося записати маніфест артефактів: {str(e)}")
@@ -0,0 +1,218 @@
+import os
+import time
+import shutil
+from . import config
+from .utils.checkpoints import StageCheckpoints
+from .utils.disk_usage import directory_size
+from .utils.job_queue import JOB_QUEUED, JOB_RUNNING
+from .utils.session_state import load_session_state, delete_session_state
+
+
+class Janitor:
+    """
+    Прибиральник сесій: видаляє сесії з вичерпаним часом життя, витісняє
+    найдавніше використані завершені сесії понад бюджет диску та видаляє
+    тимчасові директорії, що залишились після аварійно завершених завдань.
+    """
+
+    def __init__(self, job_queue, ledger, upload_store, logger, interval=None):
+        """
+        Ініціалізація прибиральника.
+
+        Args:
+            job_queue (JobQueue): Черга завдань (сесії з активними завданнями не чіпаються)
+            ledger (DiskUsageLedger): Облік дискового простору сесій
+            upload_store (UploadStore): Сховище завантажень (звільняє блоби сесії)
+            logger (Logger): Логер для запису повідомлень
+            interval (float, optional): Інтервал між проходами (секунди)
+        """
+        self.job_queue = job_queue
+        self.ledger = ledger
+        self.upload_store = upload_store
+        self.logger = logger
+        self.interval = config.JANITOR_INTERVAL if interval is None else interval
+        self._last_run = 0.0
+
+    def maybe_run(self):
+        """
+        Виконує прохід, якщо з попереднього минув інтервал.
+        Помилки записуються в лог і не зупиняють процес, що викликає.
+        """
+        if time.monotonic() - self._last_run < self.interval:
+            return
+        self._last_run = time.monotonic()
+
+        try:
+            self.run_once()
+        except Exception as e:
+            self.logger.error(f"Помилка прибиральника сесій: {str(e)}")
+
+    def run_once(self):
+        """
+        Виконує один прохід прибирання.
+
+        Returns:
+            dict: Кількість видалених сесій та тимчасових директорій
+        """
+        sessions = self._sync_ledger()
+        summary = {"expired": 0, "evicted": 0, "temp_reaped": 0}
+
+        for session_id in list(sessions):
+            if self._is_active(session_id):
+                continue
+            if self._reap_orphaned_temp(session_id):
+                summary["temp_reaped"] += 1
+
+        summary["expired"] = self._expire_sessions(sessions)
+        summary["evicted"] = self._enforce_budget()
+
+        if any(summary.values()):
+            self.logger.info(
+                f"Прибирання: видалено за часом життя {summary['expired']}, "
+                f"витіснено {summary['evicted']}, тимчасових директорій {summary['temp_reaped']}"
+            )
+        return summary
+
+    def _session_ids_on_disk(self):
+        ids = set()
+        for root in (config.RESULTS_FOLDER, config.UPLOAD_FOLDER):
+            try:
+                ids.update(
+                    name for name in os.listdir(root) if os.path.isdir(os.path.join(root, name))
+                )
+            except FileNotFoundError:
+                continue
+        return ids
+
+    def _sync_ledger(self):
+        """
+        Узгоджує облік з директоріями сесій. Обходиться лише дерево сесій,
+        яких ще немає в обліку (створені до його появи), - один раз.
+
+        Returns:
+            dict: session_id -> запис обліку
+        """
+        on_disk = self._session_ids_on_disk()
+        records = {record["session_id"]: record for record in self.ledger.sessions()}
+
+        for session_id in set(records) - on_disk:
+            self.ledger.remove(session_id)
+            del records[session_id]
+
+        for session_id in on_disk - set(records):
+            results_dir = os.path.join(config.RESULTS_FOLDER, session_id)
+            metadata_path = os.path.join(results_dir, "metadata.json")
+            last_access = os.path.getmtime(metadata_path) if os.path.exists(metadata_path) else None
+            self.ledger.record(
+                session_id,
+                status=load_session_state(results_dir).get("status"),
+                results_bytes=directory_size(results_dir, owned_only=True),
+                uploads_bytes=self._uploads_bytes(session_id),
+                last_access=last_access,
+            )
+            records[session_id] = self.ledger.get(session_id)
+
+        return records
+
+    def _uploads_bytes(self, session_id):
+        # Посилання на блоби враховані в категорії сховища блобів
+        return directory_size(self.upload_store.session_dir(session_id), owned_only=True)
+
+    def _is_active(self, session_id):
+        job = self.job_queue.get_latest_for_session(session_id)
+        return job is not None and job["state"] in (JOB_QUEUED, JOB_RUNNING)
+
+    def _expire_sessions(self, sessions):
+        now = time.time()
+        expired = 0
+
+        for session_id, record in sessions.items():
+            status = load_session_state(os.path.join(config.RESULTS_FOLDER, session_id)).get(
+                "status", record["status"]
+            )
+            ttl = config.SESSION_TTL_SECONDS.get(status, 0)
+            if not ttl:
+                continue
+
+            last_used = max(record["updated_at"], record["last_access"])
+            if now - last_used < ttl or self._is_active(session_id):
+                continue
+
+            self.delete_session(session_id, f"час життя статусу {status} вичерпано")
+            expired += 1
+
+        return expired
+
+    def _enforce_budget(self):
+        budget = config.DISK_BUDGET_BYTES
+        if not budget:
+            return 0
+
+        total = self.ledger.total_bytes()
+        evicted = 0
+        if total <= budget:
+            return 0
+
+        # Записи впорядковані від найдавніше використаних
+        for record in self.ledger.sessions():
+            if total <= budget:
+                break
+            results_dir = os.path.join(config.RESULTS_FOLDER, record["session_id"])
+            if load_session_state(results_dir).get("status") != "completed":
+                continue
+            if self._is_active(record["session_id"]):
+                continue
+
+            self.delete_session(record["session_id"], "перевищено бюджет диску")
+            evicted += 1
+            # Спільні блоби звільняються лише з останньою сесією, що на них посилається,
+            # тому загальний розмір перечитується з обліку, а не зменшується на розмір сесії
+            total = self.ledger.total_bytes()
+
+        if total > budget:
+            self.logger.warning(
+                f"Бюджет диску перевищено ({total} > {budget} байт), "
+                f"але завершених сесій для витіснення більше немає"
+            )
+        return evicted
+
+    def _reap_orphaned_temp(self, session_id):
+        session_dir = os.path.join(config.RESULTS_FOLDER, session_id)
+        temp_dir = os.path.join(session_dir, "temp")
+
+        # Проміжні результати завершеної сесії потрібні для повторного виконання
+        # етапів і видаляються разом із сесією. Тимчасова директорія незавершеної
+        # сесії без активного завдання (збій, скасування) дозволяє відновити
+        # завдання з контрольних точок лише протягом ORPHAN_TEMP_MAX_AGE
+        if load_session_state(session_dir).get("status") == "completed":
+            return False
+
+        try:
+            age = time.time() - os.path.getmtime(temp_dir)
+        except FileNotFoundError:
+            return False
+        if age < config.ORPHAN_TEMP_MAX_AGE:
+            return False
+
+        # Облік містить розміри виходів етапів, тому віднімаються ті з них, яких не стало
+        checkpoints = StageCheckpoints(session_dir, self.logger)
+        size = checkpoints.outputs_size()
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        size -= checkpoints.outputs_size()
+        self.ledger.adjust(session_id, results_delta=-size)
+        self.logger.info(f"Видалено тимчасову директорію сесії {session_id} ({size} байт)")
+        return True
+
+    def delete_session(self, session_id, reason):
+        """
+        Видаляє всі файли сесії та її облікові записи.
+
+        Args:
+            session_id (str): Ідентифікатор сесії
+            reason (str): Причина видалення (для логу)
+        """
+        self.upload_store.delete_session(session_id)
+        shutil.rmtree(os.path.join(config.RESULTS_FOLDER, session_id), ignore_errors=True)
+        delete_session_state(session_id)
+        self.ledger.remove(session_id)
+        self.logger.info(f"Видалено сесію {session_id}: {reason}")
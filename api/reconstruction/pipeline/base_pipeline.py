@@ -1,6 +1,53 @@
-from abc import ABC, abstractmethod
+from abc import ABC
 import os
 import shutil
+import time
+import threading
+import contextlib
+import traceback
+from .. import config
+from .stage_graph import Stage, StageGraph
+from ..export.model_exporter import ModelExporter, EXPORT_GROUPS
+from ..utils.resource_limits import lower_quality
+from ..utils.artifact_manifest import ArtifactManifest
+from ..utils.checkpoints import StageCheckpoints, stage_key
+from ..utils.upload_store import image_hashes
+from ..utils.cancellation import check_cancelled
+from ..utils.metrics import MetricsStore, STAGE_DURATION, STAGE_DURATION_BUCKETS
+from ..utils.profiler import StageProfiler
+from ..utils.timeline import Timeline, geometry_counts
+from ..utils.thread_budget import limit_threads, thread_budget
+
+# Версія пайплайнів; змінюється разом з алгоритмами, щоб старі записи кешу
+# результатів та контрольні точки етапів більше не використовувались
+PIPELINE_VERSION = "1"
+
+# Пам'ять (МБ), яку орендує етап експорту однієї групи форматів
+EXPORT_MEMORY_MB = 1024
+
+def export_stages(source, extra_inputs=()):
+    """
+    Етапи експорту моделі: групи форматів (PLY, OBJ, попередній перегляд, STL)
+    незалежні й виконуються паралельно, після них записується маніфест артефактів.
+    
+    Args:
+        source (str): Етап, результат якого експортується
+        extra_inputs (tuple): Етапи, результати яких додаються до маніфесту
+        
+    Returns:
+        tuple: Етапи (Stage) групи 'export'
+    """
+    formats = tuple(
+        Stage(f"export_{group}", "_stage_export_group", inputs=(source,), outputs="_exported_paths",
+              group="export", degradable=False, args=(source, group), memory_mb=EXPORT_MEMORY_MB)
+        for group in EXPORT_GROUPS
+    )
+    manifest = Stage(
+        "export", "_stage_export",
+        inputs=(source,) + tuple(extra_inputs) + tuple(stage.name for stage in formats),
+        outputs="_manifest_outputs", degradable=False, args=(source,), memory_mb=0,
+    )
+    return formats + (manifest,)
 
 class BasePipeline(ABC):
     """
@@ -8,7 +55,26 @@ class BasePipeline(ABC):
     Всі конкретні пайплайни повинні успадковуватись від нього.
     """
     
-    def __init__(self, input_dir, output_dir, temp_dir, quality, progress_tracker, logger, gpu_available):
+    # Граф етапів пайплайну (Stage) з явними залежностями; група етапу - це
+    # назва, з якої пайплайн можна виконати повторно (from_stage)
+    GRAPH = ()
+    
+    # Етап, результат якого повертає run() (шлях до основної моделі)
+    RESULT_STAGE = "export"
+    
+    # Назва пайплайну в повідомленнях про помилки
+    DISPLAY_NAME = None
+    
+    # Проміжні результати в тимчасовій директорії (відносні шляхи), що залишаються
+    # після завершення для повторного виконання наступних етапів з іншими параметрами
+    RETAINED_INTERMEDIATES = ()
+    
+    # Файли з цими розширеннями видаляються навіть усередині збережених директорій
+    DISCARDED_SUFFIXES = ()
+    
+    def __init__(self, input_dir, output_dir, temp_dir, quality, progress_tracker, logger, gpu_available,
+                 stage_quality=None, stage_params=None, from_stage=None, scheduler=None, profile=False,
+                 matching="auto", disk_usage=None):
         """
         Ініціалізація базового пайплайну.
         
@@ -20,6 +86,19 @@ class BasePipeline(ABC):
             progress_tracker (ProgressTracker): Об'єкт для відстеження прогресу
             logger (Logger): Об'єкт для логування
             gpu_available (bool): Чи доступне GPU
+            stage_quality (dict, optional): Якість для окремих етапів, що
+                перевизначає загальну (наприклад, після нестачі пам'яті)
+            stage_params (dict, optional): Перевизначення параметрів окремих етапів
+                ({'mesh': {'depth': 11}, 'texture': {'resolution_level': 0}})
+            from_stage (str, optional): Етап, з якого виконувати пайплайн; попередні
+                етапи беруться зі збережених проміжних результатів
+            scheduler (StageScheduler, optional): Планувальник, у якого етапи орендують
+                ресурси між завданнями (None - лише бюджет CPU пайплайну)
+            profile (bool): Профілювати етапи (cProfile та tracemalloc)
+            matching (str): Режим зіставлення пар ('auto' - усі пари або відбір за VLAD,
+                'sequential' - ковзне вікно впорядкованих кадрів із замиканням циклів)
+            disk_usage (callable, optional): disk_usage(delta) - облік зміни розміру
+                результатів сесії (вихідні файли етапів та їх видалення при очищенні)
         """
         self.input_dir = input_dir
         self.output_dir = output_dir
@@ -28,6 +107,44 @@ class BasePipeline(ABC):
         self.progress = progress_tracker
         self.logger = logger
         self.gpu_available = gpu_available
+        self.stage_quality = dict(stage_quality or {})
+        self.stage_params = dict(stage_params or {})
+        self.scheduler = scheduler
+        self.matching = matching
+        self.disk_usage = disk_usage
+        
+        # Кількість потоків для бібліотек і зовнішніх програм етапу, що займає всі ядра завдання
+        self.threads = thread_budget(quality)
+        
+        self.graph = StageGraph(self.GRAPH, logger)
+        if from_stage is not None and from_stage not in self.graph.groups:
+            raise ValueError(f"Невідомий етап {from_stage} для пайплайну {type(self).__name__}")
+        self.from_stage = from_stage
+        
+        # Етапи, що виконуються повторно; решта береться зі збережених результатів
+        self._rerun = self.graph.downstream(from_stage) if from_stage is not None else None
+        
+        # Етапи, якість яких було знижено через нестачу пам'яті
+        self.degraded_stages = {}
+        
+        # Маніфест створених артефактів (записується експортером)
+        self.artifacts = ArtifactManifest(output_dir, logger)
+        
+        # Контрольні точки етапів для відновлення після збою та повторних запусків
+        self.checkpoints = StageCheckpoints(output_dir, logger)
+        self._stage_keys = {}
+        self._input_key_value = None
+        self._key_lock = threading.Lock()
+        
+        # Експортер спільний для всіх груп форматів (меш завантажується один раз)
+        self.exporter = ModelExporter(output_dir, logger, self.artifacts)
+        
+        # Тривалість етапів для /metrics (спільна база з чергою завдань)
+        self.metrics = MetricsStore(config.JOBS_DB_PATH, logger)
+        
+        # Часова шкала сесії та профілі етапів (лише на запит)
+        self.timeline = Timeline(output_dir, logger)
+        self.profiler = StageProfiler(output_dir, logger) if profile else None
         
         # Створюємо директорії для етапів реконструкції
         self.sparse_dir = os.path.join(temp_dir, "sparse")
@@ -39,27 +156,431 @@ class BasePipeline(ABC):
         self.logger.info(f"Ініціалізовано базовий пайплайн з якістю {quality}")
         self.logger.info(f"GPU доступність: {'Так' if gpu_available else 'Ні'}")
     
-    @abstractmethod
     def run(self):
         """
-        Запускає повний процес реконструкції.
-        Повинен бути реалізований в похідних класах.
+        Запускає повний процес реконструкції: виконує граф етапів GRAPH
+        і очищає тимчасові файли.
         
         Returns:
             str: Шлях до згенерованої 3D-моделі
         """
-        pass
+        try:
+            # Перевіряємо вхідні дані
+            if not self.validate_input():
+                raise ValueError("Невалідні вхідні дані")
+            
+            if self.profiler is None:
+                results = self.graph.run(self._execute_stage, self._cpu_budget())
+            else:
+                # Профільовані етапи виконуються по одному, щоб пік пам'яті
+                # та час кожного не змішувались з паралельними етапами
+                self.profiler.start()
+                try:
+                    results = self.graph.run(self._execute_stage, 1)
+                finally:
+                    self.profiler.stop()
+            
+            # Очищення тимчасових файлів
+            self.cleanup()
+            
+            return results[self.RESULT_STAGE]
+            
+        except Exception as e:
+            self.logger.error(f"Помилка в {self.DISPLAY_NAME or type(self).__name__} пайплайні: {str(e)}")
+            self.logger.error(traceback.format_exc())
+            raise
+    
+    def _profile(self, stage):
+        """
+        Профілює етап, якщо профілювання ввімкнено.
+        
+        Returns:
+            Контекстний менеджер, що повертає підсумок профілю або None
+        """
+        if self.profiler is None:
+            return contextlib.nullcontext()
+        return self.profiler.stage(stage)
+    
+    def _output_counts(self, stage, result):
+        """
+        Кількість точок, вершин і трикутників у вихідних файлах етапу (PLY, OBJ).
+        
+        Returns:
+            dict: Ім'я файлу -> кількості
+        """
+        if stage.outputs:
+            outputs = getattr(self, stage.outputs)(result)
+        else:
+            outputs = [result] if isinstance(result, str) else []
+        
+        counts = {}
+        for path in outputs:
+            geometry = geometry_counts(path)
+            if geometry is not None:
+                counts[os.path.basename(path)] = geometry
+        return counts
+    
+    def _requirements(self):
+        return config.JOB_RESOURCE_REQUIREMENTS.get(
+            self.quality, config.JOB_RESOURCE_REQUIREMENTS["medium"]
+        )
+    
+    def _cpu_budget(self):
+        """
+        Кількість ядер, у межах якої етапи графа виконуються паралельно.
+        """
+        if config.PIPELINE_CPU_BUDGET > 0:
+            return config.PIPELINE_CPU_BUDGET
+        return self._requirements()["cores"]
+    
+    def _execute_stage(self, stage, inputs):
+        """
+        Виконує вузол графа: викликає його метод з результатами залежностей.
+        
+        Args:
+            stage (Stage): Етап
+            inputs (dict): Результати етапів-залежностей
+            
+        Returns:
+            Результат етапу
+        """
+        func = getattr(self, stage.func)
+        
+        def run(quality):
+            # Контрольна точка скасування: перед етапом і після очікування ресурсів
+            check_cancelled()
+            with self._lease(stage):
+                check_cancelled()
+                # Ліміти OpenMP окремі для кожного потоку, тому задаються в потоці етапу
+                limit_threads(self._stage_cores(stage))
+                # Час очікування ресурсів не входить у тривалість етапу
+                started = time.time()
+                self.timeline.record("stage_start", stage=stage.name, quality=quality)
+                try:
+                    with self._profile(stage.name) as profile:
+                        result = func(quality, inputs, *stage.args)
+                except BaseException as e:
+                    self.timeline.record(
+                        "stage_failed", stage=stage.name, quality=quality,
+                        duration_seconds=round(time.time() - started, 3), error=type(e).__name__,
+                    )
+                    raise
+                duration = time.time() - started
+                
+                self.metrics.observe(STAGE_DURATION, duration, STAGE_DURATION_BUCKETS, {"stage": stage.name})
+                self.timeline.record(
+                    "stage_end", stage=stage.name, quality=quality, duration_seconds=round(duration, 3),
+                    outputs=self._output_counts(stage, result), profile=profile,
+                )
+                return result
+        
+        return self._run_stage(
+            stage.name,
+            run,
+            outputs=getattr(self, stage.outputs) if stage.outputs else None,
+            degradable=stage.degradable,
+            inputs=stage.inputs,
+        )
+    
+    def _stage_cores(self, stage):
+        """
+        Кількість ядер етапу в межах бюджету пайплайну.
+        """
+        budget = self._cpu_budget()
+        return min(stage.cores or budget, budget)
+    
+    def _lease(self, stage):
+        """
+        Орендує в планувальника ресурси на час виконання етапу. Етапи, пропущені
+        за контрольними точками, ресурсів не орендують.
+        
+        Args:
+            stage (Stage): Етап
+            
+        Returns:
+            Контекстний менеджер оренди
+        """
+        if self.scheduler is None:
+            return contextlib.nullcontext()
+        
+        cores = self._stage_cores(stage)
+        memory_mb = stage.memory_mb if stage.memory_mb is not None else self._requirements()["memory_mb"]
+        # GPU орендується ексклюзивно лише тоді, коли пайплайн справді його використовує
+        tool = stage.tool if stage.tool != "gpu" or self.gpu_available else None
+        return self.scheduler.lease(stage.name, cores, memory_mb, tool)
+    
+    def _input_key(self):
+        """
+        Відбиток вхідних зображень, методу, режиму зіставлення та версії пайплайну -
+        корінь ланцюжка ключів контрольних точок.
+        
+        Returns:
+            str: Ключ (hex SHA-256)
+        """
+        data = {
+            "images": sorted(image_hashes(self.input_dir)),
+            "pipeline": type(self).__name__,
+            "version": PIPELINE_VERSION,
+            "matching": self.matching,
+        }
+        return stage_key(None, "input", data)
+    
+    def _run_stage(self, stage, func, outputs=None, params=None, degradable=True, inputs=()):
+        """
+        Виконує етап пайплайну з контрольною точкою та автоматичним
+        зниженням якості при нестачі пам'яті.
+        
+        Якщо для етапу є дійсна контрольна точка (той самий ключ вхідних даних
+        і параметрів, вихідні файли не змінились), етап пропускається
+        і повертається збережений результат.
+        
+        Якщо етап перевищує ліміт пам'яті (MemoryError), він повторюється
+        з параметрами наступного нижчого рівня якості замість того,
+        щоб завершувати всю сесію з помилкою.
+        
+        Args:
+            stage (str): Назва етапу ('sfm', 'pointcloud', 'mesh', 'texture', ...)
+            func (callable): Функція func(quality), що виконує етап
+            outputs (list or callable, optional): Вихідні файли етапу або функція
+                outputs(result), що їх повертає (за замовчуванням - результат-шлях)
+            params (dict, optional): Додаткові параметри етапу для ключа контрольної точки
+            degradable (bool): Чи повторювати етап з нижчою якістю при нестачі пам'яті
+            inputs (tuple): Етапи-залежності, ключі яких входять у ключ цього етапу
+            
+        Returns:
+            Результат func
+        """
+        if self._skipped(stage):
+            self.timeline.record("stage_skipped", stage=stage, reason="from_stage")
+            return self._resume_stage(stage)
+        
+        quality = self.stage_quality.get(stage, self.quality)
+        
+        params = dict(params or {}, **self.stage_params.get(stage, {}))
+        key = stage_key(self._parent_key(inputs), stage, dict(params, quality=quality))
+        
+        checkpoint = self.checkpoints.get(stage, key)
+        if checkpoint is not None:
+            self.logger.info(f"Етап {stage} пропущено: є дійсна контрольна точка")
+            self.timeline.record("stage_skipped", stage=stage, reason="checkpoint")
+            if checkpoint["quality"] != quality:
+                self.degraded_stages[stage] = checkpoint["quality"]
+            self._set_stage_key(stage, stage_key(key, "outputs", checkpoint["outputs"]))
+            return checkpoint["result"]
+        
+        # Виходи попереднього виконання етапу буде перезаписано
+        previous_size = self.checkpoints.outputs_size([stage])
+        
+        result = self._run_with_degradation(stage, func, quality, degradable)
+        
+        if callable(outputs):
+            outputs = outputs(result)
+        elif outputs is None:
+            outputs = [result] if isinstance(result, str) else []
+        signatures = None
+        if outputs:
+            signatures = self.checkpoints.save(
+                stage, key, result, outputs, self.degraded_stages.get(stage, quality)
+            )
+        if signatures is not None:
+            self._account_disk_usage(self.checkpoints.outputs_size([stage]) - previous_size)
+        
+        # Ключі наступних етапів залежать від фактичних вихідних файлів цього,
+        # тому повторно створені виходи роблять недійсними подальші контрольні точки
+        self._set_stage_key(stage, stage_key(key, "outputs", signatures))
+        return result
+    
+    def _account_disk_usage(self, delta):
+        if self.disk_usage is not None and delta:
+            self.disk_usage(delta)
+    
+    def _parent_key(self, inputs):
+        """
+        Ключ, від якого походить ключ етапу: ключ єдиної залежності, спільний
+        ключ кількох залежностей або відбиток вхідних зображень для кореневого етапу.
+        """
+        with self._key_lock:
+            if not inputs:
+                if self._input_key_value is None:
+                    self._input_key_value = self._input_key()
+                return self._input_key_value
+            
+            keys = [self._stage_keys.get(name) for name in inputs]
+        if len(keys) == 1:
+            return keys[0]
+        return stage_key(None, "inputs", keys)
+    
+    def _set_stage_key(self, stage, key):
+        with self._key_lock:
+            self._stage_keys[stage] = key
+    
+    def _skipped(self, stage):
+        """
+        Чи пропускається етап, бо пайплайн виконується з пізнішого етапу.
+        """
+        return self._rerun is not None and stage not in self._rerun
+    
+    def _resume_stage(self, stage):
+        """
+        Повертає збережений результат пропущеного етапу. Етапи, результати
+        яких використовують повторно виконувані етапи, мають мати дійсні
+        вихідні файли - з них продовжується обробка; результати раніших
+        етапів лише передаються далі.
+        
+        Args:
+            stage (str): Назва етапу
+            
+        Returns:
+            Збережений результат етапу
+        """
+        required = any(consumer.name in self._rerun for consumer in self.graph.consumers(stage))
+        
+        checkpoint = self.checkpoints.latest(stage, validate=required)
+        if checkpoint is None:
+            if required:
+                raise RuntimeError(
+                    f"Немає збережених проміжних результатів етапу {stage}, "
+                    f"повторне виконання з етапу {self.from_stage} неможливе"
+                )
+            return None
+        
+        self.logger.info(f"Етап {stage} пропущено: використано збережені проміжні результати")
+        if checkpoint.get("quality") and checkpoint["quality"] != self.stage_quality.get(stage, self.quality):
+            self.degraded_stages[stage] = checkpoint["quality"]
+        self._set_stage_key(stage, stage_key(checkpoint["key"], "outputs", checkpoint["outputs"]))
+        return checkpoint["result"]
+    
+    def _run_with_degradation(self, stage, func, quality, degradable=True):
+        while True:
+            try:
+                return func(quality)
+            except MemoryError as e:
+                lower = lower_quality(quality) if degradable else None
+                if lower is None:
+                    self.logger.error(f"Нестача пам'яті на етапі {stage} навіть з якістю {quality}")
+                    raise
+                
+                self.logger.warning(
+                    f"Нестача пам'яті на етапі {stage} з якістю {quality} ({str(e)}), "
+                    f"повтор з якістю {lower}"
+                )
+                self.progress.update_progress(
+                    stage,
+                    self.progress.get_progress()["progress"],
+                    f"Нестача пам'яті, повтор етапу з якістю {lower}"
+                )
+                self.degraded_stages[stage] = lower
+                quality = lower
+    
+    def _stage_export_group(self, quality, inputs, source, group):
+        """
+        Етап експорту моделі в одну групу форматів.
+        
+        Args:
+            quality (str): Якість етапу
+            inputs (dict): Результати етапів-залежностей
+            source (str): Етап, результат якого експортується
+            group (str): Група форматів з EXPORT_GROUPS
+            
+        Returns:
+            list: Список експортованих форматів [{'format', 'path'}]
+        """
+        self.progress.update_progress("export", 95, "Експорт моделі в різні формати")
+        return self.exporter.export_group(self._export_model(inputs[source]), group)
+    
+    def _stage_export(self, quality, inputs, source):
+        """
+        Завершальний етап експорту: записує маніфест артефактів з усіма
+        експортованими форматами.
+        
+        Args:
+            quality (str): Якість етапу
+            inputs (dict): Результати етапів-залежностей
+            source (str): Етап, результат якого експортується
+            
+        Returns:
+            str: Шлях до основної моделі
+        """
+        mesh_path = self._export_model(inputs[source])
+        
+        exported_formats = []
+        for group in EXPORT_GROUPS:
+            exported_formats.extend(inputs[f"export_{group}"] or [])
+        
+        self.exporter.write_manifest(mesh_path, exported_formats, self._export_artifacts(inputs))
+        
+        self.progress.update_progress("export", 100, "Модель експортовано")
+        self.logger.info(f"Модель експортовано в {len(exported_formats)} форматів")
+        return mesh_path
+    
+    def _export_model(self, result):
+        """
+        Шлях до моделі для експорту з результату етапу-джерела.
+        """
+        return result
+    
+    def _export_artifacts(self, inputs):
+        """
+        Додаткові артефакти (шлях, роль), що записуються в маніфест перед моделлю.
+        """
+        return []
+    
+    def _exported_paths(self, exported_formats):
+        """
+        Вихідні файли етапу групи форматів.
+        """
+        return [exported["path"] for exported in exported_formats or []]
+    
+    def _manifest_outputs(self, mesh_path):
+        """
+        Вихідні файли завершального етапу експорту: маніфест артефактів.
+        """
+        return [self.artifacts.path]
     
     def cleanup(self):
         """
         Очищає тимчасові файли після завершення реконструкції.
+        Проміжні результати з RETAINED_INTERMEDIATES залишаються, якщо
+        їх збереження ввімкнено в конфігурації.
         """
+        if self.quality == 'debug':  # В режимі debug не видаляємо файли
+            return
+        
+        # Звільнене місце - це розмір виходів етапів, яких після очищення не стало
+        size_before = self.checkpoints.outputs_size()
         try:
-            if self.quality != 'debug':  # В режимі debug не видаляємо файли
+            retained = self.RETAINED_INTERMEDIATES if config.RETAIN_INTERMEDIATES else ()
+            if not retained:
                 self.logger.info("Видалення тимчасових файлів")
                 shutil.rmtree(self.temp_dir)
+            else:
+                self.logger.info(f"Видалення тимчасових файлів, крім проміжних результатів: {', '.join(retained)}")
+                self._remove_except(self.temp_dir, [os.path.join(self.temp_dir, path) for path in retained])
         except Exception as e:
             self.logger.warning(f"Не вдалося видалити тимчасові файли: {str(e)}")
+        self._account_disk_usage(self.checkpoints.outputs_size() - size_before)
+    
+    def _remove_except(self, directory, retained):
+        """
+        Видаляє вміст директорії, крім збережених шляхів та директорій, що їх містять.
+        """
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if path in retained:
+                if os.path.isdir(path) and self.DISCARDED_SUFFIXES:
+                    for root, dirs, files in os.walk(path):
+                        for filename in files:
+                            if filename.endswith(self.DISCARDED_SUFFIXES):
+                                os.remove(os.path.join(root, filename))
+                continue
+            
+            if os.path.isdir(path) and not os.path.islink(path):
+                if any(kept.startswith(path + os.sep) for kept in retained):
+                    self._remove_except(path, retained)
+                else:
+                    shutil.rmtree(path)
+            else:
+                os.remove(path)
             
     def validate_input(self):
         """
@@ -1,103 +1,120 @@
 import os
-import subprocess
+import shutil
+import sqlite3
 import traceback
-from .base_pipeline import BasePipeline
+import numpy as np
+from contextlib import closing
+from .. import config
+from .base_pipeline import BasePipeline, export_stages
+from .stage_graph import Stage
 from ..processing.point_cloud import PointCloudProcessor
+from ..processing.retrieval import PairRetrieval
 from ..processing.mesh import MeshProcessor
 from ..processing.texture import TextureProcessor
-from ..export.model_exporter import ModelExporter
 from ..utils.file_utils import run_command
+from ..utils.command_runner import CommandTimeout, run_process
+from ..utils.thread_budget import thread_env
+from ..utils.resource_limits import ResourceLimitExceeded, is_oom_failure
 
 class ColmapPipeline(BasePipeline):
     """
     Пайплайн реконструкції з використанням COLMAP.
     """
     
-    def run(self):
+    # Щільна хмара точок потрібна для повторного створення меша з іншими параметрами
+    RETAINED_INTERMEDIATES = ("dense/fused.ply",)
+    
+    # Етапи реконструкції; важкі етапи займають усі ядра завдання,
+    # групи форматів експорту виконуються паралельно
+    GRAPH = (
+        Stage("sfm", "_stage_sfm", cores=None, tool="gpu"),
+        Stage("pointcloud", "_stage_pointcloud", inputs=("sfm",), cores=None, tool="gpu"),
+        Stage("mesh", "_stage_mesh", inputs=("pointcloud",), cores=None),
+        Stage("clean", "_stage_clean", inputs=("mesh",), degradable=False),
+        Stage("texture", "_stage_texture", inputs=("clean",), cores=None),
+    ) + export_stages("texture")
+    
+    DISPLAY_NAME = "COLMAP"
+    
+    def _stage_sfm(self, quality, inputs):
+        # Етап 1: Structure from Motion з COLMAP
+        self.progress.update_progress("sfm", 10, "Запуск Structure from Motion")
+        self.logger.info("Запуск Structure from Motion з COLMAP")
+        
+        sparse_output = self._run_colmap_sfm(quality)
+        self.progress.update_progress("sfm", 30, "Structure from Motion завершено")
+        return sparse_output
+    
+    def _stage_pointcloud(self, quality, inputs):
+        # Етап 2: Генерація щільної хмари точок
+        self.progress.update_progress("pointcloud", 35, "Генерація щільної хмари точок")
+        self.logger.info("Генерація щільної хмари точок")
+        
+        point_cloud_path = self._generate_point_cloud(quality)
+        self.progress.update_progress("pointcloud", 50, "Хмару точок згенеровано")
+        return point_cloud_path
+    
+    def _stage_mesh(self, quality, inputs):
+        # Етап 3: Створення меша з хмари точок
+        self.progress.update_progress("mesh", 55, "Створення полігональної моделі")
+        self.logger.info("Створення меша з хмари точок")
+        
+        mesh_processor = MeshProcessor(self.output_dir, self.logger)
+        mesh_path = mesh_processor.create_mesh(inputs["pointcloud"], quality, self.stage_params.get("mesh"))
+        self.progress.update_progress("mesh", 70, "Модель створено")
+        return mesh_path
+    
+    def _stage_clean(self, quality, inputs):
+        # Етап 4: Очищення меша
+        self.progress.update_progress("clean", 75, "Очищення моделі")
+        self.logger.info("Очищення меша від шуму та аномалій")
+        
+        mesh_path = MeshProcessor(self.output_dir, self.logger).clean_mesh(inputs["mesh"])
+        self.progress.update_progress("clean", 80, "Модель очищено")
+        return mesh_path
+    
+    def _stage_texture(self, quality, inputs):
+        # Етап 5: Текстурування меша
+        self.progress.update_progress("texture", 85, "Текстурування моделі")
+        self.logger.info("Текстурування меша")
+        
+        texture_processor = TextureProcessor(self.input_dir, self.output_dir, self.logger, self.threads)
+        textured_mesh_path = texture_processor.enhance_texture(
+            inputs["clean"], quality, self.stage_params.get("texture")
+        )
+        self.progress.update_progress("texture", 90, "Модель текстуровано")
+        return textured_mesh_path
+    
+    def _generate_point_cloud(self, quality):
         """
-        Запускає повний процес реконструкції з використанням COLMAP.
+        Генерує щільну хмару точок з розрідженої реконструкції COLMAP.
         
+        Args:
+            quality (str): Якість етапу
+            
         Returns:
-            str: Шлях до згенерованої 3D-моделі
+            str: Шлях до згенерованої хмари точок
         """
-        try:
-            # Перевіряємо вхідні дані
-            if not self.validate_input():
-                raise ValueError("Невалідні вхідні дані")
-                
-            # Етап 1: Structure from Motion з COLMAP
-            self.progress.update_progress("sfm", 10, "Запуск Structure from Motion")
-            self.logger.info("Запуск Structure from Motion з COLMAP")
-            
-            sparse_output = self._run_colmap_sfm()
-            self.progress.update_progress("sfm", 30, "Structure from Motion завершено")
-            
-            # Етап 2: Генерація щільної хмари точок
-            self.progress.update_progress("pointcloud", 35, "Генерація щільної хмари точок")
-            self.logger.info("Генерація щільної хмари точок")
-            
-            point_cloud_processor = PointCloudProcessor(
-                self.sparse_dir, 
-                self.dense_dir, 
-                self.quality, 
-                self.logger, 
-                self.gpu_available
-            )
-            
-            if self.quality == 'high':
-                point_cloud_path = point_cloud_processor.generate_multiscale()
-            else:
-                point_cloud_path = point_cloud_processor.generate()
-                
-            self.progress.update_progress("pointcloud", 50, "Хмару точок згенеровано")
-            
-            # Етап 3: Створення меша з хмари точок
-            self.progress.update_progress("mesh", 55, "Створення полігональної моделі")
-            self.logger.info("Створення меша з хмари точок")
-            
-            mesh_processor = MeshProcessor(self.output_dir, self.logger)
-            mesh_path = mesh_processor.create_mesh(point_cloud_path, self.quality)
-            self.progress.update_progress("mesh", 70, "Модель створено")
-            
-            # Етап 4: Очищення меша
-            self.progress.update_progress("clean", 75, "Очищення моделі")
-            self.logger.info("Очищення меша від шуму та аномалій")
-            
-            mesh_path = mesh_processor.clean_mesh(mesh_path)
-            self.progress.update_progress("clean", 80, "Модель очищено")
-            
-            # Етап 5: Текстурування меша
-            self.progress.update_progress("texture", 85, "Текстурування моделі")
-            self.logger.info("Текстурування меша")
-            
-            texture_processor = TextureProcessor(self.input_dir, self.output_dir, self.logger)
-            textured_mesh_path = texture_processor.enhance_texture(mesh_path, self.quality)
-            self.progress.update_progress("texture", 90, "Модель текстуровано")
-            
-            # Етап 6: Експорт моделі в різні формати
-            self.progress.update_progress("export", 95, "Експорт моделі в різні формати")
-            self.logger.info("Експорт моделі в різні формати")
-            
-            exporter = ModelExporter(self.output_dir, self.logger)
-            exported_formats = exporter.export_model(textured_mesh_path)
-            
-            self.progress.update_progress("export", 100, "Модель експортовано")
-            self.logger.info(f"Модель експортовано в {len(exported_formats)} форматів")
-            
-            # Очищення тимчасових файлів
-            self.cleanup()
-            
-            return textured_mesh_path
-            
-        except Exception as e:
-            self.logger.error(f"Помилка в COLMAP пайплайні: {str(e)}")
-            self.logger.error(traceback.format_exc())
-            raise
+        point_cloud_processor = PointCloudProcessor(
+            self.sparse_dir, 
+            self.dense_dir, 
+            quality, 
+            self.logger, 
+            self.gpu_available,
+            self.threads
+        )
+        
+        if quality == 'high':
+            return point_cloud_processor.generate_multiscale()
+        return point_cloud_processor.generate()
     
-    def _run_colmap_sfm(self):
+    def _run_colmap_sfm(self, quality=None):
         """
         Запускає COLMAP для Structure from Motion з детальним логуванням.
         
+        Args:
+            quality (str, optional): Якість етапу (за замовчуванням - якість пайплайну)
+            
         Returns:
             str: Шлях до директорії з sparse reconstruction
         """
@@ -129,14 +146,20 @@ class ColmapPipeline(BasePipeline):
             f"--Mapper.filter_max_reproj_error=4.0 "
         )
         
-        params = quality_params.get(self.quality, quality_params['medium'])
+        params = quality_params.get(quality or self.quality, quality_params['medium'])
         
         db_path = os.path.join(self.sparse_dir, "database.db")
         sparse_model_path = os.path.join(self.sparse_dir, "sparse")
+        
+        # Залишки попереднього запуску (наприклад, після нестачі пам'яті) видаляємо,
+        # інакше COLMAP дописав би нові ознаки до старої бази
+        if os.path.exists(db_path):
+            os.remove(db_path)
+        shutil.rmtree(sparse_model_path, ignore_errors=True)
         os.makedirs(sparse_model_path, exist_ok=True)
         
         # Налаштовуємо середовище для роботи в headless режимі
-        env = os.environ.copy()
+        env = thread_env(self.threads)
         env['QT_QPA_PLATFORM'] = 'offscreen'
         env['DISPLAY'] = ':99'
         
@@ -235,39 +258,25 @@ class ColmapPipeline(BasePipeline):
             self.logger.info(f"Виконання команди для етапу {stage}: {command}")
             
             try:
-                process = subprocess.Popen(
-                    command, 
-                    shell=True, 
-                    stdout=subprocess.PIPE, 
-                    stderr=subprocess.PIPE,
-                    universal_newlines=True,
-                    bufsize=1,  # Буферизація порядкова
-                    env=env
+                # stdout та stderr читаються одночасно, таймаут діє на всю групу процесів
+                result = run_process(
+                    command,
+                    env=env,
+                    logger=self.logger,
+                    timeout=timeout,
+                    on_stdout=lambda line: process_output(line, stage),
+                    label=stage,
                 )
                 
-                # Читаємо вивід у режимі реального часу
-                for line in process.stdout:
-                    line = line.strip()
-                    if line:
-                        self.logger.info(f"STDOUT: {line}")
-                        process_output(line, stage)
-                
-                # Читаємо помилки у режимі реального часу
-                for line in process.stderr:
-                    line = line.strip()
-                    if line:
-                        self.logger.warning(f"STDERR: {line}")
-                
-                # Чекаємо завершення процесу з таймаутом
-                try:
-                    return_code = process.wait(timeout=timeout)
-                except subprocess.TimeoutExpired:
-                    process.kill()
+                if result["timed_out"]:
                     self.logger.error(f"Команда перервана через перевищення таймауту ({timeout}с): {command}")
-                    raise RuntimeError(f"Команда перервана через таймаут: {command}")
+                    raise CommandTimeout(f"Команда перервана через таймаут: {command}")
                 
+                return_code = result["return_code"]
                 if return_code != 0:
                     self.logger.error(f"Команда завершилася з кодом {return_code}")
+                    if is_oom_failure(return_code, result["stderr_tail"]):
+                        raise ResourceLimitExceeded(f"Нестача пам'яті на етапі {stage}: {command}")
                     raise RuntimeError(f"Помилка виконання команди: {command}")
                     
                 self.logger.info(f"Команда для етапу {stage} виконана успішно")
@@ -299,6 +308,7 @@ class ColmapPipeline(BasePipeline):
             f"--database_path {db_path} "
             f"--image_path {self.input_dir} "
             f"{params['sift_extraction']} "
+            f"--SiftExtraction.num_threads {self.threads} "
             f"--ImageReader.single_camera 1 "
             f"--ImageReader.camera_model PINHOLE"
         )
@@ -315,14 +325,11 @@ class ColmapPipeline(BasePipeline):
         self.logger.info("Запуск feature matching")
         self.progress.update_progress("sfm", 15, "Зіставлення ключових точок")
         
-        matcher_cmd = (
-            f"xvfb-run.sh colmap exhaustive_matcher "
-            f"--database_path {db_path} "
-            f"{params['matcher']}"
-        )
+        matcher_cmds = self._matcher_commands(db_path, params, quality or self.quality)
         
         try:
-            custom_run_command(matcher_cmd, "feature_matching", env=env)
+            for matcher_cmd in matcher_cmds:
+                custom_run_command(matcher_cmd, "feature_matching", env=env)
             self.logger.info("Feature matching завершено")
         except Exception as e:
             self.logger.error(f"Помилка при feature matching: {str(e)}")
@@ -339,6 +346,7 @@ class ColmapPipeline(BasePipeline):
             f"--image_path {self.input_dir} "
             f"--output_path {sparse_model_path} "
             f"{params['mapper']} "
+            f"--Mapper.num_threads {self.threads} "
             f"{robust_params}"
         )
         
@@ -372,4 +380,156 @@ class ColmapPipeline(BasePipeline):
         self.logger.info(f"  Реконструйовано зображень: {progress_counter['mapping']['current']}/{progress_counter['mapping']['total']}")
         self.logger.info(f"  Створено 3D точок: {progress_counter['mapping']['points']}")
         
-        return sparse_model_path
\ No newline at end of file
+        return sparse_model_path
+    
+    def _matcher_commands(self, db_path, params, quality):
+        """
+        Формує команди зіставлення COLMAP. Для впорядкованих кадрів -
+        sequential_matcher (див. _sequential_matcher_commands). Для невеликих
+        сесій зіставляються всі пари (exhaustive_matcher), інакше - лише top-k
+        кандидатів для кожного зображення в межах бюджету якості: через
+        vocab_tree_matcher, якщо задано словник COLMAP_VOCAB_TREE_PATH, або через
+        matches_importer з парами, відібраними за VLAD з дескрипторів SIFT у базі COLMAP.
+        
+        Args:
+            db_path (str): Шлях до бази COLMAP з виявленими ознаками
+            params (dict): Параметри якості COLMAP
+            quality (str): Якість (визначає бюджет пар)
+        
+        Returns:
+            list: Команди зіставлення (виконуються по черзі)
+        """
+        common = (
+            f"--database_path {db_path} "
+            f"{params['matcher']} "
+            f"--SiftMatching.num_threads {self.threads}"
+        )
+        if self.matching == "sequential":
+            return self._sequential_matcher_commands(db_path, common)
+        
+        top_k = config.MATCHING_PAIR_BUDGET.get(quality, config.MATCHING_PAIR_BUDGET["medium"])
+        retrieval = PairRetrieval(self.logger, top_k)
+        with closing(sqlite3.connect(db_path)) as conn:
+            image_count = conn.execute("SELECT COUNT(*) FROM images").fetchone()[0]
+        
+        if retrieval.is_exhaustive(image_count):
+            return [f"xvfb-run.sh colmap exhaustive_matcher {common}"]
+        
+        vocab_tree_path = self._vocab_tree_path()
+        if vocab_tree_path:
+            self.logger.info(f"Відбір пар словником vocabulary tree: до {top_k} кандидатів на зображення")
+            return [
+                f"xvfb-run.sh colmap vocab_tree_matcher {common} "
+                f"--VocabTreeMatching.vocab_tree_path {vocab_tree_path} "
+                f"--VocabTreeMatching.num_images {top_k}"
+            ]
+        
+        pairs_path = os.path.join(self.sparse_dir, "match_pairs.txt")
+        try:
+            self._write_retrieval_pairs(db_path, retrieval, pairs_path, retrieval.select_pairs)
+        except ValueError as e:
+            self.logger.warning(f"Не вдалося відібрати пари за VLAD, зіставляються всі пари: {str(e)}")
+            return [f"xvfb-run.sh colmap exhaustive_matcher {common}"]
+        
+        return [self._matches_importer_command(common, pairs_path)]
+    
+    def _sequential_matcher_commands(self, db_path, common):
+        """
+        Команди послідовного зіставлення: sequential_matcher з ковзним вікном
+        (кадри впорядковані за іменем файлу). Замикання циклу виконує сам
+        COLMAP, якщо задано словник vocabulary tree; інакше кандидати на
+        замикання відбираються за VLAD і зіставляються через matches_importer.
+        
+        Args:
+            db_path (str): Шлях до бази COLMAP з виявленими ознаками
+            common (str): Спільні параметри команд зіставлення
+        
+        Returns:
+            list: Команди зіставлення
+        """
+        sequential = config.SEQUENTIAL_MATCHING
+        command = (
+            f"xvfb-run.sh colmap sequential_matcher {common} "
+            f"--SequentialMatching.overlap {sequential['overlap']} "
+            f"--SequentialMatching.quadratic_overlap 0"
+        )
+        if sequential["loop_period"] <= 0 or sequential["loop_candidates"] <= 0:
+            return [command]
+        
+        vocab_tree_path = self._vocab_tree_path()
+        if vocab_tree_path:
+            return [
+                f"{command} "
+                f"--SequentialMatching.loop_detection 1 "
+                f"--SequentialMatching.loop_detection_period {sequential['loop_period']} "
+                f"--SequentialMatching.loop_detection_num_images {sequential['loop_candidates']} "
+                f"--SequentialMatching.vocab_tree_path {vocab_tree_path}"
+            ]
+        
+        retrieval = PairRetrieval(self.logger, sequential["loop_candidates"])
+        pairs_path = os.path.join(self.sparse_dir, "loop_pairs.txt")
+        try:
+            count = self._write_retrieval_pairs(
+                db_path, retrieval, pairs_path,
+                lambda vectors: retrieval.select_loop_closures(
+                    vectors, sequential["overlap"], sequential["loop_period"]
+                ),
+            )
+        except ValueError as e:
+            self.logger.warning(f"Не вдалося відібрати кандидатів на замикання циклу: {str(e)}")
+            return [command]
+        
+        self.logger.info(f"Кандидатів на замикання циклу: {count} пар")
+        return [command, self._matches_importer_command(common, pairs_path)] if count else [command]
+    
+    def _vocab_tree_path(self):
+        # Словник vocabulary tree для COLMAP, якщо його задано і файл існує
+        path = config.COLMAP_VOCAB_TREE_PATH
+        return path if path and os.path.exists(path) else None
+    
+    @staticmethod
+    def _matches_importer_command(common, pairs_path):
+        return (
+            f"xvfb-run.sh colmap matches_importer {common} "
+            f"--match_list_path {pairs_path} "
+            f"--match_type pairs"
+        )
+    
+    def _write_retrieval_pairs(self, db_path, retrieval, pairs_path, select):
+        """
+        Відбирає пари за VLAD з дескрипторів SIFT у базі COLMAP і записує
+        їх у список пар для matches_importer. Дескриптори читаються по одному
+        зображенню за раз (вибірка для словника, потім вектори VLAD).
+        
+        Args:
+            db_path (str): Шлях до бази COLMAP
+            retrieval (PairRetrieval): Відбір пар
+            pairs_path (str): Шлях до списку пар
+            select (callable): select(vectors) -> пари індексів зображень
+                (зображення впорядковані за іменем, як у sequential_matcher)
+        
+        Returns:
+            int: Кількість записаних пар
+        """
+        with closing(sqlite3.connect(db_path)) as conn:
+            names = dict(conn.execute("SELECT image_id, name FROM images"))
+            retrieval.train([retrieval.sample(descriptors) for _, descriptors in self._colmap_descriptors(conn)])
+            vectors = {
+                image_id: retrieval.encode(descriptors) for image_id, descriptors in self._colmap_descriptors(conn)
+            }
+        
+        image_ids = sorted(names, key=names.get)
+        pairs = select([
+            vectors[image_id] if image_id in vectors else retrieval.encode(None) for image_id in image_ids
+        ])
+        
+        with open(pairs_path, "w") as f:
+            for i, j in pairs:
+                f.write(f"{names[image_ids[i]]} {names[image_ids[j]]}\n")
+        return len(pairs)
+    
+    @staticmethod
+    def _colmap_descriptors(conn):
+        # Дескриптори SIFT у базі COLMAP - uint8 (rows x 128) у BLOB
+        for image_id, rows, cols, data in conn.execute("SELECT image_id, rows, cols, data FROM descriptors"):
+            yield image_id, np.frombuffer(data, dtype=np.uint8).reshape(rows, cols) if rows else None
\ No newline at end of file
@@ -2,151 +2,224 @@ import os
 import cv2
 import numpy as np
 import open3d as o3d
-from .base_pipeline import BasePipeline
+from .. import config
+from .base_pipeline import BasePipeline, export_stages
+from .stage_graph import Stage
+from ..processing.features import FeatureExtractor
+from ..processing.matching import PairMatcher
+from ..processing.retrieval import PairRetrieval
 from ..processing.mesh import MeshProcessor
 from ..processing.texture import TextureProcessor
-from ..export.model_exporter import ModelExporter
+from ..utils.artifact_manifest import ROLE_POINT_CLOUD
+from ..utils.feature_cache import FeatureCache
+from ..utils.match_cache import MatchCache
+from ..utils.metrics import CACHE_LOOKUPS
+from ..utils.timeline import span
+from ..utils.upload_store import read_image_manifest, hash_file
 
 class CustomPipeline(BasePipeline):
     """
     Власний пайплайн реконструкції з використанням OpenCV та Open3D.
     """
     
-    def run(self):
+    # Хмара точок зберігається в директорії результатів (point_cloud.ply)
+    # і записується в маніфест разом з експортованими форматами
+    GRAPH = (
+        Stage("pointcloud", "_stage_pointcloud", cores=None),
+        Stage("mesh", "_stage_mesh", inputs=("pointcloud",), cores=None),
+        Stage("clean", "_stage_clean", inputs=("mesh",), degradable=False),
+        Stage("texture", "_stage_texture", inputs=("clean",), cores=None),
+    ) + export_stages("texture", extra_inputs=("pointcloud",))
+    
+    DISPLAY_NAME = "custom"
+    
+    # Ключові точки та зіставлення поточного запуску (обчислюються ліниво)
+    _features = None
+    
+    def _stage_pointcloud(self, quality, inputs):
+        # Етапи 1-2: Ключові точки та базова хмара точок
+        # (ключові точки потрібні лише тоді, коли хмари точок немає з контрольної точки)
+        point_cloud_path = self._build_point_cloud(quality)
+        self.progress.update_progress("pointcloud", 50, "Базову хмару точок створено")
+        return point_cloud_path
+    
+    def _stage_mesh(self, quality, inputs):
+        # Етап 3: Створення меша з хмари точок
+        self.progress.update_progress("mesh", 60, "Створення полігональної моделі")
+        self.logger.info("Створення меша з хмари точок")
+        
+        mesh_processor = MeshProcessor(self.output_dir, self.logger)
+        mesh_path = mesh_processor.create_mesh(inputs["pointcloud"], quality, self.stage_params.get("mesh"))
+        self.progress.update_progress("mesh", 70, "Модель створено")
+        return mesh_path
+    
+    def _stage_clean(self, quality, inputs):
+        # Етап 4: Очищення та оптимізація меша
+        self.progress.update_progress("clean", 75, "Очищення та оптимізація моделі")
+        self.logger.info("Очищення та оптимізація меша")
+        
+        mesh_path = MeshProcessor(self.output_dir, self.logger).clean_mesh(inputs["mesh"])
+        self.progress.update_progress("clean", 80, "Модель очищено")
+        return mesh_path
+    
+    def _stage_texture(self, quality, inputs):
+        # Етап 5: Текстурування меша
+        self.progress.update_progress("texture", 85, "Текстурування моделі")
+        self.logger.info("Текстурування меша")
+        
+        texture_processor = TextureProcessor(self.input_dir, self.output_dir, self.logger, self.threads)
+        textured_mesh_path = texture_processor.enhance_texture(
+            inputs["clean"], quality, self.stage_params.get("texture")
+        )
+        self.progress.update_progress("texture", 90, "Модель текстуровано")
+        return textured_mesh_path
+    
+    def _export_artifacts(self, inputs):
+        return [(inputs["pointcloud"], ROLE_POINT_CLOUD)]
+    
+    def _build_point_cloud(self, quality=None):
         """
-        Запускає повний процес реконструкції з використанням власного алгоритму.
+        Виявляє та зіставляє ключові точки (один раз за запуск) і створює
+        базову хмару точок.
         
+        Args:
+            quality (str, optional): Якість етапу
+            
         Returns:
-            str: Шлях до згенерованої 3D-моделі
+            str: Шлях до збереженої хмари точок
         """
-        try:
-            # Перевіряємо вхідні дані
-            if not self.validate_input():
-                raise ValueError("Невалідні вхідні дані")
-                
-            # Етап 1: Виявлення та зіставлення ключових точок
+        if self._features is None:
             self.progress.update_progress("keypoints", 10, "Виявлення ключових точок на зображеннях")
             self.logger.info("Виявлення та зіставлення ключових точок")
             
-            image_files, features_points, matches_pairs = self._detect_and_match_features()
+            self._features = self._detect_and_match_features(quality or self.quality)
             self.progress.update_progress("keypoints", 20, "Ключові точки виявлено та зіставлено")
-            
-            # Етап 2: Створення базової хмари точок
-            self.progress.update_progress("pointcloud", 30, "Створення базової хмари точок")
-            self.logger.info("Створення базової хмари точок")
-            
-            point_cloud = self._create_point_cloud(image_files, features_points, matches_pairs)
-            point_cloud_path = os.path.join(self.output_dir, "point_cloud.ply")
-            o3d.io.write_point_cloud(point_cloud_path, point_cloud)
-            self.progress.update_progress("pointcloud", 50, "Базову хмару точок створено")
-            
-            # Етап 3: Створення меша з хмари точок
-            self.progress.update_progress("mesh", 60, "Створення полігональної моделі")
-            self.logger.info("Створення меша з хмари точок")
-            
-            mesh_processor = MeshProcessor(self.output_dir, self.logger)
-            mesh_path = mesh_processor.create_mesh(point_cloud_path, self.quality)
-            self.progress.update_progress("mesh", 70, "Модель створено")
-            
-            # Етап 4: Очищення та оптимізація меша
-            self.progress.update_progress("clean", 75, "Очищення та оптимізація моделі")
-            self.logger.info("Очищення та оптимізація меша")
-            
-            mesh_path = mesh_processor.clean_mesh(mesh_path)
-            self.progress.update_progress("clean", 80, "Модель очищено")
-            
-            # Етап 5: Текстурування меша
-            self.progress.update_progress("texture", 85, "Текстурування моделі")
-            self.logger.info("Текстурування меша")
-            
-            texture_processor = TextureProcessor(self.input_dir, self.output_dir, self.logger)
-            textured_mesh_path = texture_processor.enhance_texture(mesh_path, self.quality)
-            self.progress.update_progress("texture", 90, "Модель текстуровано")
-            
-            # Етап 6: Експорт моделі в різні формати
-            self.progress.update_progress("export", 95, "Експорт моделі в різні формати")
-            self.logger.info("Експорт моделі в різні формати")
-            
-            exporter = ModelExporter(self.output_dir, self.logger)
-            exported_formats = exporter.export_model(textured_mesh_path)
-            
-            self.progress.update_progress("export", 100, "Модель експортовано")
-            self.logger.info(f"Модель експортовано в {len(exported_formats)} форматів")
-            
-            # Очищення тимчасових файлів
-            self.cleanup()
-            
-            return textured_mesh_path
-            
-        except Exception as e:
-            self.logger.error(f"Помилка в custom пайплайні: {str(e)}")
-            import traceback
-            self.logger.error(traceback.format_exc())
-            raise
+        
+        self.progress.update_progress("pointcloud", 30, "Створення базової хмари точок")
+        self.logger.info("Створення базової хмари точок")
+        
+        image_files, features_points, matches_pairs = self._features
+        point_cloud = self._create_point_cloud(image_files, features_points, matches_pairs, quality)
+        
+        point_cloud_path = os.path.join(self.output_dir, "point_cloud.ply")
+        o3d.io.write_point_cloud(point_cloud_path, point_cloud)
+        return point_cloud_path
     
-    def _detect_and_match_features(self):
+    def _detect_and_match_features(self, quality):
         """
         Виявляє ключові точки на зображеннях та зіставляє їх.
         
+        Args:
+            quality (str): Якість (визначає бюджет пар зіставлення в режимі 'auto')
+        
         Returns:
             tuple: (image_files, features_points, matches_pairs)
         """
-        # Отримуємо список зображень
-        image_files = [os.path.join(self.input_dir, f) for f in os.listdir(self.input_dir) 
+        # Отримуємо список зображень (за іменем файлу - порядок кадрів для
+        # послідовного зіставлення)
+        image_files = [os.path.join(self.input_dir, f) for f in sorted(os.listdir(self.input_dir))
                       if f.lower().endswith(('.jpg', '.jpeg', '.png'))]
         
-        # Ініціалізуємо SIFT детектор
-        sift = cv2.SIFT_create()
-        
-        # Знаходимо характеристичні точки для кожного зображення
+        # Знаходимо характеристичні точки для кожного зображення (паралельно в пулі
+        # процесів у межах бюджету потоків завдання, результати - у порядку зображень);
+        # зображення, вже оброблені в будь-якій сесії, беруться з кешу ознак
         features_points = []
         descriptors_list = []
+        features_hashes = []
         
         self.logger.info(f"Обробка {len(image_files)} зображень")
         
-        for img_path in image_files:
-            img = cv2.imread(img_path, cv2.IMREAD_GRAYSCALE)
-            if img is None:
-                self.logger.warning(f"Не вдалося завантажити зображення: {img_path}")
-                continue
-                
-            # Знаходимо ключові точки та дескриптори
-            keypoints, descriptors = sift.detectAndCompute(img, None)
-            if descriptors is None:
-                self.logger.warning(f"Не знайдено ключових точок на зображенні: {img_path}")
-                continue
-                
-            features_points.append(keypoints)
-            descriptors_list.append(descriptors)
-            self.logger.info(f"Знайдено {len(keypoints)} ключових точок на {os.path.basename(img_path)}")
+        feature_cache = FeatureCache(config.FEATURE_CACHE_FOLDER, config.FEATURE_CACHE_MAX_BYTES, self.logger)
+        match_cache = MatchCache(config.MATCH_CACHE_FOLDER, config.MATCH_CACHE_MAX_BYTES, self.logger)
+        extractor = FeatureExtractor(self.logger, self.threads, cache=feature_cache)
+        image_hashes = None
+        if feature_cache.enabled or match_cache.enabled:
+            image_hashes = self._image_hashes(image_files)
         
-        # Зіставлення характеристичних точок між парами зображень
-        matcher = cv2.BFMatcher()
-        matches_pairs = []
+        with span("sift", images=len(image_files), workers=self.threads):
+            extracted = extractor.extract(image_files, image_hashes)
+            for index, features in enumerate(extracted):
+                if features is None:
+                    continue
+                keypoints, descriptors = features
+                features_points.append(keypoints)
+                descriptors_list.append(descriptors)
+                features_hashes.append(image_hashes[index] if image_hashes else None)
         
-        self.logger.info("Зіставлення ключових точок між парами зображень")
-        total_matches = 0
+        self._count_cache_lookups("features", feature_cache, extractor)
         
-        for i in range(len(descriptors_list)):
-            for j in range(i+1, len(descriptors_list)):
-                if descriptors_list[i] is None or descriptors_list[j] is None:
-                    continue
-                matches = matcher.knnMatch(descriptors_list[i], descriptors_list[j], k=2)
-                
-                # Застосовуємо фільтр співвідношення Лоу для видалення поганих зіставлень
-                good_matches = []
-                for m, n in matches:
-                    if m.distance < 0.7 * n.distance:
-                        good_matches.append(m)
-                
-                matches_pairs.append((i, j, good_matches))
-                total_matches += len(good_matches)
+        # Пари для зіставлення: для впорядкованих кадрів - ковзне вікно сусідів
+        # і замикання циклу, інакше для кожного зображення - найподібніші за VLAD
+        # у межах бюджету якості (для невеликих сесій - усі пари)
+        if self.matching == "sequential":
+            sequential = config.SEQUENTIAL_MATCHING
+            with span("retrieval", images=len(descriptors_list), matching=self.matching):
+                pairs = PairRetrieval(self.logger, sequential["loop_candidates"]).select_sequential(
+                    descriptors_list, sequential["overlap"], sequential["loop_period"]
+                )
+        else:
+            top_k = config.MATCHING_PAIR_BUDGET.get(quality, config.MATCHING_PAIR_BUDGET["medium"])
+            with span("retrieval", images=len(descriptors_list), top_k=top_k):
+                pairs = PairRetrieval(self.logger, top_k).select(descriptors_list)
+        
+        # Зіставлення характеристичних точок між парами зображень з геометричною
+        # перевіркою; пари, вже зіставлені раніше (наприклад, до додавання
+        # зображень у сесію), беруться з кешу зіставлень
+        self.logger.info(f"Зіставлення ключових точок між {len(pairs)} парами зображень")
+        
+        matcher = PairMatcher(self.logger, cache=match_cache, feature_params=extractor.cache_key_params())
+        with span("matching", images=len(descriptors_list), pairs=len(pairs)):
+            matches_pairs = matcher.match(
+                features_points, descriptors_list, features_hashes if image_hashes else None, pairs
+            )
+        
+        self._count_cache_lookups("matches", match_cache, matcher)
+        total_matches = sum(len(good_matches) for _, _, good_matches, _ in matches_pairs)
         
         self.logger.info(f"Знайдено {total_matches} зіставлень між парами зображень")
         
         return image_files, features_points, matches_pairs
     
-    def _create_point_cloud(self, image_files, features_points, matches_pairs):
+    def _count_cache_lookups(self, name, cache, source):
+        """
+        Додає звернення до кешу ознак чи зіставлень у метрики.
+        
+        Args:
+            name (str): Назва кешу (мітка cache)
+            cache (FeatureCache): Кеш
+            source: Екстрактор чи зіставлення зі статистикою cache_hits/cache_misses
+        """
+        if not cache.enabled:
+            return
+        for result, count in (("hit", source.cache_hits), ("miss", source.cache_misses)):
+            if count:
+                self.metrics.increment(CACHE_LOOKUPS, count, labels={"cache": name, "result": result})
+    
+    def _image_hashes(self, image_files):
+        """
+        SHA-256 зображень для кешу ознак: з маніфесту завантажень сесії,
+        а для зображень поза маніфестом - обчислюється з файлу.
+        
+        Args:
+            image_files (list): Шляхи до зображень
+        
+        Returns:
+            list: SHA-256 у порядку зображень (None, якщо файл не читається)
+        """
+        manifest = read_image_manifest(self.input_dir)
+        hashes = []
+        for path in image_files:
+            entry = manifest.get(os.path.basename(path))
+            if entry and entry.get("sha256"):
+                hashes.append(entry["sha256"])
+                continue
+            try:
+                hashes.append(hash_file(path))
+            except OSError:
+                hashes.append(None)
+        return hashes
+    
+    def _create_point_cloud(self, image_files, features_points, matches_pairs, quality=None):
         """
         Створює хмару точок на основі ключових точок та їх зіставлень.
         
@@ -154,18 +227,22 @@ class CustomPipeline(BasePipeline):
             image_files (list): Список шляхів до зображень
             features_points (list): Список ключових точок для кожного зображення
             matches_pairs (list): Список зіставлень між парами зображень
+                (i, j, зіставлення, геометрична перевірка або None)
+            quality (str, optional): Якість етапу (за замовчуванням - якість пайплайну)
             
         Returns:
             o3d.geometry.PointCloud: Хмара точок
         """
+        quality = quality or self.quality
+        
         # Ініціалізуємо хмару точок
         point_cloud = o3d.geometry.PointCloud()
         
         # Якщо є достатньо зіставлень, використовуємо справжню геометричну інформацію
-        if matches_pairs and any(len(m) > 10 for _, _, m in matches_pairs):
+        if matches_pairs and any(len(m) > 10 for _, _, m, _ in matches_pairs):
             # Беремо пару з найбільшою кількістю зіставлень
             best_pair = max(matches_pairs, key=lambda x: len(x[2]))
-            i, j, good_matches = best_pair
+            i, j, good_matches, verification = best_pair
             
             self.logger.info(f"Використання найкращої пари зображень з {len(good_matches)} зіставленнями")
             
@@ -177,11 +254,15 @@ class CustomPipeline(BasePipeline):
             pts1 = np.float32([features_points[i][m.queryIdx].pt for m in good_matches])
             pts2 = np.float32([features_points[j][m.trainIdx].pt for m in good_matches])
             
-            # Обчислюємо фундаментальну матрицю
-            F, mask = cv2.findFundamentalMat(pts1, pts2, cv2.FM_RANSAC)
+            # Фундаментальна матриця з геометричної перевірки пари (обчислюється,
+            # лише якщо пару не перевірено під час зіставлення)
+            if verification is not None:
+                F, inlier_mask = verification
+            else:
+                F, mask = cv2.findFundamentalMat(pts1, pts2, cv2.FM_RANSAC)
+                inlier_mask = mask.ravel() == 1
             
             # Відфільтровуємо викиди (outliers)
-            inlier_mask = mask.ravel() == 1
             pts1 = pts1[inlier_mask]
             pts2 = pts2[inlier_mask]
             
@@ -210,7 +291,7 @@ class CustomPipeline(BasePipeline):
                 colors.append(color[::-1])  # BGR -> RGB
                 
             # Згущення хмари точок для кращої якості реконструкції
-            self._densify_point_cloud(points, colors)
+            self._densify_point_cloud(points, colors, quality)
                 
         else:
             # Якщо не вдалося зіставити характеристичні точки, створюємо демонстраційну модель
@@ -270,7 +351,7 @@ class CustomPipeline(BasePipeline):
                         colors.append(color[::-1])  # BGR -> RGB
                 
                 # Додаємо додаткові випадкові точки для заповнення обсягу
-                num_random_points = 5000 if self.quality == 'high' else (3000 if self.quality == 'medium' else 1000)
+                num_random_points = 5000 if quality == 'high' else (3000 if quality == 'medium' else 1000)
                 for _ in range(num_random_points):
                     x = np.random.uniform(-0.8, 0.8)
                     y = np.random.uniform(-0.8, 0.8)
@@ -313,28 +394,32 @@ class CustomPipeline(BasePipeline):
         self.logger.info("Обчислення нормалей для хмари точок")
         
         # Параметри для різної якості
-        normal_nn = 30 if self.quality == 'high' else (20 if self.quality == 'medium' else 10)
-        normal_radius = 0.05 if self.quality == 'high' else (0.1 if self.quality == 'medium' else 0.2)
+        normal_nn = 30 if quality == 'high' else (20 if quality == 'medium' else 10)
+        normal_radius = 0.05 if quality == 'high' else (0.1 if quality == 'medium' else 0.2)
         
-        point_cloud.estimate_normals(
-            search_param=o3d.geometry.KDTreeSearchParamHybrid(
-                radius=normal_radius, 
-                max_nn=normal_nn
+        with span("normals", points=len(points)):
+            point_cloud.estimate_normals(
+                search_param=o3d.geometry.KDTreeSearchParamHybrid(
+                    radius=normal_radius, 
+                    max_nn=normal_nn
+                )
             )
-        )
-        point_cloud.orient_normals_consistent_tangent_plane(k=15)
+            point_cloud.orient_normals_consistent_tangent_plane(k=15)
         
         return point_cloud
     
-    def _densify_point_cloud(self, points, colors):
+    def _densify_point_cloud(self, points, colors, quality=None):
         """
         Згущує хмару точок для кращої якості реконструкції.
         
         Args:
             points (list): Список точок
             colors (list): Список кольорів
+            quality (str, optional): Якість етапу (за замовчуванням - якість пайплайну)
         """
-        if self.quality != 'low' and len(points) < 10000:
+        quality = quality or self.quality
+        
+        if quality != 'low' and len(points) < 10000:
             self.logger.info("Згущення хмари точок")
             
             # Створюємо тимчасову хмару точок для пошуку найближчих сусідів
@@ -343,7 +428,7 @@ class CustomPipeline(BasePipeline):
             temp_pcd.colors = o3d.utility.Vector3dVector(np.array(colors))
             
             # Створюємо додаткові точки шляхом інтерполяції
-            dense_factor = 3 if self.quality == 'high' else 2
+            dense_factor = 3 if quality == 'high' else 2
             points_np = np.asarray(temp_pcd.points)
             colors_np = np.asarray(temp_pcd.colors)
             
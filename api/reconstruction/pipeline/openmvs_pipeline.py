@@ -1,120 +1,155 @@
 import os
 import shutil
-import traceback
-from .base_pipeline import BasePipeline
+from .base_pipeline import BasePipeline, export_stages
+from .stage_graph import Stage
 from ..utils.file_utils import run_command
-from ..export.model_exporter import ModelExporter
+from ..utils.artifact_manifest import ROLE_EXPORT
+from ..processing.texture import texture_mesh_args
 
 class OpenMVSPipeline(BasePipeline):
     """
     Пайплайн реконструкції з використанням COLMAP та OpenMVS.
     """
     
-    def run(self):
+    # Етапи реконструкції; результати OpenMVS копіюються в групі експорту
+    # перед експортом у формати
+    GRAPH = (
+        Stage("sfm", "_stage_sfm", cores=None, tool="gpu"),
+        Stage("conversion", "_stage_conversion", inputs=("sfm",), degradable=False),
+        Stage("pointcloud", "_stage_pointcloud", inputs=("conversion",), cores=None, tool="gpu"),
+        Stage("mesh", "_stage_mesh", inputs=("pointcloud",), cores=None),
+        Stage("texture", "_stage_texture", inputs=("mesh",), cores=None),
+        Stage("results", "_stage_results", inputs=("texture",), outputs="_result_files",
+              group="export", degradable=False),
+    ) + export_stages("results")
+    
+    DISPLAY_NAME = "OpenMVS"
+    
+    # Сцени OpenMVS потрібні для повторного створення меша та текстурування;
+    # карти глибини після злиття хмари точок не використовуються
+    RETAINED_INTERMEDIATES = ("mvs",)
+    DISCARDED_SUFFIXES = (".dmap",)
+    
+    @property
+    def mvs_dir(self):
+        """
+        Робоча директорія OpenMVS.
         """
-        Запускає повний процес реконструкції з використанням COLMAP та OpenMVS.
+        return os.path.join(self.temp_dir, "mvs")
+    
+    def _stage_sfm(self, quality, inputs):
+        # Етап 1: Structure from Motion з COLMAP
+        self.progress.update_progress("sfm", 10, "Запуск Structure from Motion з COLMAP")
+        self.logger.info("Запуск Structure from Motion з COLMAP")
+        
+        from .colmap_pipeline import ColmapPipeline
+        colmap = ColmapPipeline(
+            self.input_dir, 
+            self.output_dir, 
+            self.temp_dir, 
+            self.quality, 
+            self.progress, 
+            self.logger, 
+            self.gpu_available,
+            self.stage_quality,
+            matching=self.matching
+        )
+        
+        sparse_output = colmap._run_colmap_sfm(quality)
+        self.progress.update_progress("sfm", 30, "Structure from Motion завершено")
+        return sparse_output
+    
+    def _stage_conversion(self, quality, inputs):
+        # Етап 2: Конвертація результатів COLMAP у формат OpenMVS
+        self.progress.update_progress("conversion", 35, "Конвертація в формат OpenMVS")
+        self.logger.info("Конвертація результатів COLMAP у формат OpenMVS")
+        
+        # Створюємо директорію для роботи OpenMVS
+        os.makedirs(self.mvs_dir, exist_ok=True)
+        
+        # Шлях до сцени OpenMVS
+        scene_mvs = os.path.join(self.mvs_dir, "scene.mvs")
+        
+        self._convert_colmap_to_openmvs(self._find_sparse_model_dir(inputs["sfm"]), scene_mvs)
+        self.progress.update_progress("conversion", 40, "Конвертація завершена")
+        return scene_mvs
+    
+    def _stage_pointcloud(self, quality, inputs):
+        # Етап 3: Створення щільної хмари точок з OpenMVS
+        self.progress.update_progress("pointcloud", 45, "Генерація щільної хмари точок")
+        self.logger.info("Створення щільної хмари точок з OpenMVS")
+        
+        dense_cloud_file = os.path.join(self.mvs_dir, "scene_dense.mvs")
+        self._run_densify_point_cloud(inputs["conversion"], dense_cloud_file, quality)
+        self.progress.update_progress("pointcloud", 60, "Хмару точок згенеровано")
+        return dense_cloud_file
+    
+    def _stage_mesh(self, quality, inputs):
+        # Етап 4: Створення меша з OpenMVS
+        self.progress.update_progress("mesh", 65, "Створення полігональної моделі")
+        self.logger.info("Створення меша з OpenMVS")
+        
+        mesh_file = os.path.join(self.mvs_dir, "scene_dense_mesh.mvs")
+        self._run_reconstruct_mesh(inputs["pointcloud"], mesh_file, quality, self.stage_params.get("mesh"))
+        self.progress.update_progress("mesh", 80, "Модель створено")
+        return mesh_file
+    
+    def _stage_texture(self, quality, inputs):
+        # Етап 5: Текстурування меша з OpenMVS
+        self.progress.update_progress("texture", 85, "Текстурування моделі")
+        self.logger.info("Текстурування меша з OpenMVS")
+        
+        textured_mesh_file = os.path.join(self.mvs_dir, "scene_dense_mesh_texture.mvs")
+        textured_mesh_file = self._run_texture_mesh(
+            inputs["mesh"], textured_mesh_file, quality, self.stage_params.get("texture")
+        )
+        self.progress.update_progress("texture", 90, "Модель текстуровано")
+        return textured_mesh_file
+    
+    def _stage_results(self, quality, inputs):
+        """
+        Етап 6: Копіює результати OpenMVS у директорію результатів.
         
         Returns:
-            str: Шлях до згенерованої 3D-моделі
+            list: Шляхи до скопійованих файлів
         """
-        try:
-            # Перевіряємо вхідні дані
-            if not self.validate_input():
-                raise ValueError("Невалідні вхідні дані")
-                
-            # Етап 1: Structure from Motion з COLMAP
-            self.progress.update_progress("sfm", 10, "Запуск Structure from Motion з COLMAP")
-            self.logger.info("Запуск Structure from Motion з COLMAP")
-            
-            from .colmap_pipeline import ColmapPipeline
-            colmap = ColmapPipeline(
-                self.input_dir, 
-                self.output_dir, 
-                self.temp_dir, 
-                self.quality, 
-                self.progress, 
-                self.logger, 
-                self.gpu_available
-            )
-            
-            sparse_output = colmap._run_colmap_sfm()
-            self.progress.update_progress("sfm", 30, "Structure from Motion завершено")
-            
-            # Етап 2: Конвертація результатів COLMAP у формат OpenMVS
-            self.progress.update_progress("conversion", 35, "Конвертація в формат OpenMVS")
-            self.logger.info("Конвертація результатів COLMAP у формат OpenMVS")
-            
-            # Створюємо директорію для роботи OpenMVS
-            mvs_dir = os.path.join(self.temp_dir, "mvs")
-            os.makedirs(mvs_dir, exist_ok=True)
-            
-            # Шлях до сцени OpenMVS
-            scene_mvs = os.path.join(mvs_dir, "scene.mvs")
-            
-            sparse_model_dir = self._find_sparse_model_dir(sparse_output)
-            self._convert_colmap_to_openmvs(sparse_model_dir, scene_mvs)
-            self.progress.update_progress("conversion", 40, "Конвертація завершена")
-            
-            # Етап 3: Створення щільної хмари точок з OpenMVS
-            self.progress.update_progress("pointcloud", 45, "Генерація щільної хмари точок")
-            self.logger.info("Створення щільної хмари точок з OpenMVS")
-            
-            dense_cloud_file = os.path.join(mvs_dir, "scene_dense.mvs")
-            self._run_densify_point_cloud(scene_mvs, dense_cloud_file)
-            self.progress.update_progress("pointcloud", 60, "Хмару точок згенеровано")
-            
-            # Етап 4: Створення меша з OpenMVS
-            self.progress.update_progress("mesh", 65, "Створення полігональної моделі")
-            self.logger.info("Створення меша з OpenMVS")
-            
-            mesh_file = os.path.join(mvs_dir, "scene_dense_mesh.mvs")
-            self._run_reconstruct_mesh(dense_cloud_file, mesh_file)
-            self.progress.update_progress("mesh", 80, "Модель створено")
-            
-            # Етап 5: Текстурування меша з OpenMVS
-            self.progress.update_progress("texture", 85, "Текстурування моделі")
-            self.logger.info("Текстурування меша з OpenMVS")
-            
-            textured_mesh_file = os.path.join(mvs_dir, "scene_dense_mesh_texture.mvs")
-            self._run_texture_mesh(mesh_file, textured_mesh_file)
-            self.progress.update_progress("texture", 90, "Модель текстуровано")
-            
-            # Етап 6: Копіювання результатів та експорт моделі
-            self.progress.update_progress("export", 95, "Експорт моделі в різні формати")
-            self.logger.info("Копіювання результатів та експорт моделі")
-            
-            result_files = self._copy_results(mvs_dir, self.output_dir)
-            self.progress.update_progress("export", 98, "Результати скопійовано")
+        self.progress.update_progress("export", 95, "Копіювання результатів")
+        self.logger.info("Копіювання результатів та експорт моделі")
+        
+        result_files = self._copy_results(self.mvs_dir, self.output_dir)
+        
+        # Перевіряємо, що серед результатів є основна модель
+        self._export_model(result_files)
+        return result_files
+    
+    def _result_files(self, result_files):
+        return result_files
+    
+    def _export_model(self, result_files):
+        """
+        Шлях до основного файлу моделі серед скопійованих результатів.
+        
+        Args:
+            result_files (list): Шляхи до скопійованих файлів
             
-            # Шлях до основного файлу моделі
-            mesh_path = None
-            for file_path in result_files:
-                if file_path.endswith('.obj'):
-                    mesh_path = file_path
-                    break
-                    
-            if mesh_path is None and result_files:
-                mesh_path = result_files[0]
+        Returns:
+            str: Шлях до моделі
+        """
+        mesh_path = None
+        for file_path in result_files:
+            if file_path.endswith('.obj'):
+                mesh_path = file_path
+                break
                 
-            if mesh_path is None:
-                raise RuntimeError("Не вдалося знайти вихідний файл моделі")
-            
-            # Експорт моделі в різні формати
-            exporter = ModelExporter(self.output_dir, self.logger)
-            exported_formats = exporter.export_model(mesh_path)
-            
-            self.progress.update_progress("export", 100, "Модель експортовано")
-            self.logger.info(f"Модель експортовано в {len(exported_formats)} форматів")
+        if mesh_path is None and result_files:
+            mesh_path = result_files[0]
             
-            # Очищення тимчасових файлів
-            self.cleanup()
-            
-            return mesh_path
-            
-        except Exception as e:
-            self.logger.error(f"Помилка в OpenMVS пайплайні: {str(e)}")
-            self.logger.error(traceback.format_exc())
-            raise
+        if mesh_path is None:
+            raise RuntimeError("Не вдалося знайти вихідний файл моделі")
+        return mesh_path
+    
+    def _export_artifacts(self, inputs):
+        return [(file_path, ROLE_EXPORT) for file_path in inputs["results"]]
     
     def _find_sparse_model_dir(self, sparse_output):
         """
@@ -194,13 +229,14 @@ class OpenMVSPipeline(BasePipeline):
         if not os.path.exists(scene_mvs):
             raise RuntimeError("Не вдалося конвертувати COLMAP у OpenMVS")
     
-    def _run_densify_point_cloud(self, scene_mvs, dense_cloud_file):
+    def _run_densify_point_cloud(self, scene_mvs, dense_cloud_file, quality=None):
         """
         Запускає DensifyPointCloud з OpenMVS для створення щільної хмари точок.
         
         Args:
             scene_mvs (str): Шлях до вхідної сцени OpenMVS
             dense_cloud_file (str): Шлях для збереження щільної хмари точок
+            quality (str, optional): Якість етапу (за замовчуванням - якість пайплайну)
         """
         # Параметри якості
         quality_params = {
@@ -209,7 +245,8 @@ class OpenMVSPipeline(BasePipeline):
             'high': '--resolution-level 0 --min-resolution 1024 --max-resolution 3840'
         }
         
-        params = quality_params.get(self.quality, quality_params['medium'])
+        params = quality_params.get(quality or self.quality, quality_params['medium'])
+        params += f" --max-threads {self.threads}"
         
         # Додаємо параметр для використання GPU, якщо доступно
         if self.gpu_available:
@@ -233,22 +270,28 @@ class OpenMVSPipeline(BasePipeline):
             else:
                 raise FileNotFoundError(f"Не вдалося знайти щільну хмару точок після запуску DensifyPointCloud")
     
-    def _run_reconstruct_mesh(self, dense_cloud_file, mesh_file):
+    def _run_reconstruct_mesh(self, dense_cloud_file, mesh_file, quality=None, overrides=None):
         """
         Запускає ReconstructMesh з OpenMVS для створення меша.
         
         Args:
             dense_cloud_file (str): Шлях до файлу щільної хмари точок
             mesh_file (str): Шлях для збереження меша
+            quality (str, optional): Якість етапу (за замовчуванням - якість пайплайну)
+            overrides (dict, optional): Перевизначення параметрів ('min_face_angle', 'smooth')
         """
         # Параметри якості
         quality_params = {
-            'low': '--min-face-angle 8 --smooth 3',
-            'medium': '--min-face-angle 6 --smooth 2',
-            'high': '--min-face-angle 4 --smooth 1 --thickness-factor 1.0'
+            'low': {'min_face_angle': 8, 'smooth': 3},
+            'medium': {'min_face_angle': 6, 'smooth': 2},
+            'high': {'min_face_angle': 4, 'smooth': 1}
         }
         
-        params = quality_params.get(self.quality, quality_params['medium'])
+        quality = quality or self.quality
+        values = dict(quality_params.get(quality, quality_params['medium']), **(overrides or {}))
+        params = f"--min-face-angle {values['min_face_angle']} --smooth {values['smooth']} --max-threads {self.threads}"
+        if quality == 'high':
+            params += " --thickness-factor 1.0"
         
         mesh_cmd = f"xvfb-run.sh ReconstructMesh {dense_cloud_file} {params}"
         run_command(mesh_cmd, logger=self.logger)
@@ -268,22 +311,21 @@ class OpenMVSPipeline(BasePipeline):
             else:
                 raise FileNotFoundError(f"Не вдалося знайти меш після запуску ReconstructMesh")
     
-    def _run_texture_mesh(self, mesh_file, textured_mesh_file):
+    def _run_texture_mesh(self, mesh_file, textured_mesh_file, quality=None, overrides=None):
         """
         Запускає TextureMesh з OpenMVS для текстурування меша.
         
         Args:
             mesh_file (str): Шлях до файлу меша
             textured_mesh_file (str): Шлях для збереження текстурованого меша
+            quality (str, optional): Якість етапу (за замовчуванням - якість пайплайну)
+            overrides (dict, optional): Перевизначення параметрів ('resolution_level')
+            
+        Returns:
+            str: Шлях до текстурованого меша (або до нетекстурованого, якщо його не створено)
         """
         # Параметри якості
-        quality_params = {
-            'low': '--resolution-level 2',
-            'medium': '--resolution-level 1',
-            'high': '--resolution-level 0 --export-texture-type png'
-        }
-        
-        params = quality_params.get(self.quality, quality_params['medium'])
+        params = texture_mesh_args(quality or self.quality, overrides, self.threads)
         
         texture_cmd = f"xvfb-run.sh TextureMesh {mesh_file} {params}"
         run_command(texture_cmd, logger=self.logger)
@@ -304,6 +346,8 @@ class OpenMVSPipeline(BasePipeline):
                 self.logger.warning(f"Не вдалося знайти текстурований меш після запуску TextureMesh")
                 # Повертаємо шлях до нетекстурованого меша як fallback
                 textured_mesh_file = mesh_file
+        
+        return textured_mesh_file
     
     def _copy_results(self, mvs_dir, output_dir):
         """
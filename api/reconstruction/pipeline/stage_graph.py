@@ -0,0 +1,174 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+class Stage:
+    """
+    Вузол графа етапів пайплайну.
+    """
+
+    def __init__(self, name, func, inputs=(), cores=1, outputs=None, group=None, degradable=True, args=(),
+                 memory_mb=None, tool=None):
+        """
+        Опис етапу.
+
+        Args:
+            name (str): Унікальна назва етапу
+            func (str): Назва методу пайплайну func(quality, inputs, *args), де inputs -
+                словник результатів етапів-залежностей
+            inputs (tuple): Назви етапів, результати яких потрібні цьому етапу
+            cores (int, optional): Кількість ядер, яку займає етап (None - весь бюджет)
+            outputs (str, optional): Назва методу outputs(result), що повертає вихідні
+                файли етапу (за замовчуванням - результат-шлях)
+            group (str, optional): Група етапів для повторного виконання (from_stage);
+                за замовчуванням - назва етапу
+            degradable (bool): Чи повторювати етап з нижчою якістю при нестачі пам'яті
+            args (tuple): Додаткові аргументи func
+            memory_mb (int, optional): Пам'ять (МБ), яку орендує етап (None - пам'ять завдання)
+            tool (str, optional): Зовнішній інструмент, який етап використовує ексклюзивно
+                між завданнями (наприклад, 'gpu')
+        """
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.cores = cores
+        self.outputs = outputs
+        self.group = group or name
+        self.degradable = degradable
+        self.args = tuple(args)
+        self.memory_mb = memory_mb
+        self.tool = tool
+
+
+class StageGraph:
+    """
+    Декларативний граф етапів з явними залежностями.
+
+    Етапи, всі залежності яких виконано, запускаються паралельно, доки
+    сума їхніх ядер не перевищує бюджет CPU. Етап, що займає весь бюджет,
+    виконується один.
+    """
+
+    def __init__(self, stages, logger=None):
+        """
+        Ініціалізація графа.
+
+        Args:
+            stages (iterable): Етапи (Stage) у порядку оголошення
+            logger (Logger, optional): Логер для запису повідомлень
+        """
+        self.stages = {}
+        self.logger = logger or logging.getLogger("stage_graph")
+
+        for stage in stages:
+            if stage.name in self.stages:
+                raise ValueError(f"Етап {stage.name} оголошено двічі")
+            for name in stage.inputs:
+                if name not in self.stages:
+                    raise ValueError(f"Етап {stage.name} залежить від невідомого етапу {name}")
+            self.stages[stage.name] = stage
+
+    @property
+    def groups(self):
+        """
+        Назви груп етапів у порядку оголошення.
+        """
+        groups = []
+        for stage in self.stages.values():
+            if stage.group not in groups:
+                groups.append(stage.group)
+        return groups
+
+    def consumers(self, name):
+        """
+        Повертає етапи, що використовують результат заданого.
+        """
+        return [stage for stage in self.stages.values() if name in stage.inputs]
+
+    def downstream(self, group):
+        """
+        Повертає назви етапів групи та всіх етапів, що від них залежать.
+
+        Args:
+            group (str): Група етапів
+
+        Returns:
+            set: Назви етапів
+        """
+        names = {stage.name for stage in self.stages.values() if stage.group == group}
+        # Залежності завжди оголошені раніше, тому одного проходу достатньо
+        for stage in self.stages.values():
+            if names.intersection(stage.inputs):
+                names.add(stage.name)
+        return names
+
+    def required_inputs(self, group):
+        """
+        Етапи поза групою та її нащадками, результати яких потрібні для
+        повторного виконання з цієї групи.
+
+        Args:
+            group (str): Група етапів
+
+        Returns:
+            list: Назви етапів
+        """
+        rerun = self.downstream(group)
+        required = []
+        for name in rerun:
+            for input_name in self.stages[name].inputs:
+                if input_name not in rerun and input_name not in required:
+                    required.append(input_name)
+        return required
+
+    def run(self, execute, cpu_budget):
+        """
+        Виконує граф.
+
+        Args:
+            execute (callable): Функція execute(stage, inputs), що виконує етап
+            cpu_budget (int): Кількість ядер, доступних пайплайну
+
+        Returns:
+            dict: Результати етапів за назвами
+        """
+        cpu_budget = max(1, cpu_budget)
+        pending = dict(self.stages)
+        running = {}
+        results = {}
+        used = 0
+        error = None
+
+        with ThreadPoolExecutor(max_workers=cpu_budget, thread_name_prefix="stage") as pool:
+            while pending or running:
+                if error is None:
+                    for name, stage in list(pending.items()):
+                        if not all(input_name in results for input_name in stage.inputs):
+                            continue
+                        cores = min(stage.cores or cpu_budget, cpu_budget)
+                        if running and used + cores > cpu_budget:
+                            continue
+
+                        del pending[name]
+                        used += cores
+                        inputs = {input_name: results[input_name] for input_name in stage.inputs}
+                        running[pool.submit(execute, stage, inputs)] = (stage, cores)
+
+                if not running:
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage, cores = running.pop(future)
+                    used -= cores
+                    try:
+                        results[stage.name] = future.result()
+                    except Exception as e:
+                        # Нові етапи не запускаються, етапи, що вже виконуються, завершуються
+                        if error is None:
+                            self.logger.error(f"Етап {stage.name} завершився з помилкою: {str(e)}")
+                            error = e
+
+        if error is not None:
+            raise error
+        return results
@@ -0,0 +1,227 @@
+import os
+import cv2
+import numpy as np
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from ..utils.cancellation import check_cancelled
+
+# Поля ключової точки в компактному масиві (float32, по рядку на точку)
+KEYPOINT_FIELDS = ("x", "y", "size", "angle", "response", "octave", "class_id")
+
+# Параметри детектора SIFT (значення OpenCV за замовчуванням); входять у ключ кешу ознак
+SIFT_PARAMS = {
+    "nfeatures": 0,
+    "nOctaveLayers": 3,
+    "contrastThreshold": 0.04,
+    "edgeThreshold": 10,
+    "sigma": 1.6,
+}
+
+
+def keypoints_to_array(keypoints):
+    """
+    Перетворює ключові точки OpenCV на компактний масив, який дешево
+    передається між процесами (cv2.KeyPoint не серіалізується pickle).
+    
+    Args:
+        keypoints (list): Ключові точки cv2.KeyPoint
+    
+    Returns:
+        np.ndarray: Масив (N, 7) float32 з полями KEYPOINT_FIELDS
+    """
+    return np.array(
+        [(kp.pt[0], kp.pt[1], kp.size, kp.angle, kp.response, kp.octave, kp.class_id) for kp in keypoints],
+        dtype=np.float32,
+    ).reshape(-1, len(KEYPOINT_FIELDS))
+
+
+def keypoints_from_array(array):
+    """
+    Відновлює ключові точки OpenCV з компактного масиву.
+    
+    Args:
+        array (np.ndarray): Масив (N, 7) з keypoints_to_array
+    
+    Returns:
+        list: Ключові точки cv2.KeyPoint
+    """
+    return [
+        cv2.KeyPoint(float(x), float(y), float(size), float(angle), float(response), int(octave), int(class_id))
+        for x, y, size, angle, response, octave, class_id in array
+    ]
+
+
+def extract_image_batch(image_paths, params=None):
+    """
+    Виявляє ключові точки на кількох зображеннях (одне завдання пулу).
+    
+    Returns:
+        list: Результати extract_image_features у порядку зображень
+    """
+    return [extract_image_features(path, params) for path in image_paths]
+
+
+def _init_worker():
+    # Паралелізм - на рівні процесів, тому кожен процес виконує SIFT в одному потоці
+    cv2.setNumThreads(1)
+
+
+def extract_image_features(image_path, params=None):
+    """
+    Виявляє ключові точки SIFT на одному зображенні (виконується в процесі пулу).
+    
+    Дескриптори SIFT в OpenCV - цілі значення 0-255, збережені як float32,
+    тому передаються як uint8 (у 4 рази менше даних між процесами та в кеші).
+    
+    Args:
+        image_path (str): Шлях до зображення
+        params (dict, optional): Параметри детектора (за замовчуванням SIFT_PARAMS)
+    
+    Returns:
+        tuple: (ключові точки (N, 7) float32, дескриптори (N, 128) uint8 або float32)
+            або (None, причина), якщо ознак немає
+    """
+    img = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+    if img is None:
+        return None, "Не вдалося завантажити зображення"
+    
+    keypoints, descriptors = cv2.SIFT_create(**(params or SIFT_PARAMS)).detectAndCompute(img, None)
+    if descriptors is None:
+        return None, "Не знайдено ключових точок на зображенні"
+    
+    compact = descriptors.astype(np.uint8)
+    if not np.array_equal(compact, descriptors):
+        compact = descriptors
+    return keypoints_to_array(keypoints), compact
+
+
+class FeatureExtractor:
+    """
+    Паралельне виявлення ключових точок SIFT у пулі процесів.
+    
+    Кожне зображення декодується та обробляється в окремому процесі
+    (SIFT в OpenCV тримає GIL лише частково, тому потоки не масштабуються),
+    результати повертаються компактними масивами в порядку вхідних зображень.
+    Ознаки зображень, уже оброблених з тими самими параметрами, беруться
+    з кешу ознак за хешем вмісту.
+    """
+    
+    def __init__(self, logger, workers=None, cache=None, params=None):
+        """
+        Ініціалізація екстрактора.
+        
+        Args:
+            logger (Logger): Логер для запису повідомлень
+            workers (int, optional): Кількість процесів (за замовчуванням - кількість ядер)
+            cache (FeatureCache, optional): Кеш ознак
+            params (dict, optional): Параметри детектора (за замовчуванням SIFT_PARAMS)
+        """
+        self.logger = logger
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.cache = cache
+        self.params = dict(params or SIFT_PARAMS)
+        
+        # Статистика кешу останнього виклику extract()
+        self.cache_hits = 0
+        self.cache_misses = 0
+    
+    def cache_key_params(self):
+        """
+        Параметри, від яких залежать ознаки: детектор, його параметри та версія OpenCV.
+        """
+        return {"detector": "sift", "opencv": cv2.__version__, **self.params}
+    
+    def extract(self, image_files, image_hashes=None):
+        """
+        Виявляє ключові точки на зображеннях.
+        
+        Args:
+            image_files (list): Шляхи до зображень
+            image_hashes (list, optional): SHA-256 зображень (у тому ж порядку) для кешу ознак;
+                зображення без хешу (None) обробляються без кешу
+        
+        Returns:
+            list: Для кожного зображення (у вхідному порядку) - (keypoints, descriptors)
+                з cv2.KeyPoint та дескрипторами float32, або None, якщо ознак немає
+        """
+        results = [None] * len(image_files)
+        keys = [None] * len(image_files)
+        
+        use_cache = self.cache is not None and self.cache.enabled and image_hashes is not None
+        if use_cache:
+            key_params = self.cache_key_params()
+            for index, image_hash in enumerate(image_hashes):
+                if image_hash is None:
+                    continue
+                keys[index] = self.cache.key(image_hash, key_params)
+                results[index] = self.cache.get(keys[index])
+        
+        missing = [index for index, result in enumerate(results) if result is None]
+        self.cache_hits = len(image_files) - len(missing)
+        self.cache_misses = len(missing) if use_cache else 0
+        if self.cache_hits:
+            self.logger.info(f"Ознаки {self.cache_hits} з {len(image_files)} зображень взято з кешу")
+        
+        extracted = self._extract([image_files[index] for index in missing])
+        for index, result in zip(missing, extracted):
+            results[index] = result
+            if keys[index] is not None and result[0] is not None:
+                self.cache.put(keys[index], *result)
+        if use_cache and missing:
+            self.cache.evict()
+        
+        return [self._restore(path, result) for path, result in zip(image_files, results)]
+    
+    def _extract(self, image_files):
+        """
+        Виявляє ключові точки на зображеннях у пулі процесів.
+        
+        Returns:
+            list: Компактні результати extract_image_features у порядку зображень
+        """
+        workers = min(self.workers, len(image_files))
+        if workers <= 1:
+            results = []
+            for path in image_files:
+                check_cancelled()
+                results.append(extract_image_features(path, self.params))
+            return results
+        
+        self.logger.info(f"Виявлення ключових точок у {workers} процесах")
+        
+        # Процес завдання багатопотоковий (етапи графа, читання виводу команд),
+        # тому процеси пулу запускаються через spawn, а не fork
+        executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+        )
+        # Кілька зображень на завдання зменшують накладні витрати на передачу
+        chunksize = max(1, len(image_files) // (workers * 4))
+        futures = []
+        results = []
+        try:
+            futures = [
+                executor.submit(extract_image_batch, image_files[start:start + chunksize], self.params)
+                for start in range(0, len(image_files), chunksize)
+            ]
+            # Результати збираються в порядку вхідних зображень
+            for future in futures:
+                check_cancelled()
+                results.extend(future.result())
+        finally:
+            # cancel_futures у shutdown є лише з Python 3.9, тому завдання,
+            # що ще не почались, скасовуються вручну
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=True)
+        return results
+    
+    def _restore(self, image_path, result):
+        keypoints, descriptors = result
+        if keypoints is None:
+            self.logger.warning(f"{descriptors}: {image_path}")
+            return None
+        
+        self.logger.info(f"Знайдено {len(keypoints)} ключових точок на {os.path.basename(image_path)}")
+        return keypoints_from_array(keypoints), descriptors.astype(np.float32)
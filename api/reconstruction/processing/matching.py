@@ -0,0 +1,161 @@
+import cv2
+import numpy as np
+from ..utils.cancellation import check_cancelled
+
+# Параметри зіставлення та геометричної перевірки; входять у ключ кешу зіставлень
+MATCH_PARAMS = {
+    "ratio": 0.7,
+    "verification": "fundamental_ransac",
+    "ransac_threshold": 3.0,
+    "confidence": 0.99,
+}
+
+# Мінімальна кількість зіставлень для оцінки фундаментальної матриці
+MIN_VERIFICATION_MATCHES = 8
+
+
+class PairMatcher:
+    """
+    Зіставлення ключових точок між парами зображень з геометричною перевіркою.
+    
+    Для кожної пари виконується пошук двох найближчих сусідів (BFMatcher),
+    фільтр співвідношення Лоу та оцінка фундаментальної матриці RANSAC.
+    Результати пар, обидва зображення яких уже зіставлялись з тими самими
+    параметрами, беруться з кешу зіставлень за хешами зображень.
+    """
+    
+    def __init__(self, logger, cache=None, params=None, feature_params=None):
+        """
+        Ініціалізація зіставлення.
+        
+        Args:
+            logger (Logger): Логер для запису повідомлень
+            cache (MatchCache, optional): Кеш зіставлень
+            params (dict, optional): Параметри зіставлення (за замовчуванням MATCH_PARAMS)
+            feature_params (dict, optional): Параметри детектора ознак (частина ключа кешу)
+        """
+        self.logger = logger
+        self.cache = cache
+        self.params = dict(params or MATCH_PARAMS)
+        self.feature_params = dict(feature_params or {})
+        
+        # Статистика кешу останнього виклику match()
+        self.cache_hits = 0
+        self.cache_misses = 0
+    
+    def cache_key_params(self):
+        """
+        Параметри, від яких залежать зіставлення: ознаки, зіставлення та версія OpenCV.
+        """
+        return {"matcher": "bf_knn", "opencv": cv2.__version__, "features": self.feature_params, **self.params}
+    
+    def match(self, keypoints_list, descriptors_list, image_hashes=None, pairs=None):
+        """
+        Зіставляє ключові точки між парами зображень.
+        
+        Args:
+            keypoints_list (list): Ключові точки cv2.KeyPoint для кожного зображення
+            descriptors_list (list): Дескриптори для кожного зображення
+            image_hashes (list, optional): SHA-256 зображень (у тому ж порядку) для кешу
+                зіставлень; пари із зображеннями без хешу (None) обчислюються без кешу
+            pairs (list, optional): Пари індексів (i, j) для зіставлення (за замовчуванням - усі)
+        
+        Returns:
+            list: [(i, j, зіставлення cv2.DMatch, перевірка)], де перевірка -
+                (фундаментальна матриця, маска інлаєрів) або None
+        """
+        if pairs is None:
+            count = len(descriptors_list)
+            pairs = [(i, j) for i in range(count) for j in range(i + 1, count)]
+        
+        use_cache = self.cache is not None and self.cache.enabled and image_hashes is not None
+        key_params = self.cache_key_params() if use_cache else None
+        
+        matcher = cv2.BFMatcher()
+        results = []
+        self.cache_hits = self.cache_misses = 0
+        
+        for i, j in pairs:
+            check_cancelled()
+            if descriptors_list[i] is None or descriptors_list[j] is None:
+                continue
+            
+            if not use_cache or image_hashes[i] is None or image_hashes[j] is None:
+                entry = self._match_pair(matcher, keypoints_list, descriptors_list, i, j)
+                results.append((i, j) + self._restore(entry))
+                continue
+            
+            # Пара зберігається в канонічному порядку хешів, тому однакова
+            # для будь-якого порядку зображень у сесії
+            swapped = image_hashes[i] > image_hashes[j]
+            first, second = (j, i) if swapped else (i, j)
+            key = self.cache.key(image_hashes[first], image_hashes[second], key_params)
+            
+            entry = self.cache.get(key)
+            if entry is None:
+                self.cache_misses += 1
+                entry = self._match_pair(matcher, keypoints_list, descriptors_list, first, second)
+                self.cache.put(key, *entry)
+            else:
+                self.cache_hits += 1
+            
+            if swapped:
+                entry = self._swap(entry)
+            results.append((i, j) + self._restore(entry))
+        
+        if self.cache_hits:
+            self.logger.info(f"Зіставлення {self.cache_hits} з {len(pairs)} пар зображень взято з кешу")
+        if self.cache_misses:
+            self.cache.evict()
+        
+        return results
+    
+    def _match_pair(self, matcher, keypoints_list, descriptors_list, query, train):
+        """
+        Зіставляє пару зображень і перевіряє зіставлення фундаментальною матрицею.
+        
+        Returns:
+            tuple: (індекси (M, 2) int32, відстані (M,) float32,
+                фундаментальна матриця 3x3 або порожній масив, маска інлаєрів (M,) uint8 або порожній масив)
+        """
+        matches = matcher.knnMatch(descriptors_list[query], descriptors_list[train], k=2)
+        
+        # Застосовуємо фільтр співвідношення Лоу для видалення поганих зіставлень
+        good_matches = [
+            pair[0] for pair in matches
+            if len(pair) == 2 and pair[0].distance < self.params["ratio"] * pair[1].distance
+        ]
+        
+        indices = np.array([(m.queryIdx, m.trainIdx) for m in good_matches], dtype=np.int32).reshape(-1, 2)
+        distances = np.array([m.distance for m in good_matches], dtype=np.float32)
+        fundamental = np.zeros(0)
+        inliers = np.zeros(0, dtype=np.uint8)
+        
+        if len(good_matches) >= MIN_VERIFICATION_MATCHES:
+            pts1 = np.float32([keypoints_list[query][idx].pt for idx in indices[:, 0]])
+            pts2 = np.float32([keypoints_list[train][idx].pt for idx in indices[:, 1]])
+            F, mask = cv2.findFundamentalMat(
+                pts1, pts2, cv2.FM_RANSAC, self.params["ransac_threshold"], self.params["confidence"]
+            )
+            if F is not None and F.shape == (3, 3) and mask is not None:
+                fundamental = F
+                inliers = mask.ravel().astype(np.uint8)
+        
+        return indices, distances, fundamental, inliers
+    
+    @staticmethod
+    def _swap(entry):
+        # Зіставлення (j, i) -> (i, j): міняються стовпці індексів,
+        # фундаментальна матриця транспонується (x_j^T F x_i = 0 -> x_i^T F^T x_j = 0)
+        indices, distances, fundamental, inliers = entry
+        return indices[:, ::-1], distances, fundamental.T, inliers
+    
+    @staticmethod
+    def _restore(entry):
+        indices, distances, fundamental, inliers = entry
+        matches = [
+            cv2.DMatch(int(query_idx), int(train_idx), float(distance))
+            for (query_idx, train_idx), distance in zip(indices, distances)
+        ]
+        verification = (fundamental, inliers.astype(bool)) if fundamental.size else None
+        return matches, verification
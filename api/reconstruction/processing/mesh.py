@@ -3,6 +3,7 @@ import numpy as np
 import open3d as o3d
 import scipy.sparse as sp
 from scipy.sparse.csgraph import connected_components
+from ..utils.timeline import span
 
 class MeshProcessor:
     """
@@ -27,20 +28,22 @@ class MeshProcessor:
             'high': {'depth': 12, 'smoothing_iters': 5, 'denoise_neighbors': 16}
         }
     
-    def create_mesh(self, point_cloud_path, quality='medium'):
+    def create_mesh(self, point_cloud_path, quality='medium', params=None):
         """
         Створює меш з хмари точок.
         
         Args:
             point_cloud_path (str): Шлях до хмари точок
             quality (str): Якість реконструкції
+            params (dict, optional): Перевизначення параметрів якості
+                ('depth', 'smoothing_iters', 'denoise_neighbors')
             
         Returns:
             str: Шлях до створеного мешу
         """
         self.logger.info("Створення меша з хмари точок")
         
-        params = self.quality_params.get(quality, self.quality_params['medium'])
+        params = dict(self.quality_params.get(quality, self.quality_params['medium']), **(params or {}))
         
         # Завантажуємо хмару точок
         pcd = o3d.io.read_point_cloud(point_cloud_path)
@@ -55,19 +58,21 @@ class MeshProcessor:
         # Обчислюємо нормалі, якщо їх немає
         if not filtered_pcd.has_normals():
             self.logger.info("Обчислення нормалей для хмари точок")
-            filtered_pcd.estimate_normals(
-                search_param=o3d.geometry.KDTreeSearchParamHybrid(radius=0.1, max_nn=30)
-            )
-            filtered_pcd.orient_normals_consistent_tangent_plane(k=15)
+            with span("normals", points=len(filtered_pcd.points)):
+                filtered_pcd.estimate_normals(
+                    search_param=o3d.geometry.KDTreeSearchParamHybrid(radius=0.1, max_nn=30)
+                )
+                filtered_pcd.orient_normals_consistent_tangent_plane(k=15)
         
         # Створюємо меш за допомогою алгоритму Poisson
         self.logger.info(f"Застосування Poisson surface reconstruction з глибиною {params['depth']}")
-        mesh, densities = o3d.geometry.TriangleMesh.create_from_point_cloud_poisson(
-            filtered_pcd, 
-            depth=params['depth'],
-            scale=1.1,
-            linear_fit=True
-        )
+        with span("poisson", depth=params['depth']):
+            mesh, densities = o3d.geometry.TriangleMesh.create_from_point_cloud_poisson(
+                filtered_pcd, 
+                depth=params['depth'],
+                scale=1.1,
+                linear_fit=True
+            )
         
         # Видаляємо трикутники з низькою вагою
         percentile = 0.1 if quality == 'low' else (0.05 if quality == 'medium' else 0.02)
@@ -1,13 +1,14 @@
 import os
 import numpy as np
 import open3d as o3d
+from ..utils.thread_budget import thread_env
 
 class PointCloudProcessor:
     """
     Клас для обробки та генерації хмар точок.
     """
     
-    def __init__(self, sparse_dir, dense_dir, quality, logger, gpu_available):
+    def __init__(self, sparse_dir, dense_dir, quality, logger, gpu_available, threads=None):
         """
         Ініціалізація процесора хмари точок.
         
@@ -17,12 +18,14 @@ class PointCloudProcessor:
             quality (str): Якість реконструкції ('low', 'medium', 'high')
             logger: Об'єкт для логування
             gpu_available (bool): Чи доступне GPU
+            threads (int, optional): Кількість потоків COLMAP (за замовчуванням - всі ядра)
         """
         self.sparse_dir = sparse_dir
         self.dense_dir = dense_dir
         self.quality = quality
         self.logger = logger
         self.gpu_available = gpu_available
+        self.threads = threads
         
         # Параметри якості для різних етапів
         self.quality_params = {
@@ -79,6 +82,7 @@ class PointCloudProcessor:
             f"--workspace_path {self.dense_dir} "
             f"--input_type geometric "
             f"--output_path {os.path.join(self.dense_dir, 'fused.ply')}"
+            f"{self._threads_arg('StereoFusion')}"
         )
         self._run_command(fusion_cmd)
         
@@ -145,7 +149,8 @@ class PointCloudProcessor:
                         f"--input_type geometric "
                         f"--output_path {detail_pc_path} "
                         f"--StereoFusion.min_num_pixels 3 "
-                        f"--StereoFusion.max_normal_error 10 "
+                        f"--StereoFusion.max_normal_error 10"
+                        f"{self._threads_arg('StereoFusion')}"
                     )
                     self._run_command(fusion_cmd)
                     
@@ -256,6 +261,14 @@ class PointCloudProcessor:
                     
         self.logger.info(f"Скопійовано файли з {src_dir} в {dst_dir}")
     
+    def _threads_arg(self, section):
+        """
+        Параметр кількості потоків COLMAP для секції опцій (порожній, якщо не задано).
+        """
+        if not self.threads:
+            return ""
+        return f" --{section}.num_threads {self.threads}"
+    
     def _run_command(self, command):
         """
         Запускає зовнішню команду.
@@ -264,4 +277,5 @@ class PointCloudProcessor:
             command (str): Команда для виконання
         """
         from ..utils.file_utils import run_command
-        return run_command(command, logger=self.logger)
\ No newline at end of file
+        env = thread_env(self.threads) if self.threads else None
+        return run_command(command, env=env, logger=self.logger)
\ No newline at end of file
@@ -0,0 +1,224 @@
+import cv2
+import numpy as np
+
+# Кількість візуальних слів словника VLAD
+VOCABULARY_SIZE = 64
+
+# Кількість дескрипторів з одного зображення та загалом для навчання словника
+VOCABULARY_SAMPLES_PER_IMAGE = 256
+VOCABULARY_MAX_SAMPLES = 100000
+
+# Кількість зображень, подібність яких до всіх інших обчислюється за раз
+SIMILARITY_BLOCK = 1024
+
+
+def sequential_pairs(count, overlap):
+    """
+    Пари впорядкованих кадрів: кожен кадр з overlap наступними.
+    
+    Args:
+        count (int): Кількість зображень
+        overlap (int): Ширина ковзного вікна
+    
+    Returns:
+        list: Пари індексів (i, j), i < j
+    """
+    return [(i, j) for i in range(count) for j in range(i + 1, min(count, i + overlap + 1))]
+
+
+class PairRetrieval:
+    """
+    Відбір пар зображень для зіставлення за глобальними дескрипторами VLAD.
+    
+    Словник візуальних слів навчається k-means на вибірці дескрипторів SIFT
+    сесії; кожне зображення описується вектором VLAD (сума залишків дескрипторів
+    до найближчих слів), а для зіставлення лишаються top-k найподібніших
+    зображень для кожного. Замість n(n-1)/2 пар зіставляється не більше n*k.
+    """
+    
+    def __init__(self, logger, top_k, vocabulary_size=VOCABULARY_SIZE, seed=0):
+        """
+        Ініціалізація відбору пар.
+        
+        Args:
+            logger (Logger): Логер для запису повідомлень
+            top_k (int): Кількість кандидатів для зіставлення на зображення
+            vocabulary_size (int): Кількість візуальних слів
+            seed (int): Зерно вибірки та k-means (відбір пар відтворюваний)
+        """
+        self.logger = logger
+        self.top_k = top_k
+        self.vocabulary_size = vocabulary_size
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+        self.centers = None
+    
+    def is_exhaustive(self, image_count):
+        """
+        Чи зіставляються всі пари: відбір вимкнено (top_k = 0) або кандидатів
+        не менше, ніж інших зображень.
+        """
+        return self.top_k <= 0 or image_count - 1 <= self.top_k
+    
+    def select(self, descriptors_list):
+        """
+        Відбирає пари для зіставлення за дескрипторами, що вже є в пам'яті.
+        
+        Args:
+            descriptors_list (list): Дескриптори SIFT для кожного зображення
+        
+        Returns:
+            list: Відсортовані пари індексів (i, j), i < j
+        """
+        count = len(descriptors_list)
+        if self.is_exhaustive(count):
+            return [(i, j) for i in range(count) for j in range(i + 1, count)]
+        
+        self.train([self.sample(descriptors) for descriptors in descriptors_list])
+        return self.select_pairs([self.encode(descriptors) for descriptors in descriptors_list])
+    
+    def select_sequential(self, descriptors_list, overlap, loop_period):
+        """
+        Відбирає пари впорядкованих кадрів: ковзне вікно сусідів і кандидати
+        на замикання циклу (top-k найподібніших поза вікном для кожного
+        loop_period-го кадру).
+        
+        Args:
+            descriptors_list (list): Дескриптори SIFT кадрів у порядку зйомки
+            overlap (int): Ширина ковзного вікна
+            loop_period (int): Період кадрів для замикання циклу (0 - вимкнено)
+        
+        Returns:
+            list: Відсортовані пари індексів (i, j), i < j
+        """
+        count = len(descriptors_list)
+        pairs = set(sequential_pairs(count, overlap))
+        
+        if loop_period > 0 and self.top_k > 0 and count > overlap + 1:
+            self.train([self.sample(descriptors) for descriptors in descriptors_list])
+            vectors = [self.encode(descriptors) for descriptors in descriptors_list]
+            pairs.update(self.select_loop_closures(vectors, overlap, loop_period))
+        
+        self.logger.info(
+            f"Послідовне зіставлення: {len(pairs)} пар (вікно {overlap}, "
+            f"замикання циклу кожні {loop_period} кадрів)"
+        )
+        return sorted(pairs)
+    
+    def select_loop_closures(self, vectors, overlap, loop_period):
+        """
+        Кандидати на замикання циклу: для кожного loop_period-го кадру - top-k
+        найподібніших кадрів за межами ковзного вікна.
+        
+        Args:
+            vectors (list): Вектори VLAD кадрів у порядку зйомки
+            overlap (int): Ширина ковзного вікна (ці сусіди вже зіставляються)
+            loop_period (int): Період кадрів
+        
+        Returns:
+            list: Пари індексів (i, j), i < j
+        """
+        matrix = np.vstack(vectors).astype(np.float32)
+        count = len(vectors)
+        pairs = set()
+        for i in range(0, count, loop_period):
+            similarity = matrix @ matrix[i]
+            similarity[max(0, i - overlap):i + overlap + 1] = -np.inf
+            for j in np.argsort(-similarity)[:self.top_k]:
+                if np.isfinite(similarity[j]):
+                    pairs.add((min(i, int(j)), max(i, int(j))))
+        return sorted(pairs)
+    
+    def sample(self, descriptors):
+        """
+        Випадкова вибірка дескрипторів зображення для навчання словника.
+        
+        Args:
+            descriptors (np.ndarray): Дескриптори зображення (N, 128)
+        
+        Returns:
+            np.ndarray: Вибірка float32 (не більше VOCABULARY_SAMPLES_PER_IMAGE рядків)
+        """
+        if descriptors is None or len(descriptors) == 0:
+            return np.zeros((0, 128), dtype=np.float32)
+        if len(descriptors) > VOCABULARY_SAMPLES_PER_IMAGE:
+            rows = self.rng.choice(len(descriptors), VOCABULARY_SAMPLES_PER_IMAGE, replace=False)
+            descriptors = descriptors[rows]
+        return descriptors.astype(np.float32)
+    
+    def train(self, samples):
+        """
+        Навчає словник візуальних слів (k-means) на вибірках дескрипторів.
+        
+        Args:
+            samples (list): Вибірки дескрипторів зображень (з sample())
+        """
+        data = np.vstack(samples).astype(np.float32)
+        if len(data) > VOCABULARY_MAX_SAMPLES:
+            data = data[self.rng.choice(len(data), VOCABULARY_MAX_SAMPLES, replace=False)]
+        if len(data) == 0:
+            raise ValueError("Немає дескрипторів для навчання словника")
+        
+        words = min(self.vocabulary_size, len(data))
+        cv2.setRNGSeed(self.seed)
+        criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 20, 1e-3)
+        _, _, self.centers = cv2.kmeans(data, words, None, criteria, 1, cv2.KMEANS_PP_CENTERS)
+        self.logger.info(f"Словник VLAD: {words} слів, навчено на {len(data)} дескрипторах")
+    
+    def encode(self, descriptors):
+        """
+        Обчислює нормований вектор VLAD зображення.
+        
+        Args:
+            descriptors (np.ndarray): Дескриптори зображення (N, 128)
+        
+        Returns:
+            np.ndarray: Вектор VLAD (слова * 128) з одиничною нормою (нульовий без дескрипторів)
+        """
+        vlad = np.zeros_like(self.centers)
+        if descriptors is not None and len(descriptors):
+            data = descriptors.astype(np.float32)
+            
+            # Найближче слово: argmin ||d - c||^2 = argmin (||c||^2 - 2 d·c)
+            distances = (self.centers ** 2).sum(axis=1) - 2.0 * data @ self.centers.T
+            words = distances.argmin(axis=1)
+            np.add.at(vlad, words, data - self.centers[words])
+            
+            # Нормування кожного слова окремо зменшує вплив повторюваних текстур
+            norms = np.linalg.norm(vlad, axis=1, keepdims=True)
+            vlad /= np.maximum(norms, 1e-12)
+        
+        vlad = vlad.ravel()
+        return vlad / max(float(np.linalg.norm(vlad)), 1e-12)
+    
+    def select_pairs(self, vectors):
+        """
+        Відбирає для кожного зображення top-k найподібніших (косинусна подібність VLAD).
+        
+        Args:
+            vectors (list): Вектори VLAD зображень
+        
+        Returns:
+            list: Відсортовані пари індексів (i, j), i < j
+        """
+        count = len(vectors)
+        if self.is_exhaustive(count):
+            return [(i, j) for i in range(count) for j in range(i + 1, count)]
+        
+        matrix = np.vstack(vectors).astype(np.float32)
+        pairs = set()
+        for start in range(0, count, SIMILARITY_BLOCK):
+            similarity = matrix[start:start + SIMILARITY_BLOCK] @ matrix.T
+            rows = np.arange(similarity.shape[0])
+            similarity[rows, start + rows] = -np.inf
+            candidates = np.argpartition(-similarity, self.top_k - 1, axis=1)[:, :self.top_k]
+            for row, partners in enumerate(candidates):
+                i = start + row
+                for j in partners:
+                    pairs.add((min(i, int(j)), max(i, int(j))))
+        
+        self.logger.info(
+            f"Відібрано {len(pairs)} з {count * (count - 1) // 2} пар зображень "
+            f"(до {self.top_k} кандидатів на зображення)"
+        )
+        return sorted(pairs)
@@ -3,12 +3,35 @@ import numpy as np
 import open3d as o3d
 from ..utils.file_utils import run_command
 
+def texture_mesh_args(quality, params=None, threads=None):
+    """
+    Формує параметри OpenMVS TextureMesh для заданої якості.
+    
+    Args:
+        quality (str): Якість реконструкції
+        params (dict, optional): Перевизначення ('resolution_level')
+        threads (int, optional): Кількість потоків OpenMVS
+        
+    Returns:
+        str: Аргументи командного рядка
+    """
+    resolution_levels = {'low': 2, 'medium': 1, 'high': 0}
+    
+    level = (params or {}).get('resolution_level', resolution_levels.get(quality, 1))
+    args = f"--resolution-level {int(level)}"
+    if quality == 'high':
+        args += " --export-texture-type png"
+    if threads:
+        args += f" --max-threads {int(threads)}"
+    return args
+
+
 class TextureProcessor:
     """
     Клас для обробки та покращення текстур 3D-моделей.
     """
     
-    def __init__(self, image_dir, output_dir, logger):
+    def __init__(self, image_dir, output_dir, logger, threads=None):
         """
         Ініціалізація процесора текстур.
         
@@ -16,18 +39,21 @@ class TextureProcessor:
             image_dir (str): Директорія з вхідними зображеннями
             output_dir (str): Директорія для результатів
             logger: Об'єкт для логування
+            threads (int, optional): Кількість потоків OpenMVS (за замовчуванням - всі ядра)
         """
         self.image_dir = image_dir
         self.output_dir = output_dir
         self.logger = logger
+        self.threads = threads
     
-    def enhance_texture(self, mesh_path, quality='medium'):
+    def enhance_texture(self, mesh_path, quality='medium', params=None):
         """
         Покращує якість текстур меша.
         
         Args:
             mesh_path (str): Шлях до мешу
             quality (str): Якість реконструкції
+            params (dict, optional): Перевизначення параметрів якості ('resolution_level')
             
         Returns:
             str: Шлях до текстурованого мешу
@@ -35,13 +61,7 @@ class TextureProcessor:
         self.logger.info("Покращення якості текстур для меша")
         
         # Якість текстурування
-        quality_params = {
-            'low': "--resolution-level 2",
-            'medium': "--resolution-level 1",
-            'high': "--resolution-level 0 --export-texture-type png"
-        }
-        
-        params = quality_params.get(quality, quality_params['medium'])
+        params = texture_mesh_args(quality, params, self.threads)
         
         # Шлях до текстурованого меша
         textured_mesh = os.path.join(self.output_dir, "model_textured.obj")
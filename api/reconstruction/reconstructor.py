@@ -1,13 +1,28 @@
 import os
 import time
-import json
+from . import config
 from .utils.logging_utils import setup_logger
 from .utils.gpu_utils import check_gpu_availability
 from .utils.progress_tracker import ProgressTracker
+from .utils.result_cache import ResultCache, detach_links
+from .utils.disk_usage import DiskUsageLedger
+from .utils.upload_store import image_hashes
+from .utils.command_runner import CommandMetrics, set_command_metrics
+from .utils.cancellation import JobCancelled
+from .utils.metrics import MetricsStore, CACHE_LOOKUPS
+from .utils.timeline import Timeline, set_timeline
+from .pipeline.base_pipeline import PIPELINE_VERSION
 from .pipeline.colmap_pipeline import ColmapPipeline
 from .pipeline.openmvs_pipeline import OpenMVSPipeline
 from .pipeline.custom_pipeline import CustomPipeline
 
+# Пайплайни за методом реконструкції
+PIPELINES = {
+    'colmap': ColmapPipeline,
+    'openmvs': OpenMVSPipeline,
+    'custom': CustomPipeline,
+}
+
 class Reconstructor:
     """
     Основний клас для керування процесом 3D-реконструкції.
@@ -39,26 +54,92 @@ class Reconstructor:
         # Ініціалізуємо трекер прогресу
         self.progress = ProgressTracker(self.metadata_path)
         
+        # Метрики для /metrics (спільна база з чергою завдань)
+        self.metrics = MetricsStore(config.JOBS_DB_PATH, self.logger)
+        
+        # Облік ресурсів зовнішніх команд сесії (час CPU, пікова пам'ять, введення/виведення)
+        self.command_metrics = CommandMetrics(output_dir, self.progress, self.logger, self.metrics)
+        
+        # Часова шкала виконання сесії (logs/timeline.jsonl)
+        self.timeline = Timeline(output_dir, self.logger)
+        
+        # Кеш результатів для повторних запусків на тих самих даних
+        self.result_cache = ResultCache(
+            config.RESULT_CACHE_FOLDER, config.RESULT_CACHE_MAX_BYTES, self.logger
+        )
+        
+        # Облік дискового простору сесій для прибиральника
+        self.disk_usage = DiskUsageLedger(config.JOBS_DB_PATH, self.logger)
+        
         # Перевіряємо доступність GPU
         self.gpu_available = check_gpu_availability()
         self.logger.info(f"GPU доступність: {'Так' if self.gpu_available else 'Ні'}")
     
-    def run_reconstruction(self, method='colmap', quality='medium'):
+    def run_reconstruction(self, method='colmap', quality='medium', stage_quality=None,
+                           stage_params=None, from_stage=None, scheduler=None, profile=False,
+                           matching="auto"):
         """
         Запускає процес реконструкції з вибраним методом та якістю.
         
         Args:
             method (str): Метод реконструкції ('colmap', 'openmvs', 'custom')
             quality (str): Якість реконструкції ('low', 'medium', 'high')
+            stage_quality (dict, optional): Знижена якість для окремих етапів
+                (після нестачі пам'яті в попередній спробі)
+            stage_params (dict, optional): Перевизначення параметрів окремих етапів
+            from_stage (str, optional): Етап, з якого повторно виконати пайплайн
+                на збережених проміжних результатах
+            scheduler (StageScheduler, optional): Планувальник, у якого етапи
+                орендують ресурси
+            profile (bool): Профілювати етапи (cProfile та tracemalloc), профілі
+                зберігаються в profiles/ директорії результатів
+            matching (str): Режим зіставлення пар ('auto' або 'sequential')
             
         Returns:
             str: Шлях до згенерованої 3D-моделі
         """
         self.logger.info(f"Запуск реконструкції з методом {method}, якість {quality}")
+        if from_stage:
+            self.logger.info(f"Повторне виконання з етапу {from_stage}, параметри: {stage_params}")
         self.progress.update_progress("initialization", 0, "Ініціалізація процесу")
+        set_timeline(self.timeline)
+        self.timeline.record(
+            "run_start", method=method, quality=quality, stage_quality=stage_quality,
+            stage_params=stage_params, from_stage=from_stage, profile=profile, matching=matching,
+        )
+        
+        # Перевіряємо кеш результатів (лише для повної якості без деградації етапів
+        # і без перевизначених параметрів, які не входять у відбиток; профілювання
+        # потребує фактичного виконання етапів)
+        fingerprint = None
+        if (
+            self.result_cache.enabled
+            and not stage_quality
+            and not stage_params
+            and not from_stage
+            and not profile
+            and os.path.isdir(self.input_dir)
+        ):
+            fingerprint = self.result_cache.fingerprint(
+                image_hashes(self.input_dir), method, quality, PIPELINE_VERSION, matching
+            )
+            cached = self._restore_from_cache(fingerprint, method, quality)
+            self.metrics.increment(
+                CACHE_LOOKUPS, labels={"cache": "result", "result": "miss" if cached is None else "hit"}
+            )
+            if cached is not None:
+                self.timeline.record("run_end", status="completed", cache_hit=True)
+                return cached
+        
+        # Артефакти могли бути відновлені з кешу жорсткими посиланнями,
+        # тому перед перезаписом їх треба відокремити
+        self._adjust_disk_usage(detach_links(self.output_dir))
         
         # Вибір відповідного пайплайну
-        pipeline = self._get_pipeline(method, quality)
+        pipeline = self._get_pipeline(
+            method, quality, stage_quality, stage_params, from_stage, scheduler, profile, matching
+        )
+        set_command_metrics(self.command_metrics)
         
         try:
             # Оновлюємо метадані - процес розпочато
@@ -67,23 +148,50 @@ class Reconstructor:
                 "started_at": time.time(),
                 "quality": quality,
                 "method": method,
+                "cache_hit": False,
+                "stage_params": stage_params or {},
+                "from_stage": from_stage,
             })
             
             # Запускаємо процес реконструкції
             result_path = pipeline.run()
             
+            # Зберігаємо результати в кеш, якщо жоден етап не було деградовано
+            if fingerprint is not None and not pipeline.degraded_stages:
+                try:
+                    self._adjust_disk_usage(
+                        self.result_cache.store(fingerprint, self.output_dir, result_path)
+                    )
+                except Exception as e:
+                    self.logger.warning(f"Не вдалося зберегти результати в кеш: {str(e)}")
+            
+            # Подія прогресу передує статусу 'completed', після якого підписники відключаються
+            self.progress.update_progress("complete", 100, "Реконструкція завершена")
+            
             # Оновлюємо метадані - процес завершено успішно
             self._update_metadata({
                 "status": "completed",
                 "completed_at": time.time(),
                 "output_path": result_path,
+                "degraded_stages": pipeline.degraded_stages,
             })
             
-            self.progress.update_progress("complete", 100, "Реконструкція завершена")
             self.logger.info(f"Реконструкція завершена успішно: {result_path}")
+            self.timeline.record("run_end", status="completed", cache_hit=False)
             
             return result_path
             
+        except JobCancelled:
+            self.logger.warning("Реконструкцію скасовано")
+            self._update_metadata({
+                "status": "cancelled",
+                "completed_at": time.time(),
+                "degraded_stages": pipeline.degraded_stages,
+            })
+            self.progress.update_progress("cancelled", 0, "Реконструкцію скасовано")
+            self.timeline.record("run_end", status="cancelled")
+            raise
+            
         except Exception as e:
             self.logger.error(f"Помилка під час реконструкції: {str(e)}")
             import traceback
@@ -94,54 +202,94 @@ class Reconstructor:
                 "status": "failed",
                 "error": str(e),
                 "completed_at": time.time(),
+                "degraded_stages": pipeline.degraded_stages,
             })
             
             self.progress.update_progress("error", 0, f"Помилка: {str(e)}")
+            self.timeline.record("run_end", status="failed", error=str(e))
             raise
             
-    def _get_pipeline(self, method, quality):
+    def _restore_from_cache(self, fingerprint, method, quality):
+        """
+        Відновлює результати з кешу, якщо вони там є.
+        
+        Args:
+            fingerprint (str): Відбиток вхідних даних
+            method (str): Метод реконструкції
+            quality (str): Якість реконструкції
+            
+        Returns:
+            str: Шлях до 3D-моделі або None, якщо в кеші немає запису
+        """
+        entry = self.result_cache.lookup(fingerprint)
+        if entry is None:
+            return None
+        
+        try:
+            result_path, size_delta = self.result_cache.restore(fingerprint, entry, self.output_dir)
+        except OSError as e:
+            self.logger.warning(f"Не вдалося відновити результати з кешу: {str(e)}")
+            return None
+        self._adjust_disk_usage(size_delta)
+        
+        self.progress.update_progress("complete", 100, "Результати взято з кешу")
+        now = time.time()
+        self._update_metadata({
+            "status": "completed",
+            "started_at": now,
+            "completed_at": now,
+            "quality": quality,
+            "method": method,
+            "output_path": result_path,
+            "cache_hit": True,
+        })
+        self.logger.info(f"Результати взято з кешу: {result_path}")
+        
+        # Тимчасова директорія не знадобилась
+        try:
+            os.rmdir(self.temp_dir)
+        except OSError:
+            pass
+        
+        return result_path
+    
+    def _get_pipeline(self, method, quality, stage_quality=None, stage_params=None, from_stage=None,
+                      scheduler=None, profile=False, matching="auto"):
         """
         Створює відповідний об'єкт пайплайну.
         
         Args:
             method (str): Метод реконструкції
             quality (str): Якість реконструкції
+            stage_quality (dict, optional): Якість для окремих етапів
+            stage_params (dict, optional): Параметри окремих етапів
+            from_stage (str, optional): Етап, з якого виконувати пайплайн
+            scheduler (StageScheduler, optional): Планувальник етапів
+            profile (bool): Профілювати етапи
+            matching (str): Режим зіставлення пар
             
         Returns:
             BasePipeline: Об'єкт пайплайну
         """
-        if method == 'colmap':
-            return ColmapPipeline(
-                self.input_dir, 
-                self.output_dir, 
-                self.temp_dir, 
-                quality, 
-                self.progress, 
-                self.logger, 
-                self.gpu_available
-            )
-        elif method == 'openmvs':
-            return OpenMVSPipeline(
-                self.input_dir, 
-                self.output_dir, 
-                self.temp_dir, 
-                quality, 
-                self.progress, 
-                self.logger, 
-                self.gpu_available
-            )
-        elif method == 'custom':
-            return CustomPipeline(
-                self.input_dir, 
-                self.output_dir, 
-                self.temp_dir, 
-                quality, 
-                self.progress, 
-                self.logger, 
-                self.gpu_available
-            )
-        else:
+        if method not in PIPELINES:
             raise ValueError(f"Невідомий метод реконструкції: {method}")
+        
+        return PIPELINES[method](
+            self.input_dir, 
+            self.output_dir, 
+            self.temp_dir, 
+            quality, 
+            self.progress, 
+            self.logger, 
+            self.gpu_available,
+            stage_quality,
+            stage_params,
+            from_stage,
+            scheduler,
+            profile,
+            matching,
+            disk_usage=self._adjust_disk_usage
+        )
             
     def _update_metadata(self, data):
         """
@@ -150,16 +298,42 @@ class Reconstructor:
         Args:
             data (dict): Дані для оновлення
         """
+        # Оновлення проходять через спільний з трекером прогресу стан сесії,
+        # тому не перезаписують одне одного і записуються атомарно
+        self.progress.update_metadata(data)
+        
+        # Зміна статусу - окрема подія для клієнтів, підписаних на прогрес
+        if "status" in data:
+            self.progress.emit({
+                "type": "status",
+                "status": data["status"],
+                "error": data.get("error"),
+            })
+            self._record_disk_usage(data["status"])
+    
+    def _record_disk_usage(self, status):
+        """
+        Записує статус сесії в облік дискового простору.
+        
+        Args:
+            status (str): Статус сесії
+        """
         try:
-            with open(self.metadata_path, "r") as f:
-                metadata = json.load(f)
-                
-            # Оновлюємо дані
-            metadata.update(data)
-            
-            # Зберігаємо оновлені метадані
-            with open(self.metadata_path, "w") as f:
-                json.dump(metadata, f)
-                
+            self.disk_usage.record(self.session_id, status=status)
+        except Exception as e:
+            self.logger.warning(f"Не вдалося оновити облік дискового простору: {str(e)}")
+    
+    def _adjust_disk_usage(self, delta):
+        """
+        Змінює облікований розмір результатів сесії там, де файли створюються
+        або видаляються, без повторного обходу директорії результатів.
+        
+        Args:
+            delta (int): Зміна розміру в байтах
+        """
+        if not delta:
+            return
+        try:
+            self.disk_usage.adjust(self.session_id, results_delta=delta)
         except Exception as e:
-            self.logger.error(f"Помилка при оновленні метаданих: {str(e)}")
\ No newline at end of file
+            self.logger.warning(f"Не вдалося оновити облік дискового простору: {str(e)}")
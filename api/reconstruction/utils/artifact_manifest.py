@@ -0,0 +1,356 @@
+import os
+import gzip
+import json
+import shutil
+import logging
+import threading
+from collections import OrderedDict
+from .file_utils import iter_result_files
+from .upload_store import hash_file
+
+# Файл маніфесту артефактів у директорії результатів сесії
+MANIFEST_FILE = "artifacts.json"
+
+# Ролі артефактів
+ROLE_MODEL = "model"              # Основна (текстурована) модель пайплайну
+ROLE_EXPORT = "export"            # Модель, експортована в інший формат
+ROLE_PREVIEW = "preview"          # Формат, який показує веб-переглядач
+ROLE_POINT_CLOUD = "point_cloud"  # Хмара точок
+
+# Формати 3D-моделей та пріоритет вибору моделі для веб-переглядача
+MODEL_FORMATS = ("gltf", "glb", "obj", "ply", "stl")
+PREVIEW_PRIORITY = ("gltf", "glb", "obj", "ply")
+
+# Текстові формати, для яких під час експорту створюються стиснені gzip-варіанти
+# (PLY - лише в ASCII-варіанті, бінарний PLY стискається погано)
+GZIP_FORMATS = ("obj", "gltf", "ply")
+GZIP_SUFFIX = ".gz"
+
+# Варіант не зберігається, якщо він зменшує файл менш ніж на 10%
+GZIP_MIN_RATIO = 0.9
+
+
+def _artifact_format(path):
+    return os.path.splitext(path)[1][1:].lower()
+
+
+def _is_text_model(path, fmt):
+    if fmt not in GZIP_FORMATS:
+        return False
+    if fmt != "ply":
+        return True
+    with open(path, "rb") as f:
+        header = f.read(512)
+    return b"format ascii" in header
+
+
+def _gzip_file(src, dst):
+    tmp_path = f"{dst}.tmp"
+    try:
+        with open(src, "rb") as f_in, open(tmp_path, "wb") as raw:
+            # mtime=0 робить вміст варіанту (і його хеш) детермінованим
+            with gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=9, mtime=0) as f_out:
+                shutil.copyfileobj(f_in, f_out, 1024 * 1024)
+        os.replace(tmp_path, dst)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class ArtifactManifest:
+    """
+    Маніфест артефактів сесії: формат, розмір, хеш та роль кожного файлу.
+
+    Пайплайни та експортер записують маніфест після створення результатів,
+    тому API знаходить модель без сканування директорій.
+    """
+
+    def __init__(self, output_dir, logger=None):
+        """
+        Ініціалізація маніфесту.
+
+        Args:
+            output_dir (str): Директорія результатів сесії
+            logger (Logger, optional): Логер для запису повідомлень
+        """
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, MANIFEST_FILE)
+        self.logger = logger or logging.getLogger("artifact_manifest")
+        self.artifacts = OrderedDict()
+
+    def add(self, path, role):
+        """
+        Додає артефакт до маніфесту. Файли поза директорією результатів
+        (наприклад, у тимчасовій директорії) не записуються.
+
+        Args:
+            path (str): Шлях до файлу
+            role (str): Роль артефакту
+
+        Returns:
+            dict: Опис артефакту або None
+        """
+        output_dir = os.path.abspath(self.output_dir)
+        path = os.path.abspath(path)
+        if not path.startswith(output_dir + os.sep) or not os.path.isfile(path):
+            return None
+
+        rel_path = os.path.relpath(path, output_dir).replace(os.sep, "/")
+        st = os.stat(path)
+        existing = self.artifacts.get(rel_path)
+        if existing is not None and is_current(existing, st):
+            # Один файл може мати кілька ролей (наприклад, основна модель у форматі OBJ)
+            if role not in existing["roles"]:
+                existing["roles"].append(role)
+            return existing
+
+        artifact = {
+            "path": rel_path,
+            "format": _artifact_format(rel_path),
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "sha256": hash_file(path),
+            "roles": [role],
+        }
+        self.artifacts[rel_path] = artifact
+        return artifact
+
+    def add_gzip_variants(self):
+        """
+        Створює стиснені gzip-варіанти текстових моделей (.obj, .gltf, ASCII .ply),
+        які API віддає клієнтам з підтримкою Content-Encoding: gzip.
+
+        Returns:
+            int: Кількість створених варіантів
+        """
+        created = 0
+        for artifact in self.artifacts.values():
+            path = os.path.join(self.output_dir, artifact["path"])
+            variant = artifact.get("variants", {}).get("gzip")
+            if variant is not None and variant.get("source_sha256") == artifact["sha256"]:
+                continue
+            if not _is_text_model(path, artifact["format"]):
+                continue
+
+            variant_path = path + GZIP_SUFFIX
+            _gzip_file(path, variant_path)
+            size = os.path.getsize(variant_path)
+            if size >= artifact["size"] * GZIP_MIN_RATIO:
+                os.remove(variant_path)
+                continue
+
+            artifact.setdefault("variants", {})["gzip"] = {
+                "path": artifact["path"] + GZIP_SUFFIX,
+                "size": size,
+                "sha256": hash_file(variant_path),
+                "source_sha256": artifact["sha256"],
+            }
+            created += 1
+            self.logger.info(
+                f"Створено gzip-варіант {artifact['path']}: {artifact['size']} -> {size} байт"
+            )
+        return created
+
+    def _select_preview(self):
+        candidates = [
+            a for a in self.artifacts.values()
+            if a["format"] in PREVIEW_PRIORITY and a["roles"] != [ROLE_POINT_CLOUD]
+        ]
+        if not candidates:
+            return None
+        return min(
+            candidates,
+            key=lambda a: (
+                PREVIEW_PRIORITY.index(a["format"]),
+                # Серед однакових форматів віддаємо перевагу файлам у корені результатів
+                "/" in a["path"],
+                a["path"],
+            ),
+        )
+
+    def save(self):
+        """
+        Атомарно записує маніфест, позначаючи формат для веб-переглядача.
+
+        Returns:
+            dict: Записаний маніфест
+        """
+        for artifact in self.artifacts.values():
+            if ROLE_PREVIEW in artifact["roles"]:
+                artifact["roles"].remove(ROLE_PREVIEW)
+        preview = self._select_preview()
+        if preview is not None:
+            preview["roles"].append(ROLE_PREVIEW)
+
+        manifest = {"artifacts": list(self.artifacts.values())}
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+        self.logger.info(f"Записано маніфест артефактів: {len(self.artifacts)} файлів")
+        return manifest
+
+    @classmethod
+    def load(cls, output_dir, logger=None):
+        """
+        Завантажує наявний маніфест, щоб доповнити його новими артефактами.
+
+        Args:
+            output_dir (str): Директорія результатів сесії
+            logger (Logger, optional): Логер для запису повідомлень
+
+        Returns:
+            ArtifactManifest: Маніфест (порожній, якщо файлу немає)
+        """
+        manifest = cls(output_dir, logger)
+        for artifact in read_manifest(output_dir).get("artifacts", []):
+            manifest.artifacts[artifact["path"]] = artifact
+        return manifest
+
+    @classmethod
+    def from_directory(cls, output_dir, logger=None):
+        """
+        Будує маніфест скануванням директорії результатів. Використовується
+        для сесій, створених до появи маніфестів.
+
+        Args:
+            output_dir (str): Директорія результатів сесії
+            logger (Logger, optional): Логер для запису повідомлень
+
+        Returns:
+            ArtifactManifest: Маніфест
+        """
+        manifest = cls(output_dir, logger)
+        for rel_path in iter_result_files(output_dir):
+            fmt = _artifact_format(rel_path)
+            if fmt not in MODEL_FORMATS:
+                continue
+            name = os.path.basename(rel_path)
+            role = ROLE_POINT_CLOUD if "point_cloud" in name or "fused" in name else ROLE_EXPORT
+            manifest.add(os.path.join(output_dir, rel_path), role)
+        return manifest
+
+
+def is_current(artifact, st):
+    """
+    Перевіряє, що опис артефакту відповідає файлу (файл не перезаписано після запису маніфесту).
+
+    Args:
+        artifact (dict): Опис артефакту з маніфесту
+        st (os.stat_result): Результат stat() файлу
+
+    Returns:
+        bool: True, якщо розмір і час модифікації збігаються
+    """
+    return artifact.get("size") == st.st_size and artifact.get("mtime_ns") == st.st_mtime_ns
+
+
+def read_manifest(output_dir):
+    """
+    Читає маніфест артефактів сесії.
+
+    Args:
+        output_dir (str): Директорія результатів сесії
+
+    Returns:
+        dict: Маніфест (порожній, якщо його ще немає)
+    """
+    try:
+        with open(os.path.join(output_dir, MANIFEST_FILE), "r") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+class ManifestIndex:
+    """
+    LRU-кеш маніфестів артефактів у пам'яті API.
+
+    Запис вважається актуальним, поки не змінилися mtime та розмір файлу
+    маніфесту, тому пошук моделі коштує один stat() замість обходу директорій.
+    """
+
+    def __init__(self, results_root, max_entries=256, logger=None):
+        """
+        Ініціалізація індексу.
+
+        Args:
+            results_root (str): Коренева директорія результатів
+            max_entries (int): Максимальна кількість сесій у кеші
+            logger (Logger, optional): Логер для запису повідомлень
+        """
+        self.results_root = results_root
+        self.max_entries = max_entries
+        self.logger = logger or logging.getLogger("manifest_index")
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id, build_missing=False):
+        """
+        Повертає маніфест сесії з індексом артефактів за шляхом та роллю.
+
+        Args:
+            session_id (str): Ідентифікатор сесії
+            build_missing (bool): Побудувати маніфест скануванням, якщо його немає
+                (лише для завершених сесій, створених до появи маніфестів)
+
+        Returns:
+            dict: {'artifacts', 'by_path', 'by_role', 'variants'} або None
+        """
+        session_dir = os.path.join(self.results_root, session_id)
+        manifest_path = os.path.join(session_dir, MANIFEST_FILE)
+
+        try:
+            st = os.stat(manifest_path)
+        except FileNotFoundError:
+            if not build_missing or not os.path.isdir(session_dir):
+                return None
+            self.logger.info(f"Маніфест артефактів сесії {session_id} відсутній, будуємо його")
+            ArtifactManifest.from_directory(session_dir, self.logger).save()
+            st = os.stat(manifest_path)
+
+        version = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(session_id)
+                return entry[1]
+
+        index = self._build_index(read_manifest(session_dir))
+
+        with self._lock:
+            self._entries[session_id] = (version, index)
+            self._entries.move_to_end(session_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+        return index
+
+    def invalidate(self, session_id):
+        """
+        Видаляє сесію з кешу (наприклад, після видалення сесії).
+
+        Args:
+            session_id (str): Ідентифікатор сесії
+        """
+        with self._lock:
+            self._entries.pop(session_id, None)
+
+    @staticmethod
+    def _build_index(manifest):
+        artifacts = manifest.get("artifacts", [])
+        by_role = {}
+        variants = set()
+        for artifact in artifacts:
+            for role in artifact.get("roles", []):
+                by_role.setdefault(role, artifact)
+            for variant in artifact.get("variants", {}).values():
+                variants.add(variant["path"])
+        return {
+            "artifacts": artifacts,
+            "by_path": {artifact["path"]: artifact for artifact in artifacts},
+            "by_role": by_role,
+            "variants": variants,
+        }
@@ -0,0 +1,203 @@
+import os
+import re
+import shutil
+import fcntl
+import logging
+from contextlib import contextmanager
+from .disk_usage import BLOBS_CATEGORY
+
+# Допустимий ідентифікатор блобу: SHA-256 у нижньому регістрі
+SHA256_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+
+def is_valid_sha256(value):
+    """
+    Перевіряє, що рядок є SHA-256 у hex-записі (і тому безпечний як частина шляху).
+
+    Args:
+        value (str): Рядок для перевірки
+
+    Returns:
+        bool: True, якщо рядок складається з 64 hex-символів у нижньому регістрі
+    """
+    return isinstance(value, str) and SHA256_PATTERN.match(value) is not None
+
+
+class BlobStore:
+    """
+    Контентно-адресоване сховище файлів, спільне для всіх сесій.
+
+    Кожен файл зберігається один раз під своїм SHA-256, а директорії сесій
+    складаються з жорстких (або символічних) посилань на блоби. Для кожного
+    блобу ведеться облік сесій, що його використовують, тому блоб видаляється
+    лише тоді, коли на нього не посилається жодна сесія.
+    """
+
+    def __init__(self, root, logger=None, ledger=None):
+        """
+        Ініціалізація сховища блобів.
+
+        Args:
+            root (str): Коренева директорія сховища
+            logger (Logger, optional): Логер для запису повідомлень
+            ledger (DiskUsageLedger, optional): Облік дискового простору; блоби
+                враховуються один раз у категорії BLOBS_CATEGORY
+        """
+        self.root = root
+        self.ledger = ledger
+        self.objects_dir = os.path.join(root, "objects")
+        self.refs_dir = os.path.join(root, "refs")
+        self.lock_path = os.path.join(root, ".lock")
+        self.logger = logger or logging.getLogger("blob_store")
+
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.refs_dir, exist_ok=True)
+
+    @contextmanager
+    def _locked(self):
+        """
+        Блокування між процесами на час зміни посилань, щоб звільнення блобу
+        не конкурувало з додаванням нового посилання на нього.
+        """
+        with open(self.lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def blob_path(self, sha256):
+        """
+        Повертає шлях до блобу за його хешем.
+
+        Args:
+            sha256 (str): SHA-256 вмісту
+
+        Returns:
+            str: Шлях до блобу
+
+        Raises:
+            ValueError: Якщо хеш не є SHA-256 у hex-записі
+        """
+        if not is_valid_sha256(sha256):
+            raise ValueError(f"Некоректний SHA-256: {sha256!r}")
+        return os.path.join(self.objects_dir, sha256[:2], sha256)
+
+    def _refs_path(self, sha256):
+        if not is_valid_sha256(sha256):
+            raise ValueError(f"Некоректний SHA-256: {sha256!r}")
+        return os.path.join(self.refs_dir, sha256[:2], sha256)
+
+    def exists(self, sha256):
+        return os.path.exists(self.blob_path(sha256))
+
+    def ingest(self, path, sha256, session_id):
+        """
+        Переносить щойно записаний файл у сховище і замінює його посиланням.
+        Якщо блоб з таким вмістом вже є, файл просто видаляється.
+
+        Args:
+            path (str): Шлях до файлу в директорії сесії
+            sha256 (str): SHA-256 вмісту файлу
+            session_id (str): Ідентифікатор сесії-власника посилання
+
+        Returns:
+            bool: True, якщо вміст вже був у сховищі (дедуплікація)
+        """
+        blob = self.blob_path(sha256)
+
+        with self._locked():
+            existed = os.path.exists(blob)
+            if existed:
+                os.remove(path)
+            else:
+                os.makedirs(os.path.dirname(blob), exist_ok=True)
+                shutil.move(path, blob)
+                os.chmod(blob, 0o444)
+                self._account(os.path.getsize(blob))
+
+            self._link(blob, path)
+            self._add_ref(sha256, session_id)
+
+        if existed:
+            self.logger.info(f"Дедуплікація: {os.path.basename(path)} вже є у сховищі ({sha256[:12]})")
+        return existed
+
+    def link(self, sha256, path, session_id):
+        """
+        Додає до сесії файл, вміст якого вже є у сховищі, без повторного завантаження.
+
+        Args:
+            sha256 (str): SHA-256 вмісту
+            path (str): Шлях до файлу в директорії сесії
+            session_id (str): Ідентифікатор сесії
+
+        Returns:
+            int: Розмір файлу в байтах або None, якщо блобу немає у сховищі
+        """
+        blob = self.blob_path(sha256)
+
+        # Перевірка та посилання виконуються під одним блокуванням, щоб блоб
+        # не було звільнено між ними
+        with self._locked():
+            if not os.path.exists(blob):
+                return None
+            if os.path.lexists(path):
+                os.remove(path)
+            self._link(blob, path)
+            self._add_ref(sha256, session_id)
+            return os.path.getsize(blob)
+
+    def _link(self, blob, path):
+        try:
+            os.link(blob, path)
+        except OSError:
+            # Інша файлова система - використовуємо символічне посилання
+            os.symlink(blob, path)
+
+    def _add_ref(self, sha256, session_id):
+        refs = self._refs_path(sha256)
+        os.makedirs(refs, exist_ok=True)
+        open(os.path.join(refs, session_id), "a").close()
+
+    def release(self, session_id, hashes):
+        """
+        Знімає посилання сесії на блоби та видаляє блоби без посилань.
+
+        Args:
+            session_id (str): Ідентифікатор сесії
+            hashes (iterable): SHA-256 блобів, якими користувалась сесія
+
+        Returns:
+            int: Кількість звільнених байтів
+        """
+        freed = 0
+
+        with self._locked():
+            for sha256 in set(hashes):
+                refs = self._refs_path(sha256)
+                ref_file = os.path.join(refs, session_id)
+                if os.path.exists(ref_file):
+                    os.remove(ref_file)
+
+                if os.path.isdir(refs) and os.listdir(refs):
+                    continue
+
+                blob = self.blob_path(sha256)
+                if os.path.exists(blob):
+                    freed += os.path.getsize(blob)
+                    os.remove(blob)
+                    self.logger.info(f"Видалено блоб без посилань: {sha256[:12]}")
+                if os.path.isdir(refs):
+                    os.rmdir(refs)
+
+        self._account(-freed)
+        return freed
+
+    def _account(self, delta):
+        if self.ledger is None or not delta:
+            return
+        try:
+            self.ledger.adjust_shared(BLOBS_CATEGORY, delta)
+        except Exception as e:
+            self.logger.warning(f"Не вдалося оновити облік сховища блобів: {str(e)}")
@@ -0,0 +1,72 @@
+import signal
+import logging
+import threading
+
+# Запит на скасування завдання в поточному процесі
+_cancelled = threading.Event()
+_callbacks = []
+
+
+class JobCancelled(Exception):
+    """
+    Завдання скасовано користувачем.
+    """
+
+
+def add_cancel_callback(callback):
+    """
+    Реєструє функцію, що викликається під час скасування
+    (наприклад, завершення груп процесів зовнішніх програм).
+
+    Args:
+        callback (callable): Функція без аргументів
+    """
+    _callbacks.append(callback)
+
+
+def request_cancel():
+    """
+    Позначає завдання поточного процесу як скасоване та зупиняє зовнішні програми.
+    Етапи на Python зупиняються в найближчій контрольній точці (check_cancelled).
+    """
+    _cancelled.set()
+    for callback in list(_callbacks):
+        try:
+            callback()
+        except Exception:
+            logging.getLogger("cancellation").exception("Помилка під час скасування")
+
+
+def is_cancelled():
+    """
+    Чи скасовано завдання поточного процесу.
+    """
+    return _cancelled.is_set()
+
+
+def check_cancelled():
+    """
+    Контрольна точка скасування: перериває виконання, якщо завдання скасовано.
+
+    Raises:
+        JobCancelled: Завдання скасовано
+    """
+    if _cancelled.is_set():
+        raise JobCancelled("Завдання скасовано")
+
+
+def install_cancel_handler(logger=None):
+    """
+    Встановлює обробник SIGTERM, яким воркер скасовує завдання в його процесі.
+
+    Args:
+        logger (Logger, optional): Логер для запису повідомлень
+    """
+    if logger is None:
+        logger = logging.getLogger("cancellation")
+
+    def handle(signum, frame):
+        logger.warning("Отримано запит на скасування завдання")
+        request_cancel()
+
+    signal.signal(signal.SIGTERM, handle)
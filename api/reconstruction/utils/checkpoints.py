@@ -0,0 +1,210 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from .session_state import write_json_atomic, read_json
+
+# Файл контрольних точок етапів у директорії результатів сесії
+CHECKPOINTS_FILE = "checkpoints.json"
+
+
+def stage_key(parent_key, stage, params):
+    """
+    Обчислює ключ контрольної точки етапу. Ключ попереднього етапу входить
+    у ключ наступного, тому повторне виконання етапу робить недійсними
+    контрольні точки всіх етапів після нього.
+
+    Args:
+        parent_key (str): Ключ попереднього етапу (або відбиток вхідних зображень)
+        stage (str): Назва етапу
+        params (dict): Параметри етапу
+
+    Returns:
+        str: Ключ (hex SHA-256)
+    """
+    payload = json.dumps({"parent": parent_key, "stage": stage, "params": params}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _output_signature(path):
+    """
+    Повертає підпис виходу етапу: розмір і час модифікації файлу або
+    всіх файлів директорії. None, якщо виходу немає.
+    """
+    if os.path.isfile(path):
+        st = os.stat(path)
+        return [st.st_size, st.st_mtime_ns]
+
+    if not os.path.isdir(path):
+        return None
+
+    entries = []
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for filename in sorted(files):
+            file_path = os.path.join(root, filename)
+            st = os.stat(file_path)
+            entries.append([os.path.relpath(file_path, path), st.st_size, st.st_mtime_ns])
+    return entries
+
+
+def signature_size(path, signature):
+    """
+    Повертає розмір виходу етапу за його підписом, враховуючи лише файли, що ще існують.
+
+    Args:
+        path (str): Шлях до виходу (файлу або директорії)
+        signature (list): Підпис з _output_signature
+
+    Returns:
+        int: Розмір у байтах
+    """
+    if not signature:
+        return 0
+    if not isinstance(signature[0], list):
+        return signature[0] if os.path.isfile(path) else 0
+    return sum(
+        size for rel_path, size, mtime in signature if os.path.isfile(os.path.join(path, rel_path))
+    )
+
+
+class StageCheckpoints:
+    """
+    Контрольні точки етапів пайплайну.
+
+    Після успішного етапу записуються його ключ, результат та підписи
+    вихідних файлів. Повторний або відновлений після збою запуск пропускає
+    етап, якщо ключ збігається, а вихідні файли не змінились.
+    """
+
+    def __init__(self, output_dir, logger=None):
+        """
+        Ініціалізація контрольних точок.
+
+        Args:
+            output_dir (str): Директорія результатів сесії
+            logger (Logger, optional): Логер для запису повідомлень
+        """
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, CHECKPOINTS_FILE)
+        self.logger = logger or logging.getLogger("checkpoints")
+        self._stages = read_json(self.path)
+        # Незалежні етапи виконуються паралельно й записують точки одночасно
+        self._lock = threading.Lock()
+
+    def _abs(self, rel_path):
+        return os.path.join(self.output_dir, rel_path)
+
+    def _resolve(self, entry):
+        entry = dict(entry)
+        if entry.get("result_path") is not None:
+            entry["result"] = self._abs(entry["result_path"])
+        return entry
+
+    def get(self, stage, key):
+        """
+        Повертає контрольну точку етапу, якщо вона дійсна.
+
+        Args:
+            stage (str): Назва етапу
+            key (str): Очікуваний ключ етапу
+
+        Returns:
+            dict: Запис {'result', 'quality', ...} або None
+        """
+        entry = self._stages.get(stage)
+        if not entry or entry.get("key") != key:
+            return None
+
+        for rel_path, signature in entry["outputs"].items():
+            if _output_signature(self._abs(rel_path)) != signature:
+                self.logger.info(f"Контрольна точка етапу {stage} недійсна: змінено {rel_path}")
+                return None
+
+        return self._resolve(entry)
+
+    def latest(self, stage, validate=True):
+        """
+        Повертає останню контрольну точку етапу незалежно від ключа
+        (для повторного виконання наступних етапів з іншими параметрами).
+
+        Args:
+            stage (str): Назва етапу
+            validate (bool): Перевіряти, що вихідні файли етапу не змінились
+
+        Returns:
+            dict: Запис або None
+        """
+        entry = self._stages.get(stage)
+        if not entry:
+            return None
+        if validate:
+            return self.get(stage, entry["key"])
+
+        return self._resolve(entry)
+
+    def outputs_size(self, stages=None):
+        """
+        Рахує розмір записаних виходів етапів, які ще є на диску. Розміри беруться
+        з підписів, тому директорії не обходяться - перевіряється лише наявність файлів.
+
+        Args:
+            stages (iterable, optional): Етапи (за замовчуванням - усі)
+
+        Returns:
+            int: Розмір у байтах
+        """
+        with self._lock:
+            entries = [
+                entry for stage, entry in self._stages.items() if stages is None or stage in stages
+            ]
+
+        total = 0
+        for entry in entries:
+            for rel_path, signature in entry["outputs"].items():
+                total += signature_size(self._abs(rel_path), signature)
+        return total
+
+    def save(self, stage, key, result, outputs, quality=None):
+        """
+        Записує контрольну точку етапу.
+
+        Args:
+            stage (str): Назва етапу
+            key (str): Ключ етапу
+            result: Результат етапу (серіалізований у JSON)
+            outputs (list): Шляхи до вихідних файлів або директорій етапу
+            quality (str, optional): Якість, з якою етап фактично виконано
+
+        Returns:
+            dict: Підписи вихідних файлів або None, якщо контрольну точку не записано
+        """
+        signatures = {}
+        for path in outputs:
+            signature = _output_signature(path)
+            if signature is None:
+                self.logger.warning(f"Вихід етапу {stage} не знайдено, контрольну точку не записано: {path}")
+                return None
+            signatures[os.path.relpath(path, self.output_dir)] = signature
+
+        # Шляхи зберігаються відносно директорії результатів
+        result_path = None
+        if isinstance(result, str) and os.path.isabs(result):
+            result_path, result = os.path.relpath(result, self.output_dir), None
+
+        with self._lock:
+            self._stages[stage] = {
+                "key": key,
+                "result": result,
+                "result_path": result_path,
+                "outputs": signatures,
+                "quality": quality,
+                "completed_at": time.time(),
+            }
+            try:
+                write_json_atomic(self.path, self._stages)
+            except OSError as e:
+                self.logger.warning(f"Не вдалося записати контрольну точку етапу {stage}: {str(e)}")
+        return signatures
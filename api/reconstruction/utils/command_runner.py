@@ -0,0 +1,267 @@
+import os
+import json
+import time
+import signal
+import logging
+import threading
+import subprocess
+from collections import deque
+from .cancellation import JobCancelled, add_cancel_callback, check_cancelled, is_cancelled
+from .metrics import COMMANDS, COMMAND_CPU_SECONDS, format_labels
+from .timeline import record_event
+
+# Журнал ресурсів зовнішніх команд у директорії логів сесії
+COMMANDS_LOG = "commands.jsonl"
+
+# Облік ресурсів команд поточного процесу завдання (див. set_command_metrics)
+_command_metrics = None
+
+# Команди, що виконуються зараз (для завершення їхніх груп процесів при скасуванні)
+_running = set()
+_running_lock = threading.Lock()
+
+
+class CommandTimeout(RuntimeError):
+    """
+    Зовнішня команда перевищила ліміт часу виконання.
+    """
+
+
+class CommandMetrics:
+    """
+    Облік ресурсів зовнішніх команд сесії.
+
+    Кожна команда записується в logs/commands.jsonl (час, процесорний час,
+    пікова пам'ять, блоки введення/виведення), а підсумки - в стан сесії
+    (поле 'command_metrics').
+    """
+
+    def __init__(self, session_dir, progress=None, logger=None, store=None):
+        """
+        Ініціалізація обліку.
+
+        Args:
+            session_dir (str): Директорія результатів сесії
+            progress (ProgressTracker, optional): Трекер, через який оновлюється стан сесії
+            logger (Logger, optional): Логер для запису повідомлень
+            store (MetricsStore, optional): Сховище метрик /metrics
+        """
+        self.path = os.path.join(session_dir, "logs", COMMANDS_LOG)
+        self.progress = progress
+        self.store = store
+        self.logger = logger or logging.getLogger("command_runner")
+        self.totals = {
+            "commands": 0,
+            "wall_seconds": 0.0,
+            "cpu_user_seconds": 0.0,
+            "cpu_system_seconds": 0.0,
+            "peak_rss_mb": 0,
+            "read_blocks": 0,
+            "write_blocks": 0,
+        }
+        self._lock = threading.Lock()
+
+    def record(self, entry):
+        """
+        Записує ресурси виконаної команди.
+
+        Args:
+            entry (dict): Запис команди (див. run_process)
+        """
+        with self._lock:
+            self.totals["commands"] += 1
+            for name in ("wall_seconds", "cpu_user_seconds", "cpu_system_seconds"):
+                self.totals[name] = round(self.totals[name] + entry[name], 3)
+            for name in ("read_blocks", "write_blocks"):
+                self.totals[name] += entry[name]
+            self.totals["peak_rss_mb"] = max(self.totals["peak_rss_mb"], entry["peak_rss_mb"])
+            totals = dict(self.totals)
+
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            except OSError as e:
+                self.logger.warning(f"Не вдалося записати ресурси команди: {str(e)}")
+
+        if self.progress is not None:
+            self.progress.update_metadata({"command_metrics": totals})
+
+        if self.store is not None:
+            self.store.add_safely({
+                (COMMANDS, ""): 1,
+                (COMMAND_CPU_SECONDS, format_labels({"mode": "user"})): entry["cpu_user_seconds"],
+                (COMMAND_CPU_SECONDS, format_labels({"mode": "system"})): entry["cpu_system_seconds"],
+            })
+
+
+def set_command_metrics(metrics):
+    """
+    Встановлює облік ресурсів для всіх команд поточного процесу.
+
+    Args:
+        metrics (CommandMetrics): Облік або None
+
+    Returns:
+        CommandMetrics: Попередній облік
+    """
+    global _command_metrics
+    previous, _command_metrics = _command_metrics, metrics
+    return previous
+
+
+def _usage_entry(usage):
+    return {
+        "cpu_user_seconds": round(usage.ru_utime, 3),
+        "cpu_system_seconds": round(usage.ru_stime, 3),
+        # ru_maxrss у Linux - у кілобайтах
+        "peak_rss_mb": usage.ru_maxrss // 1024,
+        "read_blocks": usage.ru_inblock,
+        "write_blocks": usage.ru_oublock,
+    }
+
+
+def _kill_group(process):
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def kill_running_commands():
+    """
+    Завершує групи процесів усіх команд, що виконуються в поточному процесі
+    (COLMAP, OpenMVS, xvfb-run.sh разом з їхніми нащадками).
+    """
+    with _running_lock:
+        processes = list(_running)
+    for process in processes:
+        _kill_group(process)
+
+
+add_cancel_callback(kill_running_commands)
+
+
+def _wait(process, deadline):
+    """
+    Чекає завершення процесу через wait4, щоб отримати використані ресурси.
+
+    Returns:
+        tuple: (статус завершення, rusage, чи перервано через таймаут)
+    """
+    if deadline is None:
+        _, status, usage = os.wait4(process.pid, 0)
+        return status, usage, False
+
+    while True:
+        pid, status, usage = os.wait4(process.pid, os.WNOHANG)
+        if pid:
+            return status, usage, False
+        if time.time() >= deadline:
+            _kill_group(process)
+            _, status, usage = os.wait4(process.pid, 0)
+            return status, usage, True
+        time.sleep(0.1)
+
+
+def run_process(command, env=None, logger=None, timeout=None, on_stdout=None, label=None):
+    """
+    Запускає команду в окремій групі процесів і читає stdout та stderr
+    одночасно в окремих потоках, тож багатослівна програма не зупиняється
+    на заповненому каналі. Таймаут діє на весь час виконання і завершує
+    всю групу процесів. Використані ресурси записуються в облік команд.
+
+    Args:
+        command (str): Команда (виконується через shell)
+        env (dict, optional): Середовище процесу
+        logger (Logger, optional): Логер для виводу команди
+        timeout (float, optional): Ліміт часу виконання (секунди)
+        on_stdout (callable, optional): Обробник рядків stdout
+        label (str, optional): Мітка команди в обліку ресурсів (етап)
+
+    Returns:
+        dict: {'return_code', 'timed_out', 'stderr_tail', 'wall_seconds', ...ресурси}
+    """
+    if logger is None:
+        logger = logging.getLogger("command_runner")
+
+    check_cancelled()
+
+    started = time.time()
+    process = subprocess.Popen(
+        command,
+        shell=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        bufsize=1,  # Буферизація порядкова
+        env=env,
+        start_new_session=True,
+    )
+    with _running_lock:
+        _running.add(process)
+    # Скасування могло надійти між перевіркою та запуском
+    if is_cancelled():
+        _kill_group(process)
+
+    stderr_tail = deque(maxlen=20)
+
+    def drain(stream, is_stderr):
+        for line in stream:
+            line = line.strip()
+            if not line:
+                continue
+            if is_stderr:
+                logger.warning(f"STDERR: {line}")
+                stderr_tail.append(line)
+            else:
+                logger.info(f"STDOUT: {line}")
+                if on_stdout is not None:
+                    on_stdout(line)
+        stream.close()
+
+    readers = [
+        threading.Thread(target=drain, args=(process.stdout, False), daemon=True),
+        threading.Thread(target=drain, args=(process.stderr, True), daemon=True),
+    ]
+    for reader in readers:
+        reader.start()
+
+    try:
+        status, usage, timed_out = _wait(process, started + timeout if timeout else None)
+    except BaseException:
+        _kill_group(process)
+        raise
+    finally:
+        with _running_lock:
+            _running.discard(process)
+    # os.waitstatus_to_exitcode з'явився лише в Python 3.9
+    process.returncode = -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+
+    # Нащадки, що залишились після завершення команди, тримають канали відкритими
+    for reader in readers:
+        reader.join(timeout=5)
+    if any(reader.is_alive() for reader in readers):
+        _kill_group(process)
+        for reader in readers:
+            reader.join(timeout=5)
+
+    entry = {
+        "label": label,
+        "command": command,
+        "return_code": process.returncode,
+        "timed_out": timed_out,
+        "started_at": started,
+        "wall_seconds": round(time.time() - started, 3),
+    }
+    entry.update(_usage_entry(usage))
+
+    if _command_metrics is not None:
+        _command_metrics.record(entry)
+    record_event("command", **entry)
+
+    if is_cancelled():
+        raise JobCancelled(f"Завдання скасовано під час виконання команди: {command}")
+
+    entry["stderr_tail"] = list(stderr_tail)
+    return entry
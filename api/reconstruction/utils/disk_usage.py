@@ -0,0 +1,237 @@
+import os
+import stat
+import time
+import sqlite3
+import logging
+from contextlib import contextmanager
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS session_usage (
+    session_id TEXT PRIMARY KEY,
+    status TEXT,
+    results_bytes INTEGER NOT NULL DEFAULT 0,
+    uploads_bytes INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_usage_access ON session_usage (status, last_access);
+CREATE TABLE IF NOT EXISTS shared_usage (
+    category TEXT PRIMARY KEY,
+    bytes INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+# Категорія спільного обліку для сховища блобів (вміст, спільний для сесій)
+BLOBS_CATEGORY = "blobs"
+
+# Доступ до сесії фіксується не частіше одного разу за цей інтервал (секунди)
+TOUCH_INTERVAL = 60
+
+
+def owned_size(path):
+    """
+    Повертає розмір файлу, якщо він належить лише цьому шляху. Файли з кількома
+    жорсткими посиланнями (спільні з кешем результатів чи сховищем блобів)
+    та символічні посилання не звільняють місця при видаленні, тому дають 0.
+
+    Args:
+        path (str): Шлях до файлу
+
+    Returns:
+        int: Розмір у байтах
+    """
+    try:
+        st = os.lstat(path)
+    except FileNotFoundError:
+        return 0
+    if not stat.S_ISREG(st.st_mode) or st.st_nlink > 1:
+        return 0
+    return st.st_size
+
+
+def directory_size(path, owned_only=False):
+    """
+    Рахує розмір директорії. Кожен файл (inode) враховується один раз,
+    символічні посилання не враховуються.
+
+    Args:
+        path (str): Шлях до директорії
+        owned_only (bool): Не враховувати файли з кількома жорсткими посиланнями
+
+    Returns:
+        int: Розмір у байтах
+    """
+    total = 0
+    seen = set()
+    for root, dirs, files in os.walk(path):
+        for filename in files:
+            try:
+                st = os.lstat(os.path.join(root, filename))
+            except FileNotFoundError:
+                continue
+            if not stat.S_ISREG(st.st_mode) or (st.st_dev, st.st_ino) in seen:
+                continue
+            if owned_only and st.st_nlink > 1:
+                continue
+            seen.add((st.st_dev, st.st_ino))
+            total += st.st_size
+    return total
+
+
+class DiskUsageLedger:
+    """
+    Облік дискового простору сесій у базі даних черги.
+
+    Розмір сесії оновлюють ті, хто змінює її файли (завантаження,
+    етапи реконструкції, кеш результатів, прибирання), тому прибиральнику
+    не потрібно повторно обходити дерева директорій, щоб знати загальне
+    використання. Сесії враховуються лише файли, які звільняться з її
+    видаленням; вміст, спільний для кількох сесій (блоби), враховується
+    один раз в окремій категорії.
+    """
+
+    def __init__(self, db_path, logger=None):
+        """
+        Ініціалізація обліку.
+
+        Args:
+            db_path (str): Шлях до файлу бази даних SQLite
+            logger (Logger, optional): Логер для запису повідомлень
+        """
+        self.db_path = db_path
+        self.logger = logger or logging.getLogger("disk_usage")
+
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def record(self, session_id, status=None, results_bytes=None, uploads_bytes=None,
+               last_access=None):
+        """
+        Створює або оновлює запис сесії. Поля зі значенням None не змінюються.
+
+        Args:
+            session_id (str): Ідентифікатор сесії
+            status (str, optional): Статус сесії
+            results_bytes (int, optional): Розмір директорії результатів
+            uploads_bytes (int, optional): Розмір завантажених зображень
+            last_access (float, optional): Час останнього доступу
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO session_usage (session_id, updated_at, last_access) "
+                "VALUES (?, ?, ?)",
+                (session_id, now, last_access or now),
+            )
+            conn.execute(
+                "UPDATE session_usage SET "
+                "status = COALESCE(?, status), "
+                "results_bytes = COALESCE(?, results_bytes), "
+                "uploads_bytes = COALESCE(?, uploads_bytes), "
+                "updated_at = ?, "
+                "last_access = MAX(last_access, COALESCE(?, last_access)) "
+                "WHERE session_id = ?",
+                (status, results_bytes, uploads_bytes, now, last_access, session_id),
+            )
+
+    def adjust(self, session_id, results_delta=0, uploads_delta=0):
+        """
+        Змінює облікований розмір сесії на задану величину.
+        Запис сесії створюється, якщо його ще немає.
+
+        Args:
+            session_id (str): Ідентифікатор сесії
+            results_delta (int): Зміна розміру результатів
+            uploads_delta (int): Зміна розміру завантажень
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO session_usage (session_id, updated_at, last_access) "
+                "VALUES (?, ?, ?)",
+                (session_id, now, now),
+            )
+            conn.execute(
+                "UPDATE session_usage SET "
+                "results_bytes = MAX(0, results_bytes + ?), "
+                "uploads_bytes = MAX(0, uploads_bytes + ?) "
+                "WHERE session_id = ?",
+                (results_delta, uploads_delta, session_id),
+            )
+
+    def touch(self, session_id):
+        """
+        Фіксує доступ до сесії (для LRU-витіснення).
+
+        Args:
+            session_id (str): Ідентифікатор сесії
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE session_usage SET last_access = ? WHERE session_id = ? AND last_access < ?",
+                (now, session_id, now - TOUCH_INTERVAL),
+            )
+
+    def remove(self, session_id):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM session_usage WHERE session_id = ?", (session_id,))
+
+    def get(self, session_id):
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT * FROM session_usage WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def sessions(self):
+        """
+        Повертає всі облікові записи, від найдавніше використаних.
+
+        Returns:
+            list: Записи сесій
+        """
+        with self._connect() as conn:
+            rows = conn.execute("SELECT * FROM session_usage ORDER BY last_access").fetchall()
+        return [dict(row) for row in rows]
+
+    def adjust_shared(self, category, delta):
+        """
+        Змінює облікований розмір спільної категорії на задану величину.
+
+        Args:
+            category (str): Категорія (наприклад, BLOBS_CATEGORY)
+            delta (int): Зміна розміру
+        """
+        with self._connect() as conn:
+            conn.execute("INSERT OR IGNORE INTO shared_usage (category) VALUES (?)", (category,))
+            conn.execute(
+                "UPDATE shared_usage SET bytes = MAX(0, bytes + ?) WHERE category = ?",
+                (delta, category),
+            )
+
+    def total_bytes(self):
+        """
+        Повертає загальний облікований розмір усіх сесій та спільних категорій.
+
+        Returns:
+            int: Розмір у байтах
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT "
+                "(SELECT COALESCE(SUM(results_bytes + uploads_bytes), 0) FROM session_usage) + "
+                "(SELECT COALESCE(SUM(bytes), 0) FROM shared_usage)"
+            ).fetchone()
+        return row[0]
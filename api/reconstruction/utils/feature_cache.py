@@ -0,0 +1,173 @@
+import os
+import json
+import hashlib
+import logging
+import zipfile
+import numpy as np
+
+# Розширення файлів записів кешу
+ENTRY_SUFFIX = ".npz"
+
+
+class FeatureCache:
+    """
+    Кеш ключових точок окремих зображень за хешем вмісту та параметрами детектора.
+
+    Кожен запис - стиснений архів numpy (координати, масштаб, кут, відгук,
+    октава ключових точок і дескриптори), тому ті самі зображення в інших
+    сесіях чи з іншою якістю не обробляються повторно. Розмір кешу обмежено,
+    найдавніше використані записи витісняються (LRU за часом модифікації).
+    """
+
+    # Назва кешу в повідомленнях логу
+    LABEL = "ознак"
+
+    def __init__(self, cache_dir, max_bytes, logger=None):
+        """
+        Ініціалізація кешу ознак.
+
+        Args:
+            cache_dir (str): Директорія кешу
+            max_bytes (int): Максимальний розмір кешу в байтах (0 - кеш вимкнено)
+            logger (Logger, optional): Логер для запису повідомлень
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.logger = logger or logging.getLogger(type(self).__name__)
+        if self.enabled:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    @staticmethod
+    def key(image_hash, params):
+        """
+        Обчислює ключ запису.
+
+        Args:
+            image_hash (str): SHA-256 зображення
+            params (dict): Параметри детектора (разом з версією OpenCV)
+
+        Returns:
+            str: Ключ (hex SHA-256)
+        """
+        payload = json.dumps({"image": image_hash, "params": params}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _entry_path(self, key):
+        # Записи розкладено по піддиректоріях, щоб не тримати всі в одній
+        return os.path.join(self.cache_dir, key[:2], key + ENTRY_SUFFIX)
+
+    def get(self, key):
+        """
+        Шукає запис у кеші та позначає його як щойно використаний.
+
+        Args:
+            key (str): Ключ запису
+
+        Returns:
+            tuple: (ключові точки, дескриптори) або None
+        """
+        return self._load(key, ("keypoints", "descriptors"))
+
+    def put(self, key, keypoints, descriptors):
+        """
+        Зберігає ознаки зображення в кеш.
+
+        Args:
+            key (str): Ключ запису
+            keypoints (np.ndarray): Ключові точки (N, 7)
+            descriptors (np.ndarray): Дескриптори (N, 128)
+        """
+        self._store(key, keypoints=keypoints, descriptors=descriptors)
+
+    def _load(self, key, names):
+        """
+        Читає масиви запису та позначає його як щойно використаний.
+
+        Args:
+            key (str): Ключ запису
+            names (tuple): Назви масивів
+
+        Returns:
+            tuple: Масиви в порядку names або None
+        """
+        if not self.enabled:
+            return None
+
+        path = self._entry_path(key)
+        try:
+            with np.load(path) as data:
+                entry = tuple(data[name] for name in names)
+            os.utime(path)
+        except (OSError, KeyError, ValueError, EOFError, zipfile.BadZipFile) as e:
+            if os.path.exists(path):
+                self.logger.warning(f"Пошкоджений запис кешу {self.LABEL} {key[:12]}: {str(e)}")
+            return None
+        return entry
+
+    def _store(self, key, **arrays):
+        """
+        Атомарно записує масиви запису (через тимчасовий файл).
+
+        Args:
+            key (str): Ключ запису
+            **arrays: Масиви numpy за назвами
+        """
+        if not self.enabled:
+            return
+
+        path = self._entry_path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                np.savez_compressed(f, **arrays)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            self.logger.warning(f"Не вдалося зберегти запис кешу {self.LABEL}: {str(e)}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def evict(self):
+        """
+        Витісняє найдавніше використані записи, поки розмір кешу перевищує ліміт.
+
+        Returns:
+            int: Кількість витіснених записів
+        """
+        if not self.enabled:
+            return 0
+
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(ENTRY_SUFFIX):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, path, stat.st_size))
+                total += stat.st_size
+
+        evicted = 0
+        for _, path, size in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            evicted += 1
+
+        if evicted:
+            self.logger.info(f"Витіснено {evicted} записів кешу {self.LABEL}")
+        return evicted
@@ -1,12 +1,16 @@
 import os
-import subprocess
 import shutil
 import logging
+from .command_runner import CommandTimeout, run_process
+from .resource_limits import ResourceLimitExceeded, is_oom_failure
+from .progress_events import EVENTS_FILE
+from .profiler import PROFILES_DIR
 
 
-def run_command(command, env=None, logger=None):
+def run_command(command, env=None, logger=None, timeout=None):
     """
     Запускає команду в підпроцесі та логує результат в режимі реального часу.
+    stdout та stderr читаються одночасно, таймаут завершує всю групу процесів.
     """
     if logger is None:
         logger = logging.getLogger("command_runner")
@@ -14,33 +18,17 @@ def run_command(command, env=None, logger=None):
     logger.info(f"Виконання команди: {command}")
 
     try:
-        process = subprocess.Popen(
-            command,
-            shell=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            universal_newlines=True,
-            bufsize=1,  # Буферизація порядкова
-            env=env,
-        )
-
-        # Читаємо вивід у режимі реального часу
-        for line in process.stdout:
-            line = line.strip()
-            if line:
-                logger.info(f"STDOUT: {line}")
-
-        # Читаємо помилки у режимі реального часу
-        for line in process.stderr:
-            line = line.strip()
-            if line:
-                logger.warning(f"STDERR: {line}")
-
-        # Чекаємо завершення процесу
-        return_code = process.wait()
+        result = run_process(command, env=env, logger=logger, timeout=timeout)
 
+        if result["timed_out"]:
+            logger.error(f"Команда перервана через перевищення таймауту ({timeout}с): {command}")
+            raise CommandTimeout(f"Команда перервана через таймаут: {command}")
+
+        return_code = result["return_code"]
         if return_code != 0:
             logger.error(f"Команда завершилася з кодом {return_code}")
+            if is_oom_failure(return_code, result["stderr_tail"]):
+                raise ResourceLimitExceeded(f"Нестача пам'яті під час виконання команди: {command}")
             raise RuntimeError(f"Помилка виконання команди: {command}")
 
         logger.info(f"Команда виконана успішно")
@@ -51,6 +39,37 @@ def run_command(command, env=None, logger=None):
         raise
 
 
+# Службові файли та директорії сесії, які не є результатами реконструкції
+RESULT_EXCLUDED_NAMES = {"logs", "temp", ".zipcache", "checkpoints.json", EVENTS_FILE, PROFILES_DIR}
+RESULT_EXCLUDED_EXTENSIONS = (".zip", ".tmp")
+
+
+def iter_result_files(output_dir, include_metadata=False):
+    """
+    Перелічує файли результатів сесії без службових директорій та архівів.
+
+    Args:
+        output_dir (str): Директорія результатів
+        include_metadata (bool): Чи включати metadata.json
+
+    Yields:
+        str: Відносний шлях до файлу
+    """
+    for root, dirs, files in os.walk(output_dir):
+        if root == output_dir:
+            dirs[:] = sorted(d for d in dirs if d not in RESULT_EXCLUDED_NAMES)
+        else:
+            dirs.sort()
+        for filename in sorted(files):
+            if root == output_dir and filename == "metadata.json" and not include_metadata:
+                continue
+            if root == output_dir and filename in RESULT_EXCLUDED_NAMES:
+                continue
+            if filename.endswith(RESULT_EXCLUDED_EXTENSIONS):
+                continue
+            yield os.path.relpath(os.path.join(root, filename), output_dir)
+
+
 def create_directory(path, logger=None):
     """
     Створює директорію, якщо вона не існує.
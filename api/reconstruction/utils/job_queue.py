@@ -0,0 +1,363 @@
+import os
+import json
+import time
+import socket
+import sqlite3
+import logging
+from contextlib import contextmanager
+
+# Стани завдання в черзі
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_FINISHED = "finished"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    kind TEXT NOT NULL DEFAULT 'reconstruct',
+    params TEXT NOT NULL DEFAULT '{}',
+    state TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    worker_id TEXT,
+    worker_pid INTEGER,
+    worker_host TEXT,
+    job_pid INTEGER,
+    heartbeat_at REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    cores INTEGER NOT NULL DEFAULT 1,
+    memory_mb INTEGER NOT NULL DEFAULT 0,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs (state, id);
+CREATE INDEX IF NOT EXISTS idx_jobs_session ON jobs (session_id, id);
+"""
+
+
+class JobQueue:
+    """
+    Персистентна черга завдань реконструкції на базі SQLite.
+    Спільна для всіх процесів API та воркерів, переживає їх перезапуск.
+    """
+
+    def __init__(self, db_path, logger=None):
+        """
+        Ініціалізація черги завдань.
+
+        Args:
+            db_path (str): Шлях до файлу бази даних SQLite
+            logger (Logger, optional): Логер для запису повідомлень
+        """
+        self.db_path = db_path
+        self.logger = logger or logging.getLogger("job_queue")
+
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        """
+        Відкриває з'єднання з базою даних. З'єднання не використовуються повторно,
+        щоб черга коректно працювала після fork процесу.
+        """
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _row_to_job(row):
+        if row is None:
+            return None
+        job = dict(row)
+        job["params"] = json.loads(job["params"] or "{}")
+        return job
+
+    def enqueue(self, session_id, params, kind="reconstruct", cores=1, memory_mb=0):
+        """
+        Додає нове завдання в чергу.
+
+        Args:
+            session_id (str): Ідентифікатор сесії
+            params (dict): Параметри завдання (метод, якість тощо)
+            kind (str): Тип завдання
+            cores (int): Кількість ядер, які резервуються під завдання
+            memory_mb (int): Обсяг пам'яті (МБ), який резервується під завдання
+
+        Returns:
+            dict: Створене завдання
+        """
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "INSERT INTO jobs (session_id, kind, params, state, created_at, cores, memory_mb) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (session_id, kind, json.dumps(params), JOB_QUEUED, time.time(), cores, memory_mb),
+            )
+            job_id = cursor.lastrowid
+
+        self.logger.info(f"Завдання {job_id} для сесії {session_id} додано в чергу")
+        return self.get_job(job_id)
+
+    def claim(self, worker_id, admit=None):
+        """
+        Атомарно забирає найстаріше завдання з черги.
+
+        Args:
+            worker_id (str): Ідентифікатор воркера
+            admit (callable, optional): Функція admit(job, reserved_cores, reserved_memory_mb),
+                яка вирішує, чи достатньо ресурсів для запуску завдання
+
+        Returns:
+            dict: Завдання або None, якщо черга порожня чи ресурсів недостатньо
+        """
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT * FROM jobs WHERE state = ? ORDER BY id LIMIT 1", (JOB_QUEUED,)
+                ).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+
+                job = self._row_to_job(row)
+
+                if admit is not None:
+                    reserved = conn.execute(
+                        "SELECT COUNT(*), COALESCE(SUM(cores), 0), COALESCE(SUM(memory_mb), 0) "
+                        "FROM jobs WHERE state = ?",
+                        (JOB_RUNNING,),
+                    ).fetchone()
+                    # Якщо нічого не виконується, завдання запускається завжди,
+                    # інакше велике завдання могло б чекати вічно
+                    if reserved[0] > 0 and not admit(job, reserved[1], reserved[2]):
+                        conn.execute("COMMIT")
+                        return None
+
+                now = time.time()
+                conn.execute(
+                    "UPDATE jobs SET state = ?, started_at = ?, heartbeat_at = ?, worker_id = ?, "
+                    "worker_pid = ?, worker_host = ?, job_pid = NULL, attempts = attempts + 1 "
+                    "WHERE id = ?",
+                    (JOB_RUNNING, now, now, worker_id, os.getpid(), socket.gethostname(), job["id"]),
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+        return self.get_job(job["id"])
+
+    def set_job_pid(self, job_id, pid):
+        """
+        Записує PID процесу, в якому виконується завдання.
+
+        Args:
+            job_id (int): Ідентифікатор завдання
+            pid (int): PID процесу завдання
+        """
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET job_pid = ? WHERE id = ?", (pid, job_id))
+
+    def heartbeat(self, job_id):
+        """
+        Оновлює час останнього сигналу воркера, що виконує завдання.
+        За ним визначається, чи живий воркер на іншому хості.
+
+        Args:
+            job_id (int): Ідентифікатор завдання
+        """
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND state = ?",
+                (time.time(), job_id, JOB_RUNNING),
+            )
+
+    def finish(self, job_id):
+        """
+        Позначає завдання як успішно завершене.
+
+        Args:
+            job_id (int): Ідентифікатор завдання
+        """
+        self._set_final_state(job_id, JOB_FINISHED)
+
+    def fail(self, job_id, error):
+        """
+        Позначає завдання як завершене з помилкою.
+
+        Args:
+            job_id (int): Ідентифікатор завдання
+            error (str): Опис помилки
+        """
+        self._set_final_state(job_id, JOB_FAILED, error)
+
+    def cancel(self, job_id):
+        """
+        Скасовує завдання, що очікує в черзі або виконується.
+        Завдання, що виконується, зупиняє його воркер.
+
+        Args:
+            job_id (int): Ідентифікатор завдання
+
+        Returns:
+            str: Стан завдання до скасування або None, якщо воно вже завершене
+        """
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT state FROM jobs WHERE id = ?", (job_id,)).fetchone()
+                if row is None or row[0] not in (JOB_QUEUED, JOB_RUNNING):
+                    conn.execute("COMMIT")
+                    return None
+
+                conn.execute(
+                    "UPDATE jobs SET state = ?, finished_at = ?, error = ? WHERE id = ?",
+                    (JOB_CANCELLED, time.time(), "Скасовано користувачем", job_id),
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+        self.logger.info(f"Завдання {job_id} скасовано (стан до скасування: {row[0]})")
+        return row[0]
+
+    def is_cancelled(self, job_id):
+        """
+        Перевіряє, чи скасовано завдання.
+
+        Args:
+            job_id (int): Ідентифікатор завдання
+
+        Returns:
+            bool: True, якщо завдання скасовано
+        """
+        with self._connect() as conn:
+            row = conn.execute("SELECT state FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row is not None and row[0] == JOB_CANCELLED
+
+    def _set_final_state(self, job_id, state, error=None):
+        # Скасоване завдання зберігає свій стан, навіть якщо воркер встиг завершити його
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET state = ?, finished_at = ?, error = ? WHERE id = ? AND state = ?",
+                (state, time.time(), error, job_id, JOB_RUNNING),
+            )
+
+    def requeue_orphaned(self, alive_worker_ids, max_attempts=3, owner_alive=None):
+        """
+        Повертає в чергу завдання, воркери яких більше не існують
+        (наприклад, після перезапуску сервісу). Завдання, які вже
+        вичерпали кількість спроб, позначаються як невдалі.
+
+        Args:
+            alive_worker_ids (list): Ідентифікатори живих воркерів
+            max_attempts (int): Максимальна кількість спроб виконання
+            owner_alive (callable, optional): owner_alive(job) - чи ще працює процес
+                воркера або завдання; такі завдання не повертаються, щоб не виконати
+                їх двічі в ту саму директорію результатів
+
+        Returns:
+            int: Кількість повернутих завдань
+        """
+        alive = set(alive_worker_ids)
+
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = conn.execute("SELECT * FROM jobs WHERE state = ?", (JOB_RUNNING,)).fetchall()
+                orphaned = [
+                    row for row in rows
+                    if row["worker_id"] not in alive
+                    and (owner_alive is None or not owner_alive(dict(row)))
+                ]
+
+                count = 0
+                for row in orphaned:
+                    if row["attempts"] >= max_attempts:
+                        conn.execute(
+                            "UPDATE jobs SET state = ?, finished_at = ?, error = ? WHERE id = ?",
+                            (JOB_FAILED, time.time(), "Воркер завершився аварійно", row["id"]),
+                        )
+                    else:
+                        conn.execute(
+                            "UPDATE jobs SET state = ?, worker_id = NULL, worker_pid = NULL, "
+                            "worker_host = NULL, job_pid = NULL, heartbeat_at = NULL WHERE id = ?",
+                            (JOB_QUEUED, row["id"]),
+                        )
+                        count += 1
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+        if count:
+            self.logger.warning(f"Повернуто в чергу {count} завдань без живого воркера")
+        return count
+
+    def get_job(self, job_id):
+        """
+        Повертає завдання за ідентифікатором.
+
+        Args:
+            job_id (int): Ідентифікатор завдання
+
+        Returns:
+            dict: Завдання або None
+        """
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row)
+
+    def get_latest_for_session(self, session_id):
+        """
+        Повертає останнє завдання сесії.
+
+        Args:
+            session_id (str): Ідентифікатор сесії
+
+        Returns:
+            dict: Завдання або None
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE session_id = ? ORDER BY id DESC LIMIT 1",
+                (session_id,),
+            ).fetchone()
+        return self._row_to_job(row)
+
+    def queue_position(self, job_id):
+        """
+        Повертає позицію завдання в черзі (0 - наступне на виконання).
+
+        Args:
+            job_id (int): Ідентифікатор завдання
+
+        Returns:
+            int: Позиція в черзі
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE state = ? AND id < ?", (JOB_QUEUED, job_id)
+            ).fetchone()
+        return row[0]
+
+    def counts(self):
+        """
+        Повертає кількість завдань у кожному стані.
+
+        Returns:
+            dict: Стан -> кількість завдань
+        """
+        with self._connect() as conn:
+            rows = conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall()
+        return {row[0]: row[1] for row in rows}
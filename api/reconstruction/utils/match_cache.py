@@ -0,0 +1,58 @@
+import json
+import hashlib
+from .feature_cache import FeatureCache
+
+
+class MatchCache(FeatureCache):
+    """
+    Кеш перевірених зіставлень пар зображень за хешами обох зображень
+    та параметрами детектора і зіставлення.
+
+    Запис пари зберігається в канонічному порядку (менший хеш - перше
+    зображення), тому пара знаходиться незалежно від порядку зображень
+    у сесії. Після додавання зображень до сесії обчислюються лише нові пари.
+    """
+
+    LABEL = "зіставлень"
+
+    @staticmethod
+    def key(hash_a, hash_b, params):
+        """
+        Обчислює ключ запису пари в канонічному порядку хешів.
+
+        Args:
+            hash_a (str): SHA-256 першого зображення (менший з двох)
+            hash_b (str): SHA-256 другого зображення
+            params (dict): Параметри детектора та зіставлення
+
+        Returns:
+            str: Ключ (hex SHA-256)
+        """
+        payload = json.dumps({"pair": [hash_a, hash_b], "params": params}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """
+        Шукає зіставлення пари в кеші.
+
+        Args:
+            key (str): Ключ запису
+
+        Returns:
+            tuple: (індекси (M, 2), відстані (M,), фундаментальна матриця,
+                маска інлаєрів) або None
+        """
+        return self._load(key, ("indices", "distances", "fundamental", "inliers"))
+
+    def put(self, key, indices, distances, fundamental, inliers):
+        """
+        Зберігає зіставлення пари в кеш.
+
+        Args:
+            key (str): Ключ запису
+            indices (np.ndarray): Індекси ключових точок (queryIdx, trainIdx) (M, 2)
+            distances (np.ndarray): Відстані дескрипторів (M,)
+            fundamental (np.ndarray): Фундаментальна матриця 3x3 (порожня, якщо пару не перевірено)
+            inliers (np.ndarray): Маска інлаєрів RANSAC (M,) (порожня, якщо пару не перевірено)
+        """
+        self._store(key, indices=indices, distances=distances, fundamental=fundamental, inliers=inliers)
@@ -0,0 +1,325 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+
+# Тривалість етапів пайплайну (етап виконується в процесі завдання)
+STAGE_DURATION = "reconstruction_stage_duration_seconds"
+
+# Межі гістограми тривалості етапів (секунди)
+STAGE_DURATION_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1200, 1800, 3600, 7200)
+
+UPLOADED_BYTES = "reconstruction_uploaded_bytes_total"
+SERVED_BYTES = "reconstruction_served_bytes_total"
+CACHE_LOOKUPS = "reconstruction_cache_lookups_total"
+COMMANDS = "reconstruction_commands_total"
+COMMAND_CPU_SECONDS = "reconstruction_command_cpu_seconds_total"
+JOBS = "reconstruction_jobs"
+
+# Тип та опис кожної метрики для формату Prometheus
+METRICS = {
+    JOBS: ("gauge", "Кількість завдань у черзі за станом"),
+    STAGE_DURATION: ("histogram", "Тривалість виконання етапів пайплайну"),
+    UPLOADED_BYTES: ("counter", "Обсяг завантажених зображень (байти)"),
+    SERVED_BYTES: ("counter", "Обсяг відданих файлів результатів (байти)"),
+    CACHE_LOOKUPS: ("counter", "Звернення до кешів результатів і ознак (hit/miss)"),
+    COMMANDS: ("counter", "Кількість виконаних зовнішніх команд"),
+    COMMAND_CPU_SECONDS: ("counter", "Процесорний час зовнішніх команд (секунди)"),
+}
+
+# Стани завдань, які показуються завжди, навіть без жодного завдання
+_JOB_STATES = ("queued", "running")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS metrics (
+    name TEXT NOT NULL,
+    labels TEXT NOT NULL DEFAULT '',
+    value REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (name, labels)
+);
+"""
+
+
+def format_labels(labels):
+    """
+    Форматує мітки метрики у вигляді Prometheus: key="value",...
+
+    Args:
+        labels (dict): Мітки
+
+    Returns:
+        str: Мітки без фігурних дужок
+    """
+    if not labels:
+        return ""
+    return ",".join(f'{key}="{_escape(value)}"' for key, value in sorted(labels.items()))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def histogram_increments(name, value, buckets, labels=None):
+    """
+    Повертає приріст рядків гістограми (_bucket, _sum, _count) для одного спостереження.
+
+    Args:
+        name (str): Назва гістограми
+        value (float): Спостереження
+        buckets (tuple): Верхні межі кошиків
+        labels (dict, optional): Мітки
+
+    Returns:
+        dict: (назва, мітки) -> приріст
+    """
+    labels = dict(labels or {})
+    increments = {}
+    # Рядки всіх кошиків створюються з першим спостереженням (з нульовим приростом)
+    for bound in tuple(buckets) + ("+Inf",):
+        key = (f"{name}_bucket", format_labels(dict(labels, le=bound)))
+        increments[key] = 1 if bound == "+Inf" or value <= bound else 0
+    increments[(f"{name}_sum", format_labels(labels))] = value
+    increments[(f"{name}_count", format_labels(labels))] = 1
+    return increments
+
+
+class MetricsStore:
+    """
+    Лічильники та гістограми, спільні для процесів API та воркерів.
+
+    Значення зберігаються в базі черги завдань (SQLite) і лише збільшуються,
+    тому процеси не координуються між собою: кожен додає свій приріст
+    однією транзакцією.
+    """
+
+    def __init__(self, db_path, logger=None):
+        """
+        Ініціалізація сховища метрик.
+
+        Args:
+            db_path (str): Шлях до файлу бази даних SQLite
+            logger (Logger, optional): Логер для запису повідомлень
+        """
+        self.db_path = db_path
+        self.logger = logger or logging.getLogger("metrics")
+
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def add(self, increments):
+        """
+        Додає приріст до метрик однією транзакцією.
+
+        Args:
+            increments (dict): (назва, мітки) -> приріст
+        """
+        if not increments:
+            return
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(
+                    "INSERT INTO metrics (name, labels, value) VALUES (?, ?, ?) "
+                    "ON CONFLICT (name, labels) DO UPDATE SET value = value + excluded.value",
+                    [(name, labels, value) for (name, labels), value in increments.items()],
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def increment(self, name, value=1, labels=None):
+        """
+        Збільшує лічильник. Помилка запису не перериває роботу, лише записується в лог.
+
+        Args:
+            name (str): Назва лічильника
+            value (float): Приріст
+            labels (dict, optional): Мітки
+        """
+        self.add_safely({(name, format_labels(labels)): value})
+
+    def observe(self, name, value, buckets, labels=None):
+        """
+        Додає спостереження до гістограми. Помилка запису не перериває роботу.
+
+        Args:
+            name (str): Назва гістограми
+            value (float): Спостереження
+            buckets (tuple): Верхні межі кошиків
+            labels (dict, optional): Мітки
+        """
+        self.add_safely(histogram_increments(name, value, buckets, labels))
+
+    def add_safely(self, increments):
+        """
+        Додає приріст до метрик; помилка запису лише записується в лог.
+
+        Args:
+            increments (dict): (назва, мітки) -> приріст
+        """
+        try:
+            self.add(increments)
+        except sqlite3.Error as e:
+            self.logger.warning(f"Не вдалося записати метрики: {str(e)}")
+
+    def samples(self):
+        """
+        Повертає поточні значення всіх метрик.
+
+        Returns:
+            list: [(назва, мітки, значення)]
+        """
+        with self._connect() as conn:
+            return conn.execute("SELECT name, labels, value FROM metrics").fetchall()
+
+
+class MetricsRegistry:
+    """
+    Метрики у форматі Prometheus для ендпоінта /metrics процесу API.
+
+    Фоновий потік періодично дописує в спільне сховище лічильники,
+    накопичені процесом у пам'яті, читає звідти всі метрики та стан черги
+    і формує текст відповіді. Запит /metrics лише повертає готовий текст,
+    тому не звертається ні до диска, ні до бази.
+    """
+
+    def __init__(self, store, job_queue, refresh_interval=15, logger=None):
+        """
+        Ініціалізація реєстру.
+
+        Args:
+            store (MetricsStore): Спільне сховище метрик
+            job_queue (JobQueue): Черга завдань (кількість завдань за станом)
+            refresh_interval (float): Інтервал оновлення у секундах
+            logger (Logger, optional): Логер для запису повідомлень
+        """
+        self.store = store
+        self.job_queue = job_queue
+        self.refresh_interval = refresh_interval
+        self.logger = logger or logging.getLogger("metrics")
+
+        self._pending = {}
+        self._text = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._thread = None
+
+    def increment(self, name, value=1, labels=None):
+        """
+        Збільшує лічильник у пам'яті; у сховище він потрапить під час оновлення.
+
+        Args:
+            name (str): Назва лічильника
+            value (float): Приріст
+            labels (dict, optional): Мітки
+        """
+        key = (name, format_labels(labels))
+        with self._lock:
+            self._pending[key] = self._pending.get(key, 0) + value
+        # Кожен процес API записує свої лічильники сам, навіть якщо /metrics
+        # запитують в іншого процесу
+        self._ensure_thread()
+
+    def render(self):
+        """
+        Повертає метрики в текстовому форматі Prometheus.
+
+        Returns:
+            str: Текст відповіді
+        """
+        self._ensure_thread()
+        if self._text is None:
+            self.refresh()
+        return self._text
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="metrics", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.refresh_interval)
+            try:
+                self.refresh()
+            except Exception as e:
+                self.logger.error(f"Помилка оновлення метрик: {str(e)}")
+
+    def refresh(self):
+        """
+        Записує накопичені лічильники в сховище та оновлює текст метрик.
+        """
+        with self._refresh_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            try:
+                self.store.add(pending)
+            except Exception:
+                # Приріст не губиться: його буде записано під час наступного оновлення
+                with self._lock:
+                    for key, value in pending.items():
+                        self._pending[key] = self._pending.get(key, 0) + value
+                raise
+
+            samples = list(self.store.samples())
+            counts = self.job_queue.counts()
+            for state in set(_JOB_STATES) | set(counts):
+                samples.append((JOBS, format_labels({"state": state}), counts.get(state, 0)))
+
+            self._text = self._format(samples)
+
+    @staticmethod
+    def _format(samples):
+        families = {}
+        for name, labels, value in samples:
+            family = name
+            for suffix in ("_bucket", "_sum", "_count"):
+                base = name[: -len(suffix)]
+                if name.endswith(suffix) and METRICS.get(base, ("",))[0] == "histogram":
+                    family = base
+                    break
+            families.setdefault(family, []).append((name, labels, value))
+
+        lines = []
+        for family in sorted(families):
+            metric_type, description = METRICS.get(family, ("untyped", ""))
+            lines.append(f"# HELP {family} {description}")
+            lines.append(f"# TYPE {family} {metric_type}")
+            for name, labels, value in sorted(families[family], key=_sample_order):
+                series = f"{name}{{{labels}}}" if labels else name
+                lines.append(f"{series} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_value(value):
+    # Цілі значення (байти, кількість) - без експоненційного запису
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _sample_order(sample):
+    # Кошики гістограми - за зростанням межі, +Inf останнім
+    name, labels, _ = sample
+    other, bound = [], 0.0
+    for label in labels.split(","):
+        if label.startswith('le="'):
+            value = label[4:-1]
+            bound = float("inf") if value == "+Inf" else float(value)
+        else:
+            other.append(label)
+    return (name, ",".join(other), bound)
@@ -0,0 +1,106 @@
+import os
+import cProfile
+import logging
+import tracemalloc
+from contextlib import contextmanager
+
+# Профілі етапів у директорії результатів сесії
+PROFILES_DIR = "profiles"
+
+# Кількість рядків коду з найбільшим виділенням пам'яті у звіті етапу
+MEMORY_TOP_LINES = 30
+
+
+class StageProfiler:
+    """
+    Профілювання етапів на Python (вмикається параметром profile запиту
+    реконструкції): cProfile для часу виконання функцій і tracemalloc
+    для пікової пам'яті та рядків коду, що її виділяють.
+
+    Для кожного етапу в profiles/ зберігаються <етап>.prof (відкривається
+    pstats, snakeviz) та <етап>.memory.txt.
+    """
+
+    def __init__(self, session_dir, logger=None, frames=10):
+        """
+        Ініціалізація профілювальника.
+
+        Args:
+            session_dir (str): Директорія результатів сесії
+            logger (Logger, optional): Логер для запису повідомлень
+            frames (int): Глибина стеку, яку зберігає tracemalloc
+        """
+        self.profiles_dir = os.path.join(session_dir, PROFILES_DIR)
+        self.logger = logger or logging.getLogger("profiler")
+        self.frames = frames
+
+    def start(self):
+        """
+        Вмикає відстеження виділень пам'яті на час виконання пайплайну.
+        """
+        os.makedirs(self.profiles_dir, exist_ok=True)
+        tracemalloc.start(self.frames)
+
+    def stop(self):
+        """
+        Вимикає відстеження виділень пам'яті.
+        """
+        tracemalloc.stop()
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Профілює етап, що виконується в поточному потоці.
+
+        Етапи профілюються по одному (пайплайн у цьому режимі виконує їх
+        послідовно), тому відстеження перезапускається на початку етапу
+        (tracemalloc.reset_peak з'явився лише в Python 3.9), і пік та
+        неповернута пам'ять належать саме цьому етапу.
+
+        Args:
+            name (str): Назва етапу
+
+        Yields:
+            dict: Підсумок профілю (заповнюється після виконання етапу):
+                {'profile', 'memory_report', 'peak_memory_mb'}
+        """
+        summary = {}
+        tracemalloc.stop()
+        tracemalloc.start(self.frames)
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield summary
+        finally:
+            profiler.disable()
+            try:
+                summary.update(self._save(name, profiler))
+            except Exception as e:
+                self.logger.warning(f"Не вдалося зберегти профіль етапу {name}: {str(e)}")
+
+    def _save(self, name, profiler):
+        profile_path = os.path.join(self.profiles_dir, f"{name}.prof")
+        profiler.dump_stats(profile_path)
+
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, cProfile.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+
+        memory_path = os.path.join(self.profiles_dir, f"{name}.memory.txt")
+        with open(memory_path, "w", encoding="utf-8") as f:
+            f.write(f"Етап: {name}\n")
+            f.write(f"Пікова пам'ять (tracemalloc): {peak / (1024 * 1024):.1f} МБ\n")
+            f.write(f"Пам'ять після етапу: {current / (1024 * 1024):.1f} МБ\n\n")
+            f.write("Рядки коду з найбільшим обсягом неповернутої пам'яті:\n")
+            for stat in snapshot.statistics("lineno")[:MEMORY_TOP_LINES]:
+                f.write(f"{stat}\n")
+
+        self.logger.info(f"Профіль етапу {name} збережено: {profile_path}")
+        return {
+            "profile": os.path.relpath(profile_path, os.path.dirname(self.profiles_dir)),
+            "memory_report": os.path.relpath(memory_path, os.path.dirname(self.profiles_dir)),
+            "peak_memory_mb": round(peak / (1024 * 1024), 1),
+        }
@@ -0,0 +1,201 @@
+import os
+import json
+import time
+import queue
+import logging
+import threading
+
+# Журнал подій прогресу в директорії результатів сесії
+EVENTS_FILE = "events.jsonl"
+
+# Статуси, після яких потік подій сесії завершується
+TERMINAL_STATUSES = ("completed", "failed", "cancelled")
+
+
+def append_event(session_dir, event):
+    """
+    Дописує подію в журнал сесії. Кожна подія - один рядок, записаний
+    одним викликом write() у режимі O_APPEND, тому рядки від різних
+    процесів не перемішуються.
+
+    Args:
+        session_dir (str): Директорія результатів сесії
+        event (dict): Дані події
+    """
+    event = dict(event, timestamp=time.time())
+    line = (json.dumps(event, ensure_ascii=False) + "\n").encode("utf-8")
+    fd = os.open(
+        os.path.join(session_dir, EVENTS_FILE), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644
+    )
+    try:
+        os.write(fd, line)
+    finally:
+        os.close(fd)
+
+
+def read_events(path, offset):
+    """
+    Читає повні рядки журналу, починаючи з заданого зсуву.
+
+    Ідентифікатор події - зсув кінця її рядка у файлі, тому клієнт
+    продовжує читання з Last-Event-ID без окремої нумерації.
+
+    Args:
+        path (str): Шлях до журналу подій
+        offset (int): Зсув, з якого читати
+
+    Returns:
+        tuple: (список (id, подія), новий зсув)
+    """
+    try:
+        with open(path, "rb") as f:
+            f.seek(offset)
+            data = f.read()
+    except FileNotFoundError:
+        return [], offset
+
+    events = []
+    position = offset
+    for line in data.splitlines(keepends=True):
+        # Незавершений рядок дочитаємо наступного разу
+        if not line.endswith(b"\n"):
+            break
+        position += len(line)
+        try:
+            events.append((position, json.loads(line)))
+        except ValueError:
+            continue
+    return events, position
+
+
+def is_terminal(event):
+    return event.get("type") == "status" and event.get("status") in TERMINAL_STATUSES
+
+
+class ProgressBroadcaster:
+    """
+    Розсилка подій прогресу підписникам (SSE-клієнтам) в межах процесу API.
+
+    Один спільний потік стежить за журналами подій сесій, які мають
+    підписників, і читає лише нові байти, тому кількість читань диска
+    не залежить від кількості клієнтів.
+    """
+
+    def __init__(self, results_root, poll_interval=0.5, logger=None):
+        """
+        Ініціалізація розсилки.
+
+        Args:
+            results_root (str): Коренева директорія результатів
+            poll_interval (float): Інтервал перевірки журналів у секундах
+            logger (Logger, optional): Логер для запису повідомлень
+        """
+        self.results_root = results_root
+        self.poll_interval = poll_interval
+        self.logger = logger or logging.getLogger("progress_events")
+
+        # session_id -> {"offset": int, "subscribers": set(Queue)}
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _events_path(self, session_id):
+        return os.path.join(self.results_root, session_id, EVENTS_FILE)
+
+    def subscribe(self, session_id, last_event_id=0):
+        """
+        Підписує клієнта на події сесії. Події після last_event_id, що вже
+        є в журналі, одразу потрапляють у чергу підписника.
+
+        Args:
+            session_id (str): Ідентифікатор сесії
+            last_event_id (int): Ідентифікатор останньої отриманої події
+
+        Returns:
+            Queue: Черга подій (id, подія)
+        """
+        subscriber = queue.Queue()
+
+        path = self._events_path(session_id)
+        try:
+            size = os.stat(path).st_size
+        except FileNotFoundError:
+            size = 0
+        # Ідентифікатор з попереднього журналу (сесію створено заново) - читаємо з початку
+        start = last_event_id if 0 <= last_event_id <= size else 0
+
+        with self._lock:
+            events, offset = read_events(path, start)
+            state = self._sessions.get(session_id)
+            if state is None:
+                # Кінець прочитаного стає точкою відліку для спільного потоку
+                state = {"offset": offset, "subscribers": set()}
+                self._sessions[session_id] = state
+
+            # Пропущені події (лише до зсуву, який вже обробив спільний потік)
+            for event_id, event in events:
+                if event_id <= state["offset"]:
+                    subscriber.put((event_id, event))
+
+            state["subscribers"].add(subscriber)
+            self._ensure_thread()
+
+        return subscriber
+
+    def unsubscribe(self, session_id, subscriber):
+        """
+        Відписує клієнта; сесія без підписників більше не відстежується.
+
+        Args:
+            session_id (str): Ідентифікатор сесії
+            subscriber (Queue): Черга, повернута subscribe()
+        """
+        with self._lock:
+            state = self._sessions.get(session_id)
+            if state is None:
+                return
+            state["subscribers"].discard(subscriber)
+            if not state["subscribers"]:
+                del self._sessions[session_id]
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(
+                target=self._run, name="progress-events", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                self._poll()
+            except Exception as e:
+                self.logger.error(f"Помилка розсилки подій прогресу: {str(e)}")
+
+    def _poll(self):
+        with self._lock:
+            watched = [(session_id, state["offset"]) for session_id, state in self._sessions.items()]
+
+        for session_id, offset in watched:
+            path = self._events_path(session_id)
+            try:
+                size = os.stat(path).st_size
+            except FileNotFoundError:
+                continue
+            if size == offset:
+                continue
+            if size < offset:
+                # Журнал створено заново (сесію видалено і запущено повторно)
+                offset = 0
+
+            events, new_offset = read_events(path, offset)
+
+            with self._lock:
+                state = self._sessions.get(session_id)
+                if state is None:
+                    continue
+                state["offset"] = new_offset
+                for subscriber in state["subscribers"]:
+                    for item in events:
+                        subscriber.put(item)
@@ -1,22 +1,30 @@
 import os
-import json
 import time
 import logging
+from .progress_events import append_event
+from .session_state import SessionState
 
 class ProgressTracker:
     """
     Клас для відстеження прогресу реконструкції.
     """
     
-    def __init__(self, metadata_path):
+    def __init__(self, metadata_path, flush_interval=None):
         """
         Ініціалізація трекера прогресу.
         
         Args:
             metadata_path (str): Шлях до файлу метаданих
+            flush_interval (float, optional): Мінімальний інтервал між записами стану на диск
         """
         self.metadata_path = metadata_path
+        self.session_dir = os.path.dirname(metadata_path)
         self.logger = logging.getLogger("progress_tracker")
+        
+        # Стан сесії в пам'яті; на диск записується атомарно з обмеженою частотою
+        self.state = SessionState(self.session_dir, flush_interval, self.logger)
+        self.state.add_listener(self._on_flush)
+        self._last_emitted = None
     
     def update_progress(self, stage, progress, message=None):
         """
@@ -27,37 +35,70 @@ class ProgressTracker:
             progress (int): Прогрес у відсотках (0-100)
             message (str, optional): Повідомлення про статус
         """
+        current = self.state.get()
+        update = {
+            "current_stage": stage,
+            "progress": progress,
+        }
+        if message:
+            update["current_message"] = message
+        if "status" not in current:
+            self.logger.warning(f"Стан сесії ще не існує: {self.metadata_path}")
+            update.update({
+                "status": "processing",
+                "started_at": time.time(),
+                "current_message": message if message else "",
+            })
+        
+        # Зміну етапу записуємо одразу: за нею воркер визначає етап, на якому
+        # процес завдання аварійно завершився
+        self.state.update(update, force=current.get("current_stage") != stage)
+        self.logger.info(f"Прогрес оновлено: {stage} - {progress}% - {message}")
+    
+    def update_metadata(self, data):
+        """
+        Оновлює довільні поля стану сесії з негайним записом на диск.
+        
+        Args:
+            data (dict): Дані для оновлення
+        """
+        self.state.update(data, force=True)
+    
+    def flush(self):
+        """
+        Записує відкладені оновлення прогресу на диск.
+        """
+        self.state.flush()
+    
+    def _on_flush(self, state):
+        # Подія прогресу надсилається лише для записаного стану, тому клієнти
+        # отримують не більше однієї події за інтервал запису
+        progress = (
+            state.get("current_stage"),
+            state.get("progress"),
+            state.get("current_message", ""),
+        )
+        if progress == self._last_emitted or progress[0] is None:
+            return
+        self._last_emitted = progress
+        self.emit({
+            "type": "progress",
+            "stage": progress[0],
+            "progress": progress[1],
+            "message": progress[2],
+        })
+    
+    def emit(self, event):
+        """
+        Дописує подію в журнал подій сесії, з якого API розсилає прогрес клієнтам.
+        
+        Args:
+            event (dict): Дані події ('type' - 'progress' або 'status')
+        """
         try:
-            if not os.path.exists(self.metadata_path):
-                self.logger.warning(f"Файл метаданих не існує: {self.metadata_path}")
-                # Створюємо новий файл метаданих
-                with open(self.metadata_path, "w") as f:
-                    json.dump({
-                        "status": "processing",
-                        "started_at": time.time(),
-                        "current_stage": stage,
-                        "progress": progress,
-                        "current_message": message if message else ""
-                    }, f)
-                return
-            
-            # Зчитуємо існуючі метадані
-            with open(self.metadata_path, "r") as f:
-                metadata = json.load(f)
-            
-            # Оновлюємо прогрес
-            metadata["current_stage"] = stage
-            metadata["progress"] = progress
-            if message:
-                metadata["current_message"] = message
-            
-            # Зберігаємо оновлені метадані
-            with open(self.metadata_path, "w") as f:
-                json.dump(metadata, f)
-                
-            self.logger.info(f"Прогрес оновлено: {stage} - {progress}% - {message}")
+            append_event(self.session_dir, event)
         except Exception as e:
-            self.logger.error(f"Помилка при оновленні прогресу: {str(e)}")
+            self.logger.error(f"Помилка при записі події прогресу: {str(e)}")
     
     def get_progress(self):
         """
@@ -67,8 +108,7 @@ class ProgressTracker:
             dict: Інформація про прогрес
         """
         try:
-            with open(self.metadata_path, "r") as f:
-                metadata = json.load(f)
+            metadata = self.state.get()
                 
             # Вилучаємо інформацію про прогрес
             progress_info = {
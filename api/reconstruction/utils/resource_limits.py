@@ -0,0 +1,141 @@
+import os
+import signal
+import resource
+import logging
+import psutil
+
+# Рівні якості від найнижчого до найвищого
+QUALITY_TIERS = ["low", "medium", "high"]
+
+# Ознаки нестачі пам'яті у виводі зовнішніх програм
+OOM_MARKERS = ("std::bad_alloc", "out of memory", "cannot allocate memory", "memoryerror")
+
+
+class ResourceLimitExceeded(MemoryError):
+    """
+    Етап або зовнішня програма перевищили ліміт пам'яті завдання.
+    """
+
+
+def lower_quality(quality):
+    """
+    Повертає наступний нижчий рівень якості.
+
+    Args:
+        quality (str): Поточна якість ('low', 'medium', 'high')
+
+    Returns:
+        str: Нижча якість або None, якщо нижчого рівня немає
+    """
+    if quality not in QUALITY_TIERS:
+        return None
+    index = QUALITY_TIERS.index(quality)
+    return QUALITY_TIERS[index - 1] if index > 0 else None
+
+
+def free_resources(reserved_cores, reserved_memory_mb):
+    """
+    Рахує вільні ресурси машини з урахуванням зарезервованих.
+
+    Args:
+        reserved_cores (int): Зарезервовані ядра
+        reserved_memory_mb (int): Зарезервована пам'ять (МБ)
+
+    Returns:
+        tuple: (вільні ядра, вільна пам'ять у МБ)
+    """
+    free_cores = (os.cpu_count() or 1) - reserved_cores
+
+    memory = psutil.virtual_memory()
+    total_mb = memory.total // (1024 * 1024)
+    available_mb = memory.available // (1024 * 1024)
+    return free_cores, min(available_mb, total_mb - reserved_memory_mb)
+
+
+def apply_memory_limit(limit_mb, kind="data", logger=None):
+    """
+    Встановлює ліміт пам'яті для поточного процесу та його нащадків.
+
+    За замовчуванням обмежується RLIMIT_DATA, а не адресний простір:
+    CUDA резервує величезні діапазони віртуальних адрес, і RLIMIT_AS
+    зламав би COLMAP з GPU.
+
+    Args:
+        limit_mb (int): Ліміт у мегабайтах (0 - без обмеження)
+        kind (str): 'data' (RLIMIT_DATA) або 'as' (RLIMIT_AS)
+        logger (Logger, optional): Логер для запису повідомлень
+    """
+    if logger is None:
+        logger = logging.getLogger("resource_limits")
+
+    if not limit_mb:
+        return
+
+    limit = resource.RLIMIT_AS if kind == "as" else resource.RLIMIT_DATA
+    limit_bytes = int(limit_mb) * 1024 * 1024
+    resource.setrlimit(limit, (limit_bytes, limit_bytes))
+    logger.info(f"Встановлено ліміт пам'яті {limit_mb} МБ ({'RLIMIT_AS' if kind == 'as' else 'RLIMIT_DATA'})")
+
+
+def process_tree_rss(pid):
+    """
+    Рахує сумарний RSS процесу та всіх його нащадків.
+
+    Args:
+        pid (int): Ідентифікатор процесу
+
+    Returns:
+        int: RSS у байтах (0, якщо процес вже завершився)
+    """
+    try:
+        process = psutil.Process(pid)
+        processes = [process] + process.children(recursive=True)
+    except psutil.NoSuchProcess:
+        return 0
+
+    total = 0
+    for proc in processes:
+        try:
+            total += proc.memory_info().rss
+        except psutil.NoSuchProcess:
+            pass
+    return total
+
+
+def kill_process_tree(pid):
+    """
+    Примусово завершує процес та всіх його нащадків.
+
+    Args:
+        pid (int): Ідентифікатор процесу
+    """
+    try:
+        process = psutil.Process(pid)
+        processes = process.children(recursive=True) + [process]
+    except psutil.NoSuchProcess:
+        return
+
+    for proc in processes:
+        try:
+            proc.kill()
+        except psutil.NoSuchProcess:
+            pass
+
+
+def is_oom_failure(return_code, stderr_lines=()):
+    """
+    Визначає, чи завершилась зовнішня програма через нестачу пам'яті.
+
+    Args:
+        return_code (int): Код завершення процесу
+        stderr_lines (iterable): Останні рядки stderr
+
+    Returns:
+        bool: True, якщо схоже на нестачу пам'яті
+    """
+    # SIGKILL надсилає OOM killer ядра, std::bad_alloc та подібні помилки видно у stderr
+    if return_code in (-signal.SIGKILL, 128 + signal.SIGKILL):
+        return True
+
+    text = " ".join(stderr_lines).lower()
+    return any(marker.lower() in text for marker in OOM_MARKERS)
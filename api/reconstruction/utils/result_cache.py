@@ -0,0 +1,250 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+from .file_utils import iter_result_files
+from .disk_usage import owned_size
+
+# Файл з описом запису кешу
+ENTRY_FILE = "entry.json"
+
+
+def _link_or_copy(src, dst):
+    """
+    Створює dst як жорстке посилання на src (або копію на іншій файловій системі).
+
+    Returns:
+        int: Зміна розміру файлів, що належать лише директорії dst
+    """
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    delta = 0
+    if os.path.lexists(dst):
+        delta -= owned_size(dst)
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+        delta += os.path.getsize(dst)
+    return delta
+
+
+def detach_links(directory):
+    """
+    Розриває жорсткі посилання у директорії результатів (копіювання при записі).
+    Потрібно перед повторною обробкою сесії, щоб перезапис файлів на місці
+    не пошкодив спільні з кешем артефакти.
+
+    Args:
+        directory (str): Директорія результатів
+
+    Returns:
+        int: Розмір файлів, що стали належати лише сесії
+    """
+    detached = 0
+    for rel_path in iter_result_files(directory):
+        path = os.path.join(directory, rel_path)
+        if os.path.islink(path) or os.stat(path).st_nlink <= 1:
+            continue
+        tmp_path = f"{path}.tmp"
+        shutil.copy2(path, tmp_path)
+        os.replace(tmp_path, path)
+        detached += os.path.getsize(path)
+    return detached
+
+
+class ResultCache:
+    """
+    Кеш результатів реконструкції за відбитком набору зображень, методу та якості.
+    Артефакти зберігаються жорсткими посиланнями, розмір кешу обмежено,
+    найдавніше використані записи витісняються (LRU).
+    """
+
+    def __init__(self, cache_dir, max_bytes, logger=None):
+        """
+        Ініціалізація кешу результатів.
+
+        Args:
+            cache_dir (str): Директорія кешу
+            max_bytes (int): Максимальний розмір кешу в байтах (0 - кеш вимкнено)
+            logger (Logger, optional): Логер для запису повідомлень
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.logger = logger or logging.getLogger("result_cache")
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    @staticmethod
+    def fingerprint(image_hashes, method, quality, pipeline_version, matching="auto"):
+        """
+        Обчислює відбиток вхідних даних реконструкції.
+
+        Args:
+            image_hashes (iterable): SHA-256 вхідних зображень
+            method (str): Метод реконструкції
+            quality (str): Якість реконструкції
+            pipeline_version (str): Версія пайплайну
+            matching (str): Режим зіставлення пар
+
+        Returns:
+            str: Відбиток (hex SHA-256)
+        """
+        data = {
+            "images": sorted(image_hashes),
+            "method": method,
+            "quality": quality,
+            "version": pipeline_version,
+            "matching": matching,
+        }
+        payload = json.dumps(data, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _entry_dir(self, fingerprint):
+        return os.path.join(self.cache_dir, fingerprint)
+
+    def lookup(self, fingerprint):
+        """
+        Шукає запис у кеші та позначає його як щойно використаний.
+
+        Args:
+            fingerprint (str): Відбиток вхідних даних
+
+        Returns:
+            dict: Опис запису або None
+        """
+        if not self.enabled:
+            return None
+
+        entry_path = os.path.join(self._entry_dir(fingerprint), ENTRY_FILE)
+        try:
+            with open(entry_path, "r") as f:
+                entry = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+        # Час модифікації файлу запису - це час останнього використання для LRU
+        os.utime(entry_path)
+        return entry
+
+    def restore(self, fingerprint, entry, output_dir):
+        """
+        Відновлює артефакти з кешу в директорію результатів сесії.
+
+        Args:
+            fingerprint (str): Відбиток вхідних даних
+            entry (dict): Опис запису з lookup()
+            output_dir (str): Директорія результатів сесії
+
+        Returns:
+            tuple: (шлях до основної моделі, зміна розміру файлів, що належать
+                лише сесії; посилання на файли кешу не враховуються)
+        """
+        files_dir = os.path.join(self._entry_dir(fingerprint), "files")
+        size_delta = 0
+        for rel_path in entry["files"]:
+            size_delta += _link_or_copy(os.path.join(files_dir, rel_path), os.path.join(output_dir, rel_path))
+
+        self.logger.info(f"Результати відновлено з кешу {fingerprint[:12]}: {len(entry['files'])} файлів")
+        return os.path.join(output_dir, entry["result_path"]), size_delta
+
+    def store(self, fingerprint, output_dir, result_path):
+        """
+        Зберігає артефакти сесії в кеш.
+
+        Args:
+            fingerprint (str): Відбиток вхідних даних
+            output_dir (str): Директорія результатів сесії
+            result_path (str): Шлях до основної моделі
+
+        Returns:
+            int: Зміна розміру файлів, що належать лише сесії (файли, пов'язані
+                з кешем жорсткими посиланнями, стають спільними)
+        """
+        if not self.enabled:
+            return 0
+
+        output_dir = os.path.abspath(output_dir)
+        result_path = os.path.abspath(result_path)
+        if not result_path.startswith(output_dir + os.sep):
+            self.logger.warning("Основна модель поза директорією результатів, кешування пропущено")
+            return 0
+
+        entry_dir = self._entry_dir(fingerprint)
+        if os.path.exists(entry_dir):
+            return 0
+
+        tmp_dir = f"{entry_dir}.{os.getpid()}.tmp"
+        files_dir = os.path.join(tmp_dir, "files")
+        files = []
+        size = 0
+        owned_before = 0
+
+        try:
+            for rel_path in iter_result_files(output_dir):
+                src = os.path.join(output_dir, rel_path)
+                owned_before += owned_size(src)
+                _link_or_copy(src, os.path.join(files_dir, rel_path))
+                files.append(rel_path)
+                size += os.path.getsize(src)
+
+            entry = {
+                "fingerprint": fingerprint,
+                "result_path": os.path.relpath(result_path, output_dir),
+                "files": files,
+                "size": size,
+                "created_at": time.time(),
+            }
+            with open(os.path.join(tmp_dir, ENTRY_FILE), "w") as f:
+                json.dump(entry, f)
+
+            os.rename(tmp_dir, entry_dir)
+        except OSError as e:
+            # Наприклад, інший процес вже зберіг такий самий запис
+            self.logger.warning(f"Не вдалося зберегти результати в кеш: {str(e)}")
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return 0
+
+        self.logger.info(f"Результати збережено в кеш {fingerprint[:12]} ({size} байт)")
+        self.evict()
+
+        # Запис міг бути одразу витіснений, тому розмір рахується після витіснення
+        owned_after = sum(owned_size(os.path.join(output_dir, rel_path)) for rel_path in files)
+        return owned_after - owned_before
+
+    def evict(self):
+        """
+        Витісняє найдавніше використані записи, поки розмір кешу перевищує ліміт.
+
+        Returns:
+            int: Кількість витіснених записів
+        """
+        entries = []
+        total = 0
+
+        for name in os.listdir(self.cache_dir):
+            entry_path = os.path.join(self.cache_dir, name, ENTRY_FILE)
+            try:
+                with open(entry_path, "r") as f:
+                    size = json.load(f)["size"]
+                last_used = os.path.getmtime(entry_path)
+            except (OSError, ValueError, KeyError):
+                continue
+            entries.append((last_used, name, size))
+            total += size
+
+        evicted = 0
+        for last_used, name, size in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(os.path.join(self.cache_dir, name), ignore_errors=True)
+            total -= size
+            evicted += 1
+            self.logger.info(f"Витіснено запис кешу {name[:12]} ({size} байт)")
+
+        return evicted
@@ -0,0 +1,311 @@
+import os
+import json
+import time
+import fcntl
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from .. import config
+
+# Файл стану сесії в директорії результатів
+METADATA_FILE = "metadata.json"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS session_state (
+    session_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def write_json_atomic(path, data):
+    """
+    Записує JSON через тимчасовий файл та os.replace, тому читачі ніколи
+    не бачать частково записаного файлу.
+
+    Args:
+        path (str): Шлях до файлу
+        data (dict): Дані для запису
+    """
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def read_json(path):
+    """
+    Читає JSON-файл.
+
+    Args:
+        path (str): Шлях до файлу
+
+    Returns:
+        dict: Дані (порожній словник, якщо файлу немає)
+    """
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+class SqliteStateBackend:
+    """
+    Зберігання стану сесій у SQLite в режимі WAL: читачі (API) не блокують
+    процес, що записує стан, і завжди бачать останню зафіксовану версію.
+    """
+
+    def __init__(self, db_path):
+        """
+        Ініціалізація сховища.
+
+        Args:
+            db_path (str): Шлях до файлу бази даних SQLite
+        """
+        self.db_path = db_path
+
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def save(self, session_id, data):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO session_state (session_id, data, updated_at) VALUES (?, ?, ?)",
+                (session_id, json.dumps(data), time.time()),
+            )
+
+    def load(self, session_id):
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT data FROM session_state WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def delete(self, session_id):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM session_state WHERE session_id = ?", (session_id,))
+
+
+def get_state_backend():
+    """
+    Повертає SQLite-сховище стану, якщо його ввімкнено в конфігурації.
+
+    Returns:
+        SqliteStateBackend: Сховище або None (стан лише у metadata.json)
+    """
+    global _backend
+
+    if config.SESSION_STATE_BACKEND != "sqlite":
+        return None
+
+    with _backend_lock:
+        if _backend is None:
+            _backend = SqliteStateBackend(config.JOBS_DB_PATH)
+        return _backend
+
+
+def load_session_state(session_dir):
+    """
+    Читає стан сесії (з SQLite, якщо ввімкнено, інакше з metadata.json).
+
+    Args:
+        session_dir (str): Директорія результатів сесії
+
+    Returns:
+        dict: Стан сесії (порожній, якщо його ще немає)
+    """
+    backend = get_state_backend()
+    if backend is not None:
+        data = backend.load(os.path.basename(os.path.normpath(session_dir)))
+        if data is not None:
+            return data
+    return read_json(os.path.join(session_dir, METADATA_FILE))
+
+
+def save_session_state(session_dir, data):
+    """
+    Атомарно записує повний стан сесії.
+
+    Args:
+        session_dir (str): Директорія результатів сесії
+        data (dict): Стан сесії
+    """
+    write_json_atomic(os.path.join(session_dir, METADATA_FILE), data)
+    backend = get_state_backend()
+    if backend is not None:
+        backend.save(os.path.basename(os.path.normpath(session_dir)), data)
+
+
+@contextmanager
+def locked_session_state(session_dir):
+    """
+    Блокування стану сесії між процесами (flock на директорії результатів)
+    для послідовних циклів читання-зміни-запису.
+
+    Args:
+        session_dir (str): Директорія результатів сесії
+    """
+    fd = os.open(session_dir, os.O_RDONLY)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)
+
+
+def update_session_state(session_dir, fields):
+    """
+    Оновлює окремі поля стану сесії, зберігаючи поля, записані іншими процесами.
+
+    Args:
+        session_dir (str): Директорія результатів сесії
+        fields (dict): Поля для оновлення
+
+    Returns:
+        dict: Оновлений стан сесії
+    """
+    with locked_session_state(session_dir):
+        data = load_session_state(session_dir)
+        data.update(fields)
+        save_session_state(session_dir, data)
+    return data
+
+
+def delete_session_state(session_id):
+    """
+    Видаляє стан сесії з SQLite (файл видаляється разом з директорією результатів).
+
+    Args:
+        session_id (str): Ідентифікатор сесії
+    """
+    backend = get_state_backend()
+    if backend is not None:
+        backend.delete(session_id)
+
+
+class SessionState:
+    """
+    Стан сесії в пам'яті процесу з об'єднанням оновлень.
+
+    Часті оновлення (наприклад, прогрес з кожного рядка виводу COLMAP)
+    змінюють лише словник у пам'яті; на диск стан записується атомарно
+    не частіше одного разу за flush_interval. Важливі зміни (етап, статус)
+    записуються одразу. При записі змінені цим процесом поля об'єднуються
+    зі свіжо прочитаним станом, тому поля, записані API, не перезаписуються.
+    """
+
+    def __init__(self, session_dir, flush_interval=None, logger=None):
+        """
+        Ініціалізація стану сесії.
+
+        Args:
+            session_dir (str): Директорія результатів сесії
+            flush_interval (float, optional): Мінімальний інтервал між записами (секунди)
+            logger (Logger, optional): Логер для запису повідомлень
+        """
+        self.session_dir = session_dir
+        self.flush_interval = (
+            config.SESSION_STATE_FLUSH_INTERVAL if flush_interval is None else flush_interval
+        )
+        self.logger = logger or logging.getLogger("session_state")
+
+        self._data = load_session_state(session_dir)
+        self._lock = threading.RLock()
+        self._dirty = set()
+        self._last_flush = 0.0
+        self._timer = None
+        self._listeners = []
+
+    def get(self):
+        """
+        Повертає копію поточного стану.
+
+        Returns:
+            dict: Стан сесії
+        """
+        with self._lock:
+            return dict(self._data)
+
+    def add_listener(self, callback):
+        """
+        Реєструє функцію callback(state), що викликається після кожного запису на диск.
+
+        Args:
+            callback (callable): Функція-слухач
+        """
+        self._listeners.append(callback)
+
+    def update(self, data, force=False):
+        """
+        Оновлює стан. Запис на диск відкладається, якщо попередній був нещодавно.
+
+        Args:
+            data (dict): Поля для оновлення
+            force (bool): Записати на диск одразу
+        """
+        with self._lock:
+            self._data.update(data)
+            self._dirty.update(data)
+
+            elapsed = time.monotonic() - self._last_flush
+            if force or elapsed >= self.flush_interval:
+                self._flush_locked()
+            elif self._timer is None:
+                # Останнє оновлення серії буде записане навіть без наступних викликів
+                self._timer = threading.Timer(self.flush_interval - elapsed, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        """
+        Записує відкладені оновлення на диск.
+        """
+        with self._lock:
+            if self._dirty:
+                self._flush_locked()
+
+    def _flush_locked(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        try:
+            with locked_session_state(self.session_dir):
+                data = load_session_state(self.session_dir)
+                data.update({key: self._data[key] for key in self._dirty})
+                save_session_state(self.session_dir, data)
+        except Exception as e:
+            self.logger.error(f"Помилка при записі стану сесії: {str(e)}")
+            return
+
+        self._data = data
+        self._dirty = set()
+        self._last_flush = time.monotonic()
+
+        snapshot = dict(self._data)
+        for callback in self._listeners:
+            try:
+                callback(snapshot)
+            except Exception as e:
+                self.logger.error(f"Помилка слухача стану сесії: {str(e)}")
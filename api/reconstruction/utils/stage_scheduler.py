@@ -0,0 +1,273 @@
+import os
+import time
+import socket
+import sqlite3
+import logging
+from contextlib import contextmanager
+from .cancellation import check_cancelled
+from .resource_limits import free_resources
+
+# Стани оренди ресурсів етапу
+LEASE_WAITING = "waiting"
+LEASE_GRANTED = "granted"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS stage_leases (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    owner TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    host TEXT NOT NULL,
+    pid INTEGER NOT NULL,
+    cores INTEGER NOT NULL DEFAULT 1,
+    memory_mb INTEGER NOT NULL DEFAULT 0,
+    tool TEXT,
+    state TEXT NOT NULL,
+    requested_at REAL NOT NULL,
+    granted_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_leases_state ON stage_leases (state, id);
+CREATE INDEX IF NOT EXISTS idx_leases_owner ON stage_leases (owner);
+"""
+
+
+class StageScheduler:
+    """
+    Планувальник етапів між завданнями на базі оренди ресурсів у базі черги.
+
+    Завдання не резервує ресурси на весь час виконання: кожен етап перед
+    запуском орендує ядра, пам'ять та, за потреби, ексклюзивний зовнішній
+    інструмент (наприклад, GPU) і повертає їх після завершення. Так легкі
+    етапи одних сесій (очищення, експорт) виконуються одночасно з важкими
+    етапами інших, а машина не простоює.
+
+    Запити задовольняються в будь-якому порядку, доки вистачає ресурсів;
+    запит, що чекає довше за STAGE_LEASE_FAIRNESS_WAIT, блокує новіші,
+    щоб великі етапи не чекали вічно.
+    """
+
+    def __init__(self, db_path, owner=None, logger=None, poll_interval=0.5, fairness_wait=60):
+        """
+        Ініціалізація планувальника.
+
+        Args:
+            db_path (str): Шлях до файлу бази даних SQLite
+            owner (str, optional): Власник оренд (ідентифікатор завдання)
+            logger (Logger, optional): Логер для запису повідомлень
+            poll_interval (float): Інтервал повторної перевірки запиту (секунди)
+            fairness_wait (float): Час очікування, після якого запит
+                отримує пріоритет над новішими (секунди)
+        """
+        self.db_path = db_path
+        self.owner = owner
+        self.logger = logger or logging.getLogger("stage_scheduler")
+        self.poll_interval = poll_interval
+        self.fairness_wait = fairness_wait
+        self.host = socket.gethostname()
+
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def lease(self, stage, cores=1, memory_mb=0, tool=None):
+        """
+        Орендує ресурси на час виконання етапу.
+
+        Args:
+            stage (str): Назва етапу
+            cores (int): Кількість ядер
+            memory_mb (int): Обсяг пам'яті (МБ)
+            tool (str, optional): Ексклюзивний зовнішній інструмент
+
+        Yields:
+            int: Ідентифікатор оренди
+        """
+        lease_id = self.acquire(stage, cores, memory_mb, tool)
+        try:
+            yield lease_id
+        finally:
+            self.release(lease_id)
+
+    def acquire(self, stage, cores=1, memory_mb=0, tool=None):
+        """
+        Чекає, доки ресурси етапу стануть вільними, та орендує їх.
+
+        Args:
+            stage (str): Назва етапу
+            cores (int): Кількість ядер
+            memory_mb (int): Обсяг пам'яті (МБ)
+            tool (str, optional): Ексклюзивний зовнішній інструмент
+
+        Returns:
+            int: Ідентифікатор оренди
+        """
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "INSERT INTO stage_leases (owner, stage, host, pid, cores, memory_mb, tool, state, requested_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (str(self.owner), stage, self.host, os.getpid(), cores, memory_mb, tool,
+                 LEASE_WAITING, time.time()),
+            )
+            lease_id = cursor.lastrowid
+
+        started = time.time()
+        try:
+            while not self._try_grant(lease_id):
+                # Скасоване завдання не чекає на ресурси
+                check_cancelled()
+                time.sleep(self.poll_interval)
+        except BaseException:
+            self.release(lease_id)
+            raise
+
+        waited = time.time() - started
+        if waited >= self.poll_interval:
+            self.logger.info(f"Етап {stage} отримав ресурси після очікування {waited:.1f} с")
+        return lease_id
+
+    def _try_grant(self, lease_id):
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                lease = conn.execute("SELECT * FROM stage_leases WHERE id = ?", (lease_id,)).fetchone()
+                if lease is None:
+                    raise RuntimeError(f"Оренду ресурсів {lease_id} відкликано")
+
+                granted = self._admit(conn, lease)
+                if granted:
+                    conn.execute(
+                        "UPDATE stage_leases SET state = ?, granted_at = ? WHERE id = ?",
+                        (LEASE_GRANTED, time.time(), lease_id),
+                    )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return granted
+
+    def _admit(self, conn, lease):
+        """
+        Чи можна видати оренду зараз.
+        """
+        if lease["tool"] is not None:
+            busy = conn.execute(
+                "SELECT 1 FROM stage_leases WHERE state = ? AND tool = ? LIMIT 1",
+                (LEASE_GRANTED, lease["tool"]),
+            ).fetchone()
+            if busy:
+                return False
+
+        # Запит, що чекає надто довго, має пріоритет над новішими, які конкурують
+        # з ним за той самий ресурс: ту саму програму або ядра та пам'ять. Запит,
+        # що чекає лише на зайняту програму, не блокує етапи, яким вона не потрібна
+        starving = conn.execute(
+            "SELECT tool FROM stage_leases WHERE state = ? AND id < ? AND requested_at < ?",
+            (LEASE_WAITING, lease["id"], time.time() - self.fairness_wait),
+        ).fetchall()
+        for waiter in starving:
+            if waiter["tool"] is None:
+                return False
+            if waiter["tool"] == lease["tool"]:
+                return False
+            tool_busy = conn.execute(
+                "SELECT 1 FROM stage_leases WHERE state = ? AND tool = ? LIMIT 1",
+                (LEASE_GRANTED, waiter["tool"]),
+            ).fetchone()
+            if not tool_busy:
+                return False
+
+        reserved = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(cores), 0), COALESCE(SUM(memory_mb), 0) "
+            "FROM stage_leases WHERE state = ?",
+            (LEASE_GRANTED,),
+        ).fetchone()
+        # Якщо ресурси ніхто не орендує, етап запускається завжди,
+        # інакше етап, більший за машину, чекав би вічно
+        if reserved[0] == 0:
+            return True
+
+        free_cores, free_memory_mb = free_resources(reserved[1], reserved[2])
+        return free_cores >= lease["cores"] and free_memory_mb >= lease["memory_mb"]
+
+    def release(self, lease_id):
+        """
+        Повертає орендовані ресурси.
+
+        Args:
+            lease_id (int): Ідентифікатор оренди
+        """
+        with self._connect() as conn:
+            conn.execute("DELETE FROM stage_leases WHERE id = ?", (lease_id,))
+
+    def release_owner(self, owner):
+        """
+        Повертає всі оренди власника (після завершення процесу завдання).
+
+        Args:
+            owner (str): Ідентифікатор завдання
+
+        Returns:
+            int: Кількість звільнених оренд
+        """
+        with self._connect() as conn:
+            cursor = conn.execute("DELETE FROM stage_leases WHERE owner = ?", (str(owner),))
+        return cursor.rowcount
+
+    def release_dead(self):
+        """
+        Звільняє оренди процесів цього хоста, які вже не існують.
+
+        Returns:
+            int: Кількість звільнених оренд
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT DISTINCT pid FROM stage_leases WHERE host = ?", (self.host,)
+            ).fetchall()
+
+        dead = [row["pid"] for row in rows if not _pid_alive(row["pid"])]
+        if not dead:
+            return 0
+
+        placeholders = ",".join("?" for _ in dead)
+        with self._connect() as conn:
+            cursor = conn.execute(
+                f"DELETE FROM stage_leases WHERE host = ? AND pid IN ({placeholders})",
+                [self.host] + dead,
+            )
+            count = cursor.rowcount
+
+        if count:
+            self.logger.warning(f"Звільнено {count} оренд ресурсів завершених процесів")
+        return count
+
+    def leases(self):
+        """
+        Повертає поточні оренди та запити.
+
+        Returns:
+            list: Записи оренд
+        """
+        with self._connect() as conn:
+            rows = conn.execute("SELECT * FROM stage_leases ORDER BY id").fetchall()
+        return [dict(row) for row in rows]
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
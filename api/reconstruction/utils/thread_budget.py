@@ -0,0 +1,134 @@
+import os
+import logging
+import psutil
+from .. import config
+
+# Змінні середовища, якими OpenMP та бібліотеки лінійної алгебри обмежують
+# кількість потоків (Open3D, NumPy/SciPy, COLMAP, OpenMVS)
+THREAD_ENV_VARS = (
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",
+)
+
+
+def thread_budget(quality):
+    """
+    Повертає кількість потоків, доступних завданню заданої якості.
+
+    Args:
+        quality (str): Якість реконструкції ('low', 'medium', 'high')
+
+    Returns:
+        int: Кількість потоків
+    """
+    if config.JOB_THREADS > 0:
+        return config.JOB_THREADS
+    requirements = config.JOB_RESOURCE_REQUIREMENTS.get(
+        quality, config.JOB_RESOURCE_REQUIREMENTS["medium"]
+    )
+    return max(1, requirements["cores"])
+
+
+def thread_env(threads, env=None):
+    """
+    Повертає середовище для зовнішньої програми з обмеженою кількістю потоків.
+
+    Args:
+        threads (int): Кількість потоків
+        env (dict, optional): Базове середовище (за замовчуванням - поточне)
+
+    Returns:
+        dict: Середовище
+    """
+    env = dict(os.environ if env is None else env)
+    for name in THREAD_ENV_VARS:
+        env[name] = str(threads)
+    return env
+
+
+def limit_threads(threads):
+    """
+    Обмежує кількість потоків бібліотек у поточному потоці виконання.
+
+    Параметри OpenMP зберігаються окремо для кожного потоку, тому функцію
+    викликає кожен потік, що виконує етап пайплайну.
+
+    Args:
+        threads (int): Кількість потоків
+    """
+    try:
+        import cv2
+        cv2.setNumThreads(threads)
+    except ImportError:
+        pass
+
+    # threadpoolctl (якщо встановлений) змінює ліміт уже завантажених
+    # бібліотек OpenMP/BLAS, для яких змінні середовища читаються лише при старті
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(threads)
+    except ImportError:
+        pass
+
+
+def apply_thread_budget(threads, logger=None):
+    """
+    Застосовує бюджет потоків до процесу завдання: змінні середовища
+    (успадковуються зовнішніми програмами), ліміти OpenCV/OpenMP та,
+    за потреби, прив'язку до ядер.
+
+    Args:
+        threads (int): Кількість потоків
+        logger (Logger, optional): Логер для запису повідомлень
+    """
+    if logger is None:
+        logger = logging.getLogger("thread_budget")
+
+    for name in THREAD_ENV_VARS:
+        os.environ[name] = str(threads)
+    limit_threads(threads)
+
+    cpus = None
+    if config.JOB_CPU_AFFINITY:
+        cpus = pin_to_idle_cpus(threads, logger)
+
+    logger.info(
+        f"Бюджет потоків завдання: {threads}"
+        + (f", ядра {sorted(cpus)}" if cpus else "")
+    )
+
+
+def pin_to_idle_cpus(count, logger=None):
+    """
+    Прив'язує поточний процес (і його майбутні дочірні процеси) до
+    найменш завантажених ядер.
+
+    Args:
+        count (int): Кількість ядер
+        logger (Logger, optional): Логер для запису повідомлень
+
+    Returns:
+        set: Вибрані ядра або None, якщо прив'язка недоступна
+    """
+    if logger is None:
+        logger = logging.getLogger("thread_budget")
+
+    if not hasattr(os, "sched_setaffinity"):
+        return None
+
+    try:
+        allowed = sorted(os.sched_getaffinity(0))
+        if count >= len(allowed):
+            return None
+
+        load = psutil.cpu_percent(interval=0.1, percpu=True)
+        allowed.sort(key=lambda cpu: load[cpu] if cpu < len(load) else 0)
+        cpus = set(allowed[:count])
+        os.sched_setaffinity(0, cpus)
+        return cpus
+    except OSError as e:
+        logger.warning(f"Не вдалося прив'язати процес до ядер: {str(e)}")
+        return None
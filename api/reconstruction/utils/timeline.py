@@ -0,0 +1,172 @@
+import os
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+# Часова шкала виконання в директорії логів сесії
+TIMELINE_FILE = "timeline.jsonl"
+
+# Часова шкала поточного процесу завдання (див. set_timeline)
+_timeline = None
+
+
+class Timeline:
+    """
+    Часова шкала виконання сесії: початок і кінець етапів, зовнішні команди,
+    кількість точок, вершин і трикутників після кожного етапу.
+
+    Журнал лише дописується (logs/timeline.jsonl), тому повторні запуски
+    сесії додаються після попередніх.
+    """
+
+    def __init__(self, session_dir, logger=None):
+        """
+        Ініціалізація часової шкали.
+
+        Args:
+            session_dir (str): Директорія результатів сесії
+            logger (Logger, optional): Логер для запису повідомлень
+        """
+        self.path = os.path.join(session_dir, "logs", TIMELINE_FILE)
+        self.logger = logger or logging.getLogger("timeline")
+
+    def record(self, event, **fields):
+        """
+        Дописує подію в часову шкалу. Кожна подія - один рядок, записаний
+        одним викликом write() у режимі O_APPEND, тому рядки з різних
+        потоків не перемішуються. Помилка запису лише записується в лог.
+
+        Args:
+            event (str): Тип події ('run_start', 'stage_end', 'command', ...)
+            **fields: Дані події
+        """
+        entry = dict(fields, event=event, time=time.time(), thread=threading.current_thread().name)
+        line = (json.dumps(entry, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line)
+            finally:
+                os.close(fd)
+        except OSError as e:
+            self.logger.warning(f"Не вдалося записати подію часової шкали: {str(e)}")
+
+    @contextmanager
+    def span(self, name, **fields):
+        """
+        Записує тривалість фрагмента обробки (наприклад, SIFT чи орієнтації нормалей)
+        як подію 'span'.
+
+        Args:
+            name (str): Назва фрагмента
+            **fields: Додаткові дані події
+        """
+        started = time.time()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            self.record(
+                "span", name=name, started_at=started,
+                duration_seconds=round(time.time() - started, 3), error=error, **fields
+            )
+
+
+def set_timeline(timeline):
+    """
+    Встановлює часову шкалу для подій поточного процесу (зовнішні команди,
+    фрагменти обробки в процесорах).
+
+    Args:
+        timeline (Timeline): Часова шкала або None
+
+    Returns:
+        Timeline: Попередня часова шкала
+    """
+    global _timeline
+    previous, _timeline = _timeline, timeline
+    return previous
+
+
+def record_event(event, **fields):
+    """
+    Дописує подію в часову шкалу поточного процесу, якщо її встановлено.
+
+    Args:
+        event (str): Тип події
+        **fields: Дані події
+    """
+    if _timeline is not None:
+        _timeline.record(event, **fields)
+
+
+@contextmanager
+def span(name, **fields):
+    """
+    Записує тривалість фрагмента обробки в часову шкалу поточного процесу.
+
+    Args:
+        name (str): Назва фрагмента
+        **fields: Додаткові дані події
+    """
+    if _timeline is None:
+        yield
+        return
+    with _timeline.span(name, **fields):
+        yield
+
+
+def geometry_counts(path):
+    """
+    Кількість точок (хмара) або вершин і трикутників (меш) у файлі PLY чи OBJ.
+    PLY читається лише до кінця заголовка, OBJ - поблоково без розбору.
+
+    Args:
+        path (str): Шлях до файлу
+
+    Returns:
+        dict: {'points': n} або {'vertices': n, 'triangles': m}; None для інших форматів
+    """
+    ext = os.path.splitext(path)[1].lower()
+    try:
+        if ext == ".ply":
+            return _ply_counts(path)
+        if ext == ".obj":
+            return _obj_counts(path)
+    except (OSError, ValueError):
+        return None
+    return None
+
+
+def _ply_counts(path):
+    elements = {}
+    with open(path, "rb") as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith(b"element "):
+                _, name, count = line.split()[:3]
+                elements[name.decode("ascii")] = int(count)
+            elif line == b"end_header":
+                break
+    if elements.get("face"):
+        return {"vertices": elements.get("vertex", 0), "triangles": elements["face"]}
+    return {"points": elements.get("vertex", 0)}
+
+
+def _obj_counts(path):
+    vertices = faces = 0
+    # Хвіст попереднього блоку: рядок 'v ' чи 'f ' може розірватись на межі блоків
+    tail = b"\n"
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            data = tail + chunk
+            vertices += data.count(b"\nv ")
+            faces += data.count(b"\nf ")
+            tail = data[-2:]
+    return {"vertices": vertices, "triangles": faces}
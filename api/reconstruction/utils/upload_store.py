@@ -0,0 +1,392 @@
+import os
+import json
+import fcntl
+import shutil
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+
+# Розмір блоку для потокового запису (пам'ять не залежить від розміру файлу)
+STREAM_BLOCK_SIZE = 1024 * 1024
+
+# Файл з хешами зображень сесії
+IMAGE_MANIFEST = "images.json"
+
+# Директорія для частин файлів, що ще завантажуються
+CHUNKS_DIR = ".chunks"
+
+
+class UploadError(ValueError):
+    """
+    Помилка у вхідних даних завантаження (некоректний фрагмент, хеш тощо).
+    """
+
+
+def _tmp_path(path):
+    # Унікальне ім'я для кожного процесу та потоку, щоб одночасні записи
+    # того самого файлу не змагались за спільний тимчасовий файл
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+
+def stream_to_file(stream, path, hasher=None, block_size=STREAM_BLOCK_SIZE):
+    """
+    Потоково записує дані у файл, за потреби обчислюючи хеш під час запису.
+    Дані пишуться у тимчасовий файл і атомарно перейменовуються, тому
+    обірване з'єднання не залишає пошкоджених файлів.
+
+    Args:
+        stream: Об'єкт з методом read(size)
+        path (str): Шлях до файлу
+        hasher (optional): Об'єкт hashlib для оновлення
+        block_size (int): Розмір блоку читання
+
+    Returns:
+        int: Кількість записаних байтів
+    """
+    tmp_path = _tmp_path(path)
+    written = 0
+
+    try:
+        with open(tmp_path, "wb") as f:
+            while True:
+                block = stream.read(block_size)
+                if not block:
+                    break
+                f.write(block)
+                if hasher is not None:
+                    hasher.update(block)
+                written += len(block)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    return written
+
+
+def read_image_manifest(session_dir):
+    """
+    Читає маніфест зображень сесії {filename: {'size', 'sha256'}}.
+
+    Args:
+        session_dir (str): Директорія завантажень сесії
+
+    Returns:
+        dict: Маніфест (порожній, якщо його ще немає)
+    """
+    try:
+        with open(os.path.join(session_dir, IMAGE_MANIFEST), "r") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def hash_file(path, block_size=STREAM_BLOCK_SIZE):
+    """
+    Обчислює SHA-256 файлу потоково.
+
+    Args:
+        path (str): Шлях до файлу
+        block_size (int): Розмір блоку читання
+
+    Returns:
+        str: SHA-256 (hex)
+    """
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def image_hashes(input_dir):
+    """
+    Повертає SHA-256 усіх вхідних зображень сесії. Хеші беруться з маніфесту,
+    записаного під час завантаження; відсутні обчислюються з файлів.
+
+    Args:
+        input_dir (str): Директорія завантажень сесії
+
+    Returns:
+        list: Список хешів (у порядку імен файлів)
+    """
+    manifest = read_image_manifest(input_dir)
+    hashes = []
+
+    for filename in sorted(os.listdir(input_dir)):
+        if not filename.lower().endswith((".jpg", ".jpeg", ".png", ".tif", ".tiff")):
+            continue
+        info = manifest.get(filename)
+        if info:
+            hashes.append(info["sha256"])
+        else:
+            hashes.append(hash_file(os.path.join(input_dir, filename)))
+
+    return hashes
+
+
+class UploadStore:
+    """
+    Зберігання завантажених зображень сесій, включно з фрагментованим
+    відновлюваним завантаженням великих наборів.
+    """
+
+    def __init__(self, upload_root, blob_store=None, logger=None):
+        """
+        Ініціалізація сховища завантажень.
+
+        Args:
+            upload_root (str): Коренева директорія завантажень
+            blob_store (BlobStore, optional): Спільне контентно-адресоване сховище;
+                якщо задано, файли сесій стають посиланнями на його блоби
+            logger (Logger, optional): Логер для запису повідомлень
+        """
+        self.upload_root = upload_root
+        self.blob_store = blob_store
+        self.logger = logger or logging.getLogger("upload_store")
+
+    def session_dir(self, session_id):
+        return os.path.join(self.upload_root, session_id)
+
+    def _chunk_dir(self, session_id, filename):
+        return os.path.join(self.session_dir(session_id), CHUNKS_DIR, filename)
+
+    def save_file(self, session_id, filename, stream):
+        """
+        Потоково зберігає цілий файл зображення та обчислює його SHA-256.
+
+        Args:
+            session_id (str): Ідентифікатор сесії
+            filename (str): Безпечне ім'я файлу
+            stream: Потік з даними файлу
+
+        Returns:
+            dict: {'filename', 'size', 'sha256'}
+        """
+        hasher = hashlib.sha256()
+        path = os.path.join(self.session_dir(session_id), filename)
+        size = stream_to_file(stream, path, hasher)
+        return self._register_image(session_id, filename, size, hasher.hexdigest())
+
+    def link_existing(self, session_id, filename, sha256):
+        """
+        Додає до сесії зображення, вміст якого вже є у спільному сховищі,
+        без повторного завантаження.
+
+        Args:
+            session_id (str): Ідентифікатор сесії
+            filename (str): Безпечне ім'я файлу
+            sha256 (str): SHA-256 вмісту
+
+        Returns:
+            dict: {'filename', 'size', 'sha256'} або None, якщо вмісту немає у сховищі
+        """
+        sha256 = sha256.lower()
+        if self.blob_store is None:
+            return None
+
+        path = os.path.join(self.session_dir(session_id), filename)
+        size = self.blob_store.link(sha256, path, session_id)
+        if size is None:
+            return None
+        return self._register_image(session_id, filename, size, sha256, stored=True)
+
+    def save_chunk(self, session_id, filename, index, stream, expected_sha256=None):
+        """
+        Зберігає один фрагмент файлу. Повторне завантаження того ж фрагмента
+        перезаписує його, тому клієнт може безпечно повторювати запити.
+
+        Args:
+            session_id (str): Ідентифікатор сесії
+            filename (str): Безпечне ім'я файлу
+            index (int): Номер фрагмента (з нуля)
+            stream: Потік з даними фрагмента
+            expected_sha256 (str, optional): Очікуваний SHA-256 фрагмента
+
+        Returns:
+            dict: {'filename', 'index', 'size', 'sha256'}
+        """
+        if index < 0:
+            raise UploadError("Номер фрагмента не може бути від'ємним")
+
+        chunk_dir = self._chunk_dir(session_id, filename)
+        os.makedirs(chunk_dir, exist_ok=True)
+
+        hasher = hashlib.sha256()
+        chunk_path = os.path.join(chunk_dir, f"{index:06d}.part")
+        size = stream_to_file(stream, chunk_path, hasher)
+        digest = hasher.hexdigest()
+
+        if expected_sha256 and expected_sha256.lower() != digest:
+            os.remove(chunk_path)
+            raise UploadError(f"Хеш фрагмента {index} файлу {filename} не збігається")
+
+        return {"filename": filename, "index": index, "size": size, "sha256": digest}
+
+    def get_status(self, session_id):
+        """
+        Повертає стан завантаження сесії для відновлення після обриву.
+
+        Args:
+            session_id (str): Ідентифікатор сесії
+
+        Returns:
+            dict: {'pending': {filename: [індекси фрагментів]}, 'completed': {filename: info}}
+        """
+        pending = {}
+        chunks_root = os.path.join(self.session_dir(session_id), CHUNKS_DIR)
+        if os.path.isdir(chunks_root):
+            for filename in os.listdir(chunks_root):
+                parts = os.listdir(os.path.join(chunks_root, filename))
+                pending[filename] = sorted(
+                    int(part.split(".")[0]) for part in parts if part.endswith(".part")
+                )
+
+        return {"pending": pending, "completed": self.read_manifest(session_id)}
+
+    def finalize(self, session_id, files=None):
+        """
+        Збирає файли з фрагментів, обчислюючи SHA-256 під час запису.
+
+        Args:
+            session_id (str): Ідентифікатор сесії
+            files (dict, optional): {filename: {'chunks': int, 'sha256': str}};
+                якщо не задано, збираються всі файли з наявних фрагментів
+
+        Returns:
+            dict: Маніфест зображень сесії
+        """
+        status = self.get_status(session_id)["pending"]
+        if files is None:
+            files = {filename: {"chunks": len(indices)} for filename, indices in status.items()}
+        if not isinstance(files, dict):
+            raise UploadError("Опис файлів має бути об'єктом {ім'я файлу: {'chunks', 'sha256'}}")
+
+        for filename, spec in files.items():
+            if not isinstance(spec, dict):
+                raise UploadError(f"Опис файлу {filename} має бути об'єктом {{'chunks', 'sha256'}}")
+            chunks = spec.get("chunks", 0)
+            if isinstance(chunks, bool) or not isinstance(chunks, int):
+                raise UploadError(f"Кількість фрагментів файлу {filename} має бути цілим числом")
+            if spec.get("sha256") is not None and not isinstance(spec["sha256"], str):
+                raise UploadError(f"Хеш файлу {filename} має бути рядком")
+
+            total = chunks
+            received = status.get(filename, [])
+            if total <= 0 or received[:total] != list(range(total)):
+                missing = sorted(set(range(total)) - set(received))
+                raise UploadError(f"Файл {filename} завантажено не повністю, бракує фрагментів: {missing}")
+
+        for filename, spec in files.items():
+            self._assemble(session_id, filename, spec["chunks"], spec.get("sha256"))
+
+        chunks_root = os.path.join(self.session_dir(session_id), CHUNKS_DIR)
+        if os.path.isdir(chunks_root) and not os.listdir(chunks_root):
+            os.rmdir(chunks_root)
+
+        return self.read_manifest(session_id)
+
+    def _assemble(self, session_id, filename, total_chunks, expected_sha256=None):
+        chunk_dir = self._chunk_dir(session_id, filename)
+        path = os.path.join(self.session_dir(session_id), filename)
+        hasher = hashlib.sha256()
+        tmp_path = _tmp_path(path)
+        size = 0
+
+        with open(tmp_path, "wb") as out:
+            for index in range(total_chunks):
+                with open(os.path.join(chunk_dir, f"{index:06d}.part"), "rb") as chunk:
+                    while True:
+                        block = chunk.read(STREAM_BLOCK_SIZE)
+                        if not block:
+                            break
+                        out.write(block)
+                        hasher.update(block)
+                        size += len(block)
+
+        digest = hasher.hexdigest()
+        if expected_sha256 and expected_sha256.lower() != digest:
+            os.remove(tmp_path)
+            raise UploadError(f"Хеш файлу {filename} не збігається з очікуваним")
+
+        os.replace(tmp_path, path)
+        shutil.rmtree(chunk_dir, ignore_errors=True)
+        self.logger.info(f"Зібрано файл {filename} з {total_chunks} фрагментів ({size} байт)")
+
+        return self._register_image(session_id, filename, size, digest)
+
+    @contextmanager
+    def _locked(self, session_id):
+        """
+        Блокування маніфесту сесії між процесами та потоками (flock на директорії
+        сесії), щоб одночасні завантаження не втрачали записи одне одного.
+        """
+        fd = os.open(self.session_dir(session_id), os.O_RDONLY)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+    def _register_image(self, session_id, filename, size, sha256, stored=False):
+        with self._locked(session_id):
+            if self.blob_store is not None and not stored:
+                path = os.path.join(self.session_dir(session_id), filename)
+                self.blob_store.ingest(path, sha256, session_id)
+
+            manifest = self.read_manifest(session_id)
+            previous = manifest.get(filename, {}).get("sha256")
+            manifest[filename] = {"size": size, "sha256": sha256}
+            self._write_manifest(session_id, manifest)
+
+            # Файл перезаписано іншим вмістом - старий блоб сесії більше не потрібен
+            if self.blob_store is not None and previous and previous != sha256:
+                if all(info["sha256"] != previous for info in manifest.values()):
+                    self.blob_store.release(session_id, [previous])
+
+        return {"filename": filename, "size": size, "sha256": sha256}
+
+    def delete_session(self, session_id):
+        """
+        Видаляє завантаження сесії, звільняючи блоби, на які більше ніхто не посилається.
+
+        Args:
+            session_id (str): Ідентифікатор сесії
+
+        Returns:
+            bool: True, якщо директорія сесії існувала
+        """
+        session_dir = self.session_dir(session_id)
+        if not os.path.exists(session_dir):
+            return False
+
+        if self.blob_store is not None:
+            hashes = [info["sha256"] for info in self.read_manifest(session_id).values()]
+            self.blob_store.release(session_id, hashes)
+
+        shutil.rmtree(session_dir)
+        return True
+
+    def read_manifest(self, session_id):
+        """
+        Повертає маніфест зображень сесії {filename: {'size', 'sha256'}}.
+
+        Args:
+            session_id (str): Ідентифікатор сесії
+
+        Returns:
+            dict: Маніфест (порожній, якщо його ще немає)
+        """
+        return read_image_manifest(self.session_dir(session_id))
+
+    def _write_manifest(self, session_id, manifest):
+        path = os.path.join(self.session_dir(session_id), IMAGE_MANIFEST)
+        tmp_path = _tmp_path(path)
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, path)
@@ -0,0 +1,348 @@
+import os
+import json
+import time
+import zlib
+import struct
+import logging
+import threading
+
+# Формати, які вже стиснені і зберігаються в архіві без deflate
+STORED_EXTENSIONS = {".glb", ".png", ".jpg", ".jpeg", ".gz", ".zip"}
+
+# Розмір блоку читання файлів
+BLOCK_SIZE = 1024 * 1024
+
+# Директорія кешу архіву всередині результатів сесії
+ZIP_CACHE_DIR = ".zipcache"
+ZIP_INDEX_FILE = "index.json"
+
+# Рівень стиснення deflate для текстових форматів
+DEFLATE_LEVEL = 6
+
+METHOD_STORED = 0
+METHOD_DEFLATED = 8
+
+FLAG_DATA_DESCRIPTOR = 0x08
+FLAG_UTF8 = 0x800
+
+ZIP32_LIMIT = 0xFFFFFFFF
+
+
+def _dos_datetime(timestamp):
+    t = time.localtime(timestamp)
+    year = max(t.tm_year, 1980)
+    dos_time = (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+    dos_date = ((year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+    return dos_time, dos_date
+
+
+class ZipStream:
+    """
+    Потокове формування ZIP-архіву без створення файлу на диску.
+
+    Записи пишуться одразу у відповідь. Для завершених сесій кешується
+    центральний каталог (CRC, розміри, зміщення) у .zipcache. У кешованому
+    варіанті всі записи зберігаються без стиснення, тому повторні завантаження
+    зводяться до читання файлів, а розмір архіву відомий заздалегідь; стиснені
+    копії файлів на диску не зберігаються.
+    """
+
+    def __init__(self, base_dir, files, cache=False, logger=None):
+        """
+        Ініціалізація потокового архіву.
+
+        Args:
+            base_dir (str): Директорія, відносно якої задано файли
+            files (list): Відносні шляхи файлів, що додаються в архів
+            cache (bool): Чи кешувати центральний каталог (для завершених сесій)
+            logger (Logger, optional): Логер для запису повідомлень
+        """
+        self.base_dir = base_dir
+        self.cache_dir = os.path.join(base_dir, ZIP_CACHE_DIR)
+        self.cache = cache
+        self.logger = logger or logging.getLogger("zip_stream")
+
+        self.entries = []
+        for rel_path in files:
+            st = os.stat(os.path.join(base_dir, rel_path))
+            ext = os.path.splitext(rel_path)[1].lower()
+            self.entries.append(
+                {
+                    "name": rel_path.replace(os.sep, "/"),
+                    "path": rel_path,
+                    "size": st.st_size,
+                    "mtime_ns": st.st_mtime_ns,
+                    "method": METHOD_STORED if ext in STORED_EXTENSIONS else METHOD_DEFLATED,
+                }
+            )
+
+        # Deflate може трохи збільшити нестисливі дані, тому запас 1%
+        total = sum(entry["size"] for entry in self.entries)
+        self.zip64 = total + total // 100 + 1024 * (len(self.entries) + 1) >= ZIP32_LIMIT
+
+        self.index = self._load_index() if cache else None
+
+    def _load_index(self):
+        """
+        Завантажує кешований центральний каталог, якщо він відповідає поточним файлам.
+        """
+        try:
+            with open(os.path.join(self.cache_dir, ZIP_INDEX_FILE), "r") as f:
+                index = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+        # Каталог дійсний, лише якщо файли не змінились з моменту його створення;
+        # перевіряється до того, як розмір архіву надіслано клієнту
+        key = lambda e: (e["name"], e["size"], e["mtime_ns"])
+        if [key(e) for e in index.get("entries", [])] != [key(e) for e in self.entries]:
+            return None
+        if index.get("zip64") != self.zip64:
+            return None
+        return index
+
+    def _local_header(self, entry, known):
+        name = entry["name"].encode("utf-8")
+        dos_time, dos_date = _dos_datetime(entry["mtime_ns"] / 1e9)
+        flags = FLAG_UTF8 | (0 if known else FLAG_DATA_DESCRIPTOR)
+        crc = entry["crc"] if known else 0
+        extra = b""
+
+        if self.zip64:
+            csize = usize = ZIP32_LIMIT
+            extra = struct.pack(
+                "<HHQQ",
+                0x0001,
+                16,
+                entry["size"] if known else 0,
+                entry["compressed_size"] if known else 0,
+            )
+        elif known:
+            csize, usize = entry["compressed_size"], entry["size"]
+        else:
+            csize = usize = 0
+
+        header = struct.pack(
+            "<IHHHHHIIIHH",
+            0x04034B50,
+            45 if self.zip64 else 20,
+            flags,
+            entry["method"],
+            dos_time,
+            dos_date,
+            crc,
+            csize,
+            usize,
+            len(name),
+            len(extra),
+        )
+        return header + name + extra
+
+    def _data_descriptor(self, entry):
+        if self.zip64:
+            return struct.pack(
+                "<IIQQ", 0x08074B50, entry["crc"], entry["compressed_size"], entry["size"]
+            )
+        return struct.pack(
+            "<IIII", 0x08074B50, entry["crc"], entry["compressed_size"], entry["size"]
+        )
+
+    def _central_directory(self, entries):
+        records = []
+        for entry in entries:
+            name = entry["name"].encode("utf-8")
+            dos_time, dos_date = _dos_datetime(entry["mtime_ns"] / 1e9)
+            extra = b""
+            if self.zip64:
+                csize = usize = offset = ZIP32_LIMIT
+                extra = struct.pack(
+                    "<HHQQQ", 0x0001, 24, entry["size"], entry["compressed_size"], entry["offset"]
+                )
+            else:
+                csize, usize, offset = entry["compressed_size"], entry["size"], entry["offset"]
+
+            records.append(
+                struct.pack(
+                    "<IHHHHHHIIIHHHHHII",
+                    0x02014B50,
+                    (3 << 8) | 45,
+                    45 if self.zip64 else 20,
+                    entry["flags"],
+                    entry["method"],
+                    dos_time,
+                    dos_date,
+                    entry["crc"],
+                    csize,
+                    usize,
+                    len(name),
+                    len(extra),
+                    0,
+                    0,
+                    0,
+                    0o100644 << 16,
+                    offset,
+                )
+                + name
+                + extra
+            )
+
+        directory = b"".join(records)
+        cd_offset = entries[-1]["end"] if entries else 0
+        tail = b""
+
+        if self.zip64:
+            zip64_end_offset = cd_offset + len(directory)
+            tail += struct.pack(
+                "<IQHHIIQQQQ",
+                0x06064B50,
+                44,
+                (3 << 8) | 45,
+                45,
+                0,
+                0,
+                len(entries),
+                len(entries),
+                len(directory),
+                cd_offset,
+            )
+            tail += struct.pack("<IIQI", 0x07064B50, 0, zip64_end_offset, 1)
+            tail += struct.pack(
+                "<IHHHHIIH", 0x06054B50, 0, 0, 0xFFFF, 0xFFFF, ZIP32_LIMIT, ZIP32_LIMIT, 0
+            )
+        else:
+            tail += struct.pack(
+                "<IHHHHIIH",
+                0x06054B50,
+                0,
+                0,
+                len(entries),
+                len(entries),
+                len(directory),
+                cd_offset,
+                0,
+            )
+
+        return directory + tail
+
+    def content_length(self):
+        """
+        Повертає розмір архіву, якщо він відомий заздалегідь (кешований каталог).
+
+        Returns:
+            int: Розмір у байтах або None
+        """
+        if self.index is None:
+            return None
+        entries = self.index["entries"]
+        return entries[-1]["end"] + len(self._central_directory(entries)) if entries else 22
+
+    def _read_file(self, path):
+        with open(path, "rb") as f:
+            while True:
+                block = f.read(BLOCK_SIZE)
+                if not block:
+                    break
+                yield block
+
+    def _replay(self):
+        """
+        Формує архів з кешованого каталогу: лише читання файлів без CRC та стиснення.
+        """
+        entries = self.index["entries"]
+        for entry in entries:
+            yield self._local_header(entry, known=True)
+            yield from self._read_file(os.path.join(self.base_dir, entry["path"]))
+
+        yield self._central_directory(entries)
+
+    def _build(self):
+        """
+        Формує архів вперше, обчислюючи CRC та стискаючи текстові формати на льоту.
+        """
+        written = []
+        yield from self._build_entries(written)
+        yield self._central_directory(written)
+        if self.cache:
+            self._save_index(written)
+
+    def _build_entries(self, written):
+        offset = 0
+        for entry in self.entries:
+            entry = dict(entry)
+            entry["offset"] = offset
+            entry["flags"] = FLAG_UTF8 | FLAG_DATA_DESCRIPTOR
+
+            header = self._local_header(entry, known=False)
+            yield header
+            offset += len(header)
+
+            crc = 0
+            compressed_size = 0
+            compressor = None
+            if entry["method"] == METHOD_DEFLATED:
+                compressor = zlib.compressobj(DEFLATE_LEVEL, zlib.DEFLATED, -15)
+
+            for block in self._read_file(os.path.join(self.base_dir, entry["path"])):
+                crc = zlib.crc32(block, crc)
+                if compressor is not None:
+                    block = compressor.compress(block)
+                    if not block:
+                        continue
+                compressed_size += len(block)
+                yield block
+
+            if compressor is not None:
+                block = compressor.flush()
+                compressed_size += len(block)
+                yield block
+
+            entry["crc"] = crc & 0xFFFFFFFF
+            entry["compressed_size"] = compressed_size
+            descriptor = self._data_descriptor(entry)
+            yield descriptor
+            offset += compressed_size + len(descriptor)
+            entry["end"] = offset
+            written.append(entry)
+
+    def _save_index(self, entries):
+        """
+        Зберігає центральний каталог для повторних завантажень.
+        """
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+            # У кешованому варіанті записи зберігаються без стиснення (CRC не залежить
+            # від методу), а розміри відомі, тому дескриптори даних не потрібні
+            offset = 0
+            cached = []
+            for entry in entries:
+                entry = dict(
+                    entry,
+                    flags=FLAG_UTF8,
+                    offset=offset,
+                    method=METHOD_STORED,
+                    compressed_size=entry["size"],
+                )
+                offset += len(self._local_header(entry, known=True)) + entry["compressed_size"]
+                entry["end"] = offset
+                cached.append(entry)
+
+            index_path = os.path.join(self.cache_dir, ZIP_INDEX_FILE)
+            tmp_path = f"{index_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"zip64": self.zip64, "entries": cached}, f)
+            os.replace(tmp_path, index_path)
+            self.logger.info(f"Закешовано центральний каталог архіву: {len(cached)} записів")
+        except OSError as e:
+            self.logger.warning(f"Не вдалося закешувати каталог архіву: {str(e)}")
+
+    def generate(self):
+        """
+        Генератор байтів архіву для потокової відповіді.
+
+        Yields:
+            bytes: Наступний фрагмент архіву
+        """
+        if self.index is not None:
+            return self._replay()
+        return self._build()
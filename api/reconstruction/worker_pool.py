@@ -0,0 +1,452 @@
+import os
+import sys
+import time
+import signal
+import socket
+import traceback
+import multiprocessing
+import psutil
+from . import config
+from .janitor import Janitor
+from .reconstructor import Reconstructor
+from .utils.blob_store import BlobStore
+from .utils.cancellation import JobCancelled, install_cancel_handler
+from .utils.disk_usage import DiskUsageLedger
+from .utils.job_queue import JobQueue
+from .utils.logging_utils import setup_logger
+from .utils.progress_tracker import ProgressTracker
+from .utils.stage_scheduler import StageScheduler
+from .utils.thread_budget import apply_thread_budget, thread_budget
+from .utils.upload_store import UploadStore
+from .utils.resource_limits import (
+    ResourceLimitExceeded,
+    apply_memory_limit,
+    free_resources,
+    kill_process_tree,
+    lower_quality,
+    process_tree_rss,
+)
+
+
+def job_requirements(quality):
+    """
+    Повертає ресурси, які резервуються під завдання заданої якості.
+
+    Args:
+        quality (str): Якість реконструкції ('low', 'medium', 'high')
+
+    Returns:
+        dict: {'cores': int, 'memory_mb': int, 'memory_limit_mb': int}
+    """
+    return config.JOB_RESOURCE_REQUIREMENTS.get(
+        quality, config.JOB_RESOURCE_REQUIREMENTS["medium"]
+    )
+
+
+def admit_job(job, reserved_cores, reserved_memory_mb):
+    """
+    Контроль допуску: чи вистачає вільних ядер та пам'яті для запуску завдання.
+
+    Args:
+        job (dict): Завдання з черги
+        reserved_cores (int): Ядра, вже зарезервовані завданнями, що виконуються
+        reserved_memory_mb (int): Пам'ять (МБ), вже зарезервована завданнями
+
+    Returns:
+        bool: True, якщо завдання можна запускати
+    """
+    free_cores, free_memory_mb = free_resources(reserved_cores, reserved_memory_mb)
+    return free_cores >= job["cores"] and free_memory_mb >= job["memory_mb"]
+
+
+def job_memory_limit_mb(job):
+    """
+    Повертає жорсткий ліміт пам'яті процесу завдання.
+
+    Args:
+        job (dict): Завдання з черги
+
+    Returns:
+        int: Ліміт у мегабайтах
+    """
+    if config.JOB_MEMORY_LIMIT_MB:
+        return config.JOB_MEMORY_LIMIT_MB
+    return job_requirements(job["params"].get("quality", "medium"))["memory_limit_mb"]
+
+
+def stage_scheduler(logger, owner=None):
+    """
+    Створює планувальник етапів між завданнями, якщо його ввімкнено.
+
+    Args:
+        logger (Logger): Логер
+        owner (str, optional): Ідентифікатор завдання-власника оренд
+
+    Returns:
+        StageScheduler: Планувальник або None
+    """
+    if not config.STAGE_SCHEDULER:
+        return None
+    return StageScheduler(
+        config.JOBS_DB_PATH,
+        owner,
+        logger,
+        poll_interval=config.STAGE_LEASE_POLL_INTERVAL,
+        fairness_wait=config.STAGE_LEASE_FAIRNESS_WAIT,
+    )
+
+
+def run_job(job, logger, stage_quality=None):
+    """
+    Виконує одне завдання реконструкції.
+
+    Args:
+        job (dict): Завдання з черги
+        logger (Logger): Логер воркера
+        stage_quality (dict, optional): Знижена якість для окремих етапів
+
+    Returns:
+        str: Шлях до згенерованої 3D-моделі
+    """
+    session_id = job["session_id"]
+    params = job["params"]
+    input_dir = os.path.join(config.UPLOAD_FOLDER, session_id)
+    output_dir = os.path.join(config.RESULTS_FOLDER, session_id)
+
+    logger.info(
+        f"Запуск реконструкції для сесії {session_id}, метод: {params.get('method')}, "
+        f"якість: {params.get('quality')}"
+    )
+
+    reconstructor = Reconstructor(session_id, input_dir, output_dir)
+    return reconstructor.run_reconstruction(
+        method=params.get("method", "custom"),
+        quality=params.get("quality", "medium"),
+        stage_quality=stage_quality,
+        stage_params=params.get("stage_params"),
+        from_stage=params.get("from_stage"),
+        scheduler=stage_scheduler(logger, job["id"]),
+        profile=params.get("profile", False),
+        matching=params.get("matching", "auto"),
+    )
+
+
+def _job_process_main(job, stage_quality):
+    """
+    Точка входу окремого процесу, в якому виконується завдання.
+    Процес працює з лімітом пам'яті, тому нестача пам'яті не зачіпає воркер чи API.
+
+    Args:
+        job (dict): Завдання з черги
+        stage_quality (dict): Знижена якість для окремих етапів
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    logger = setup_logger(config.RESULTS_FOLDER, "worker")
+
+    # SIGTERM від воркера - скасування завдання: зовнішні програми знищуються
+    # разом з групами процесів, етапи на Python зупиняються в контрольній точці
+    install_cancel_handler(logger)
+
+    try:
+        apply_memory_limit(job_memory_limit_mb(job), config.JOB_MEMORY_RLIMIT, logger)
+        apply_thread_budget(thread_budget(job["params"].get("quality", "medium")), logger)
+        run_job(job, logger, stage_quality)
+    except Exception:
+        logger.error(traceback.format_exc())
+        sys.exit(1)
+    sys.exit(0)
+
+
+def _cancel_process(process, logger):
+    """
+    Зупиняє процес скасованого завдання: спершу SIGTERM (процес сам знищує
+    групи процесів зовнішніх програм), після JOB_CANCEL_GRACE - усе дерево примусово.
+
+    Args:
+        process (multiprocessing.Process): Процес завдання
+        logger (Logger): Логер воркера
+    """
+    logger.warning(f"Завдання скасовано, зупинка процесу {process.pid}")
+    process.terminate()
+    process.join(timeout=config.JOB_CANCEL_GRACE)
+    if process.is_alive():
+        logger.warning(f"Процес {process.pid} не завершився після скасування, примусова зупинка")
+        kill_process_tree(process.pid)
+        process.join()
+
+
+def _wait_with_memory_watchdog(process, limit_mb, logger, cancelled=None, heartbeat=None):
+    """
+    Чекає завершення процесу завдання, контролюючи сумарний RSS його дерева процесів.
+
+    Args:
+        process (multiprocessing.Process): Процес завдання
+        limit_mb (int): Ліміт RSS у мегабайтах
+        logger (Logger): Логер воркера
+        cancelled (callable, optional): Перевірка, чи скасовано завдання
+        heartbeat (callable, optional): Сигнал черзі, що воркер живий
+
+    Returns:
+        bool: True, якщо процес завершився через нестачу пам'яті
+    """
+    limit_bytes = limit_mb * 1024 * 1024
+    killed = False
+
+    while True:
+        process.join(timeout=config.JOB_MEMORY_CHECK_INTERVAL)
+        if not process.is_alive():
+            break
+
+        if heartbeat is not None:
+            heartbeat()
+
+        if cancelled is not None and cancelled():
+            _cancel_process(process, logger)
+            return False
+
+        rss = process_tree_rss(process.pid)
+        if limit_mb and rss > limit_bytes:
+            logger.warning(
+                f"Процес завдання перевищив ліміт пам'яті: {rss // (1024 * 1024)} МБ > {limit_mb} МБ"
+            )
+            kill_process_tree(process.pid)
+            killed = True
+
+    # -SIGKILL без участі watchdog - це OOM killer ядра
+    return killed or process.exitcode == -signal.SIGKILL
+
+
+def execute_job(job, logger, queue=None):
+    """
+    Виконує завдання в ізольованому процесі. Якщо процес завершився через нестачу
+    пам'яті, етап, на якому це сталося, повторюється з нижчою якістю.
+
+    Args:
+        job (dict): Завдання з черги
+        logger (Logger): Логер воркера
+        queue (JobQueue, optional): Черга, в якій перевіряється скасування завдання
+
+    Raises:
+        JobCancelled: Завдання скасовано під час виконання
+    """
+    metadata_path = os.path.join(config.RESULTS_FOLDER, job["session_id"], "metadata.json")
+    quality = job["params"].get("quality", "medium")
+    limit_mb = job_memory_limit_mb(job)
+    stage_quality = {}
+    scheduler = stage_scheduler(logger)
+    cancelled = (lambda: queue.is_cancelled(job["id"])) if queue is not None else None
+    heartbeat = (lambda: queue.heartbeat(job["id"])) if queue is not None else None
+
+    while True:
+        process = multiprocessing.Process(
+            target=_job_process_main,
+            args=(job, stage_quality),
+            name=f"reconstruction-job-{job['id']}",
+        )
+        process.start()
+        if queue is not None:
+            queue.set_job_pid(job["id"], process.pid)
+        out_of_memory = _wait_with_memory_watchdog(
+            process, limit_mb, logger, cancelled, heartbeat
+        )
+
+        # Оренди етапів, які процес не повернув (аварійне завершення або скасування)
+        if scheduler is not None:
+            scheduler.release_owner(job["id"])
+
+        if cancelled is not None and cancelled():
+            raise JobCancelled(f"Завдання {job['id']} скасовано")
+
+        if process.exitcode == 0:
+            return
+
+        progress = ProgressTracker(metadata_path).get_progress()
+        if not out_of_memory:
+            raise RuntimeError(
+                f"Процес завдання завершився з кодом {process.exitcode}: {progress['current_message']}"
+            )
+
+        stage = progress["current_stage"]
+        lower = lower_quality(stage_quality.get(stage, quality))
+        if lower is None:
+            raise ResourceLimitExceeded(f"Нестача пам'яті на етапі {stage} з мінімальною якістю")
+
+        logger.warning(f"Нестача пам'яті на етапі {stage}, повтор завдання {job['id']} з якістю {lower}")
+        stage_quality[stage] = lower
+
+
+def _mark_session_cancelled(job):
+    """
+    Записує статус 'cancelled' у стан сесії, якщо процес завдання
+    не встиг зробити це сам (наприклад, після примусової зупинки).
+
+    Args:
+        job (dict): Скасоване завдання
+    """
+    metadata_path = os.path.join(config.RESULTS_FOLDER, job["session_id"], "metadata.json")
+    progress = ProgressTracker(metadata_path)
+    if progress.get_progress()["status"] == "cancelled":
+        return
+
+    progress.update_metadata({"status": "cancelled", "completed_at": time.time()})
+    progress.emit({"type": "status", "status": "cancelled", "error": None})
+
+
+def job_owner_alive(job, host):
+    """
+    Перевіряє, чи ще працює процес воркера або процес завдання, що забрали завдання.
+
+    Args:
+        job (dict): Завдання з черги
+        host (str): Ім'я поточного хоста
+
+    Returns:
+        bool: True, якщо власник завдання живий
+    """
+    # Процеси іншого хоста звідси не перевірити, тому про них судять за сигналом воркера
+    if job.get("worker_host") != host:
+        heartbeat_at = job.get("heartbeat_at") or job.get("started_at") or 0
+        return time.time() - heartbeat_at < config.JOB_HEARTBEAT_TIMEOUT
+
+    # Після перезавантаження системи PID належать іншим процесам
+    if psutil.boot_time() > (job.get("started_at") or 0):
+        return False
+
+    for pid in (job.get("worker_pid"), job.get("job_pid")):
+        if not pid:
+            continue
+        try:
+            if psutil.Process(pid).status() != psutil.STATUS_ZOMBIE:
+                return True
+        except psutil.NoSuchProcess:
+            continue
+    return False
+
+
+def _worker_main(worker_id):
+    """
+    Головний цикл процесу-воркера: забирає завдання з черги та виконує їх.
+
+    Args:
+        worker_id (str): Ідентифікатор воркера
+    """
+    # Зупинкою процесу керує пул, тому Ctrl+C ігнорується в дочірніх процесах
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    logger = setup_logger(config.RESULTS_FOLDER, "worker")
+    queue = JobQueue(config.JOBS_DB_PATH, logger)
+    logger.info(f"Воркер {worker_id} запущено (PID {os.getpid()})")
+
+    # З планувальником етапів ресурси орендуються кожним етапом окремо,
+    # а не резервуються під завдання на весь час виконання
+    admit = None if config.STAGE_SCHEDULER else admit_job
+
+    while True:
+        job = queue.claim(worker_id, admit=admit)
+        if job is None:
+            time.sleep(config.WORKER_POLL_INTERVAL)
+            continue
+
+        try:
+            execute_job(job, logger, queue)
+            queue.finish(job["id"])
+            logger.info(f"Завдання {job['id']} завершено успішно")
+        except JobCancelled:
+            logger.info(f"Завдання {job['id']} скасовано, воркер вільний")
+            _mark_session_cancelled(job)
+        except Exception as e:
+            logger.error(f"Помилка під час виконання завдання {job['id']}: {str(e)}")
+            logger.error(traceback.format_exc())
+            queue.fail(job["id"], str(e))
+
+
+class WorkerPool:
+    """
+    Пул виділених процесів-воркерів реконструкції.
+    Перезапускає воркери, що завершились, та повертає їхні завдання в чергу.
+    """
+
+    def __init__(self, num_workers=None):
+        """
+        Ініціалізація пулу воркерів.
+
+        Args:
+            num_workers (int, optional): Кількість воркерів
+        """
+        self.num_workers = num_workers or config.RECONSTRUCTION_WORKERS
+        self.logger = setup_logger(config.RESULTS_FOLDER, "worker_pool")
+        self.queue = JobQueue(config.JOBS_DB_PATH, self.logger)
+        self.host = socket.gethostname()
+        self.workers = {}
+        self._stopping = False
+
+        # Прибирання сесій виконує головний процес пулу між перевірками воркерів
+        ledger = DiskUsageLedger(config.JOBS_DB_PATH, self.logger)
+        self.janitor = Janitor(
+            self.queue,
+            ledger,
+            UploadStore(
+                config.UPLOAD_FOLDER, BlobStore(config.BLOB_FOLDER, self.logger, ledger), self.logger
+            ),
+            self.logger,
+        )
+        self.scheduler = stage_scheduler(self.logger)
+
+    def _spawn(self, index):
+        worker_id = f"{self.host}:{index}:{time.time():.0f}"
+        process = multiprocessing.Process(
+            target=_worker_main, args=(worker_id,), name=f"reconstruction-worker-{index}"
+        )
+        process.daemon = False
+        process.start()
+        self.workers[index] = (worker_id, process)
+        self.logger.info(f"Запущено воркер {worker_id} (PID {process.pid})")
+
+    def _handle_stop(self, signum, frame):
+        self.logger.info(f"Отримано сигнал {signum}, зупинка пулу воркерів")
+        self._stopping = True
+
+    def run(self):
+        """
+        Запускає воркери та стежить за ними до отримання сигналу зупинки.
+        """
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+
+        # Завдання, що виконувались до перезапуску, повертаються в чергу,
+        # якщо їх процеси вже не працюють
+        self._requeue_orphaned()
+
+        for index in range(self.num_workers):
+            self._spawn(index)
+
+        while not self._stopping:
+            time.sleep(config.WORKER_POLL_INTERVAL)
+            for index, (worker_id, process) in list(self.workers.items()):
+                if not process.is_alive():
+                    self.logger.warning(
+                        f"Воркер {worker_id} завершився з кодом {process.exitcode}, перезапуск"
+                    )
+                    self._spawn(index)
+            # Також підхоплює завдання, процеси яких пережили попередній пул і вже завершились
+            self._requeue_orphaned()
+            if self.scheduler is not None:
+                self.scheduler.release_dead()
+            self.janitor.maybe_run()
+
+        # Процеси завдань та зовнішніх програм - нащадки воркерів. Без воркера вони
+        # продовжили б роботу, а після перезапуску завдання виконувалось би вдруге
+        # в ту саму директорію, тому все дерево зупиняється; завдання продовжиться
+        # з контрольних точок після перезапуску
+        for worker_id, process in self.workers.values():
+            kill_process_tree(process.pid)
+        for worker_id, process in self.workers.values():
+            process.join(timeout=30)
+        self.logger.info("Пул воркерів зупинено")
+
+    def _requeue_orphaned(self):
+        self.queue.requeue_orphaned(
+            [worker_id for worker_id, _ in self.workers.values()],
+            config.JOB_MAX_ATTEMPTS,
+            owner_alive=lambda job: job_owner_alive(job, self.host),
+        )
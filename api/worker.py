@@ -0,0 +1,10 @@
+from reconstruction.utils.file_utils import create_directory
+from reconstruction.worker_pool import WorkerPool
+from reconstruction import config
+
+if __name__ == "__main__":
+    create_directory(config.UPLOAD_FOLDER)
+    create_directory(config.RESULTS_FOLDER)
+
+    # Запускаємо пул процесів-воркерів реконструкції
+    WorkerPool().run()
@@ -73,38 +73,36 @@ const ResultsPage = () => {
     fetchResults();
   }, [sessionId]);
 
-  // Періодичне оновлення статусу, якщо реконструкція в процесі
+  // Оновлення прогресу через потік подій, поки реконструкція в процесі
   useEffect(() => {
-    let intervalId = null;
+    let source = null;
     
     if (results?.status === 'processing') {
-      intervalId = setInterval(async () => {
-        try {
-          const statusResponse = await apiService.getReconstructionStatus(sessionId);
-          if (statusResponse.status === 200) {
-            setResults(prevResults => ({
-              ...prevResults,
-              ...statusResponse.data
-            }));
-            
-            // Якщо процес завершено, очищаємо інтервал і оновлюємо дані
-            if (statusResponse.data.status !== 'processing') {
-              clearInterval(intervalId);
-              
-              // Повністю оновлюємо дані
-              fetchResults();
-            }
+      source = apiService.subscribeToProgress(sessionId, {
+        onProgress: (event) => {
+          setResults(prevResults => ({
+            ...prevResults,
+            current_stage: event.stage,
+            progress: event.progress,
+            current_message: event.message
+          }));
+        },
+        onStatus: (event) => {
+          // Якщо процес завершено, повністю оновлюємо дані
+          if (event.status !== 'processing') {
+            fetchResults();
           }
-        } catch (error) {
-          console.error('Помилка при оновленні статусу:', error);
+        },
+        onError: (error) => {
+          console.error('Помилка потоку подій прогресу:', error);
         }
-      }, 3000); // Оновлюємо кожні 3 секунди
+      });
     }
     
-    // Очищаємо інтервал при розмонтуванні компонента
+    // Закриваємо з'єднання при розмонтуванні компонента
     return () => {
-      if (intervalId) {
-        clearInterval(intervalId);
+      if (source) {
+        source.close();
       }
     };
   }, [results?.status, sessionId]);
@@ -30,13 +30,17 @@ const apiService = {
       onUploadProgress
     });
   },
-  reconstructModel: async function(sessionId, quality, method) {
+  // profile: профілювання етапів (cProfile, tracemalloc) у profiles/ результатів
+  // matching: 'auto' або 'sequential' (кадри з відео чи поворотного столу, впорядковані за іменем)
+  reconstructModel: async function(sessionId, quality, method, profile = false, matching = 'auto') {
     return axios({
       method: 'post',
       url: `${baseURL}/api/reconstruct/${sessionId}`,
       data: {
         quality: quality,
-        method: method
+        method: method,
+        profile: profile,
+        matching: matching
       },
       timeout: 600000 // 10 хвилин
     });
@@ -49,9 +53,33 @@ const apiService = {
       timeout: 60000 // 1 хвилина
     });
   },
+  // Підписка на події прогресу (Server-Sent Events); EventSource сам
+  // перепідключається і передає Last-Event-ID, тому події не губляться
+  subscribeToProgress: (sessionId, handlers) => {
+    const source = new EventSource(`${baseURL}/api/events/${sessionId}`);
+    source.addEventListener('progress', (e) => handlers.onProgress?.(JSON.parse(e.data)));
+    source.addEventListener('status', (e) => {
+      const event = JSON.parse(e.data);
+      handlers.onStatus?.(event);
+      if (['completed', 'failed', 'cancelled'].includes(event.status)) {
+        source.close();
+      }
+    });
+    source.onerror = (e) => handlers.onError?.(e);
+    return source;
+  },
   startReconstruction: (sessionId, params) => {
     return api.post(`${baseURL}/api/reconstruct/${sessionId}`, params); // Шлях відносно baseURL
   },
+  // Повторне виконання етапів від меша/текстурування/експорту з новими параметрами,
+  // напр. rederive(id, 'mesh', { mesh: { depth: 11 }, texture: { resolution_level: 0 } })
+  rederive: (sessionId, fromStage, params) => {
+    return api.post(`${baseURL}/api/rederive/${sessionId}`, { from_stage: fromStage, params });
+  },
+  // Скасування реконструкції, що очікує в черзі або виконується
+  cancelReconstruction: (sessionId) => {
+    return api.post(`${baseURL}/api/cancel/${sessionId}`);
+  },
   getResults: (sessionId) => {
     return api.get(`${baseURL}/api/results/${sessionId}`); // Шлях відносно baseURL
   },